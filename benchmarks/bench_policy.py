@@ -0,0 +1,40 @@
+"""Micro-benchmark for the command policy checker.
+
+Run with `python benchmarks/bench_policy.py`. Prints the per-check latency
+of cold (uncached) and warm (memoized) decisions for short and long commands.
+"""
+
+from __future__ import annotations
+
+import logging
+import timeit
+
+from claudecode_terminal.config import PolicyConfig
+from claudecode_terminal.services.blacklist import BlacklistChecker
+
+COMMANDS = {
+    "short": "git status",
+    "pipeline": "cd src && grep -rn TODO . | sort | uniq -c | sort -rn | head -20",
+    "wrapped": "sudo -u build env CI=1 nice -n 5 timeout -s KILL 600 make -j8 test",
+    "long": " && ".join(f"echo step-{i} > /tmp/out-{i}.log" for i in range(100)),
+}
+POLICY = PolicyConfig(allow=["python3"], deny=["docker"], users={"42": {"allow": ["vim"]}})
+
+
+def _per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> None:
+    logging.disable(logging.WARNING)
+    print(f"{'command':<10} {'length':>7} {'cold (us)':>10} {'warm (us)':>10}")
+    for name, command in COMMANDS.items():
+        cold_checker = BlacklistChecker(cache_size=0)
+        cold = _per_call_us(lambda c=cold_checker, cmd=command: c.check(cmd, "42", POLICY), number=200)
+        warm_checker = BlacklistChecker()
+        warm = _per_call_us(lambda c=warm_checker, cmd=command: c.check(cmd, "42", POLICY), number=20_000)
+        print(f"{name:<10} {len(command):>7} {cold:>10.1f} {warm:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
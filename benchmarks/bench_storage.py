@@ -0,0 +1,91 @@
+"""Mixed read/write benchmark for the history database.
+
+Run with `python benchmarks/bench_storage.py`. Concurrent tasks record
+commands while others page through history (90%) and search it (10%), first with every
+query on the writer connection (`readers=0`, the old design), then with a
+pool of read-only connections. Prints throughput and read latency for each.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from claudecode_terminal.storage.database import close_db, get_history, init_db, save_command, search_commands
+
+SEED_ROWS = 20_000
+DURATION = 3.0
+WRITERS = 4
+READERS = 8
+WORDS = ["build", "deploy", "test", "migrate", "lint", "status", "install", "release"]
+
+
+def _command(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(3)) + f" --run {rng.randrange(10_000)}"
+
+
+async def _seed(db_path: str) -> None:
+    await init_db(db_path, history_batch_size=500, readers=0)
+    rng = random.Random(1)
+    for i in range(SEED_ROWS):
+        await save_command(str(i % 5), _command(rng), f"output {i}\n" * 5, "", i % 7 == 0, 12)
+    await close_db()
+
+
+async def _writer(stop: float, rng: random.Random) -> int:
+    done = 0
+    while time.perf_counter() < stop:
+        await save_command(str(rng.randrange(5)), _command(rng), "ok\n" * 20, "", 0, 10)
+        done += 1
+        # A command takes a while to run; the history writer batches what arrives meanwhile
+        await asyncio.sleep(0.001)
+    return done
+
+
+async def _reader(stop: float, rng: random.Random, latencies: list[float]) -> int:
+    done = 0
+    while time.perf_counter() < stop:
+        started = time.perf_counter()
+        if rng.random() < 0.9:
+            page = await get_history(user_id=str(rng.randrange(5)), status="failed", limit=20)
+            if page.rows:
+                await get_history(user_id=page.rows[0]["user_id"], before=page.rows[-1]["id"], limit=20)
+        else:
+            await search_commands(rng.choice(WORDS), user_id=str(rng.randrange(5)), limit=20)
+        latencies.append((time.perf_counter() - started) * 1000)
+        done += 1
+    return done
+
+
+async def _run(db_path: str, readers: int) -> tuple[float, float, float, float]:
+    await init_db(db_path, readers=readers)
+    rng = random.Random(readers)
+    latencies: list[float] = []
+    stop = time.perf_counter() + DURATION
+    writes = asyncio.gather(*(_writer(stop, random.Random(rng.random())) for _ in range(WRITERS)))
+    reads = asyncio.gather(*(_reader(stop, random.Random(rng.random()), latencies) for _ in range(READERS)))
+    wrote, read = await asyncio.gather(writes, reads)
+    await close_db()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    return sum(wrote) / DURATION, sum(read) / DURATION, statistics.median(latencies or [0.0]), p99
+
+
+def main() -> None:
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "history.db")
+        asyncio.run(_seed(db_path))
+        print(f"{'readers':>8} {'writes/s':>10} {'reads/s':>10} {'read p50 (ms)':>14} {'read p99 (ms)':>14}")
+        for readers in (0, 2, 4):
+            writes, reads, p50, p99 = asyncio.run(_run(db_path, readers))
+            print(f"{readers:>8} {writes:>10.0f} {reads:>10.0f} {p50:>14.2f} {p99:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,38 +7,70 @@ import logging
 import signal
 
 from telegram import BotCommand
-from telegram.ext import Application, CommandHandler, MessageHandler, filters
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters
 
 from claudecode_terminal.bot.handlers import (
     ask_handler,
+    askeach_handler,
+    bg_handler,
+    cancel_handler,
+    close_services,
     continue_handler,
+    each_handler,
     exec_handler,
     help_handler,
     history_handler,
+    history_page_handler,
+    jobs_handler,
     maxturns_handler,
     model_handler,
+    nocache_handler,
     project_handler,
+    resetshell_handler,
+    search_handler,
+    sessions_handler,
     settings_handler,
     shell_handler,
     start_handler,
+    start_services,
+    stats_handler,
+    status_handler,
     system_handler,
+    tail_handler,
     text_handler,
+    usage_handler,
 )
+from claudecode_terminal.bot.persistence import SQLitePersistence
 from claudecode_terminal.config import AppConfig
-from claudecode_terminal.storage.database import close_db, init_db
+from claudecode_terminal.services.process import process_registry
+from claudecode_terminal.storage.database import close_db, init_storage
+from claudecode_terminal.storage.maintenance import HistoryMaintenance
 
 logger = logging.getLogger(__name__)
 
 BOT_COMMANDS = [
     BotCommand("ask", "Ask Claude Code a question"),
+    BotCommand("nocache", "Ask Claude Code, bypassing the result cache"),
     BotCommand("shell", "Execute a shell command"),
+    BotCommand("resetshell", "Restart your persistent shell session"),
+    BotCommand("bg", "Run a shell command in the background"),
+    BotCommand("jobs", "List or stop background jobs"),
+    BotCommand("tail", "Show the end of a background job's output"),
+    BotCommand("each", "Run a shell command in every matching project"),
+    BotCommand("askeach", "Ask Claude Code in every matching project"),
     BotCommand("project", "Switch or view project directory"),
     BotCommand("model", "Change Claude model (opus/sonnet/haiku)"),
     BotCommand("continue", "Continue previous conversation"),
+    BotCommand("sessions", "List or switch Claude sessions"),
     BotCommand("system", "Set system prompt"),
     BotCommand("maxturns", "Set max conversation turns"),
-    BotCommand("history", "View recent command history"),
+    BotCommand("history", "View your command history"),
+    BotCommand("search", "Search command history"),
     BotCommand("settings", "View current settings"),
+    BotCommand("status", "View queue and runtime status"),
+    BotCommand("cancel", "Stop a running job"),
+    BotCommand("usage", "View Claude token and cost usage"),
+    BotCommand("stats", "View run, failure and latency stats"),
     BotCommand("help", "Show help message"),
 ]
 
@@ -49,29 +81,50 @@ async def run_bot(config: AppConfig) -> None:
         raise ValueError("Bot token not configured. Run 'claudecode-terminal init' first.")
 
     # Initialize database
-    await init_db(config.storage.db_path)
+    await init_storage(config)
+    maintenance = HistoryMaintenance(config.storage)
+    maintenance.start()
 
-    # Build application
-    app = Application.builder().token(config.bot.token).build()
+    # Build application. Updates are handled concurrently; the job scheduler
+    # is what bounds how many executions actually run at once.
+    builder = Application.builder().token(config.bot.token).concurrent_updates(True)
+    if config.storage.persist_user_data:
+        builder = builder.persistence(SQLitePersistence(update_interval=config.storage.state_flush_interval))
+    app = builder.build()
 
     # Register handlers
     app.add_handler(CommandHandler("start", start_handler))
     app.add_handler(CommandHandler("help", help_handler))
     app.add_handler(CommandHandler("ask", ask_handler))
+    app.add_handler(CommandHandler("nocache", nocache_handler))
     app.add_handler(CommandHandler("shell", shell_handler))
     app.add_handler(CommandHandler("exec", exec_handler))
+    app.add_handler(CommandHandler("resetshell", resetshell_handler))
+    app.add_handler(CommandHandler("bg", bg_handler))
+    app.add_handler(CommandHandler("jobs", jobs_handler))
+    app.add_handler(CommandHandler("tail", tail_handler))
+    app.add_handler(CommandHandler("each", each_handler))
+    app.add_handler(CommandHandler("askeach", askeach_handler))
     app.add_handler(CommandHandler("project", project_handler))
     app.add_handler(CommandHandler("model", model_handler))
     app.add_handler(CommandHandler("maxturns", maxturns_handler))
     app.add_handler(CommandHandler("system", system_handler))
     app.add_handler(CommandHandler("continue", continue_handler))
+    app.add_handler(CommandHandler("sessions", sessions_handler))
     app.add_handler(CommandHandler("history", history_handler))
+    app.add_handler(CallbackQueryHandler(history_page_handler, pattern=r"^h:"))
+    app.add_handler(CommandHandler("search", search_handler))
     app.add_handler(CommandHandler("settings", settings_handler))
+    app.add_handler(CommandHandler("status", status_handler))
+    app.add_handler(CommandHandler("cancel", cancel_handler))
+    app.add_handler(CommandHandler("usage", usage_handler))
+    app.add_handler(CommandHandler("stats", stats_handler))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler))
 
     # Initialize and start
     await app.initialize()
     await app.bot.set_my_commands(BOT_COMMANDS)
+    await start_services(app.bot)
     await app.start()
     assert app.updater is not None
     await app.updater.start_polling(drop_pending_updates=True)
@@ -93,8 +146,12 @@ async def run_bot(config: AppConfig) -> None:
 
     # Graceful shutdown
     logger.info("Shutting down bot...")
+    # Stop running executions first so in-flight handlers can finish
+    await process_registry.cancel_all()
     await app.updater.stop()
     await app.stop()
     await app.shutdown()
+    await close_services()
+    await maintenance.close()
     await close_db()
     logger.info("Bot stopped.")
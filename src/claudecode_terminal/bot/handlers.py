@@ -2,28 +2,78 @@
 
 from __future__ import annotations
 
+import contextlib
 import logging
+import time
+from collections.abc import Awaitable, Callable
 from pathlib import Path
 
-from telegram import Update
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
 from claudecode_terminal.bot.security import user_id_required
+from claudecode_terminal.bot.streaming import LiveMessage, LiveTail, StreamingReply
 from claudecode_terminal.config import MODEL_ALIASES, get_config
 from claudecode_terminal.services.claude import ClaudeRunner
+from claudecode_terminal.services.fanout import ProjectResult, fan_out, match_projects
+from claudecode_terminal.services.jobs import BackgroundJob, JobError, JobManager, tail_file
+from claudecode_terminal.services.process import process_registry
+from claudecode_terminal.services.scheduler import JobScheduler, QueueFullError
 from claudecode_terminal.services.shell import ShellRunner
-from claudecode_terminal.storage.database import get_recent_commands
+from claudecode_terminal.services.usage import month_start, today
+from claudecode_terminal.storage.database import (
+    get_claude_sessions,
+    get_history,
+    get_stats,
+    get_usage_totals,
+    history_stats,
+    reader_stats,
+    save_claude_session,
+    search_commands,
+    search_cursor,
+    stats_backlog,
+)
+from claudecode_terminal.storage.models import ExecutionResult, HistoryFilters
+from claudecode_terminal.storage.rollups import RANGES, range_start
 from claudecode_terminal.utils.formatting import (
+    MAX_TELEGRAM_LENGTH,
     format_claude_result,
+    format_duration,
+    format_fanout_line,
+    format_fanout_report,
+    format_fanout_summary,
+    format_history_page,
+    format_job_line,
+    format_output,
+    format_search_results,
     format_shell_result,
+    format_shell_status,
+    format_stats,
+    send_file,
     send_long_message,
 )
 
 logger = logging.getLogger(__name__)
 
+SEARCH_PAGE_SIZE = 10
+SEARCH_USAGE = "Usage: /search [-a cursor] <words>\nThe cursor for the next page is shown under each page."
+HISTORY_PAGE_SIZE = 10
+HISTORY_USAGE = "Usage: /history [ok|failed|exit=N] [shell|claude] [here]"
+STATS_USAGE = "Usage: /stats [day|week|month] [all]"
+# /history words -> get_history filters
+HISTORY_FILTERS: dict[str, HistoryFilters] = {
+    "ok": {"status": "ok"},
+    "failed": {"status": "failed"},
+    "shell": {"source": "telegram"},
+    "claude": {"source": "claude"},
+}
+
 # Lazy-initialized service instances
 _claude_runner: ClaudeRunner | None = None
 _shell_runner: ShellRunner | None = None
+_scheduler: JobScheduler | None = None
+_job_manager: JobManager | None = None
 
 
 def _get_claude_runner() -> ClaudeRunner:
@@ -40,11 +90,68 @@ def _get_shell_runner() -> ShellRunner:
     return _shell_runner
 
 
+def _get_scheduler() -> JobScheduler:
+    global _scheduler
+    if _scheduler is None:
+        cfg = get_config().scheduler
+        _scheduler = JobScheduler(
+            workers=cfg.workers,
+            per_user=cfg.per_user,
+            per_project=cfg.per_project,
+            max_queue=cfg.max_queue,
+        )
+    return _scheduler
+
+
+def _get_job_manager() -> JobManager:
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(get_config())
+    return _job_manager
+
+
+async def start_services(bot: Bot) -> None:
+    """Wire services that push messages on their own, and resume background jobs."""
+    manager = _get_job_manager()
+
+    async def _notify(job: BackgroundJob) -> None:
+        if job.chat_id is None:
+            return
+        text = f"Background job finished\n{format_job_line(job)}"
+        tail = tail_file(job.spool_path, lines=10) if Path(job.spool_path).exists() else ""
+        if tail:
+            text += f"\n\n{tail}"
+        await bot.send_message(job.chat_id, text[:MAX_TELEGRAM_LENGTH])
+
+    manager.notify = _notify
+    alive = await manager.recover()
+    if alive:
+        logger.info("Re-attached to %d background job(s)", alive)
+
+
+async def close_services() -> None:
+    """Release long-lived service resources on shutdown."""
+    if _claude_runner is not None:
+        await _claude_runner.close()
+    if _shell_runner is not None:
+        await _shell_runner.close()
+    if _job_manager is not None:
+        # Stops watching only: background jobs outlive the bot
+        await _job_manager.close()
+
+
 def _get_project(context: ContextTypes.DEFAULT_TYPE) -> str:
     config = get_config()
     return context.user_data.get("project", config.claude.default_project)  # type: ignore[union-attr]
 
 
+def _get_thread(update: Update) -> str:
+    """Conversation scope for Claude sessions: the chat plus forum topic, if any."""
+    chat_id = update.effective_chat.id if update.effective_chat else 0
+    topic = update.effective_message.message_thread_id if update.effective_message else None
+    return f"{chat_id}:{topic or 0}"
+
+
 # --- Handlers ---
 
 
@@ -75,14 +182,27 @@ async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         f"{'=' * 30}\n\n"
         "Commands:\n"
         "  /ask <prompt>    - Ask Claude Code\n"
+        "  /nocache <prompt> - Ask, bypassing cache\n"
         "  /shell <cmd>     - Run shell command\n"
+        "  /resetshell      - Restart your shell session\n"
+        "  /bg <cmd>        - Run command in background\n"
+        "  /jobs [kill <id>] - Background jobs\n"
+        "  /tail <id> [n]   - Last lines of a job's output\n"
+        "  /each <glob> <cmd> - Run in matching projects\n"
+        "  /askeach <glob> <prompt> - Ask in matching projects\n"
         "  /project <path>  - Switch project\n"
         "  /model <name>    - Change model\n"
         "  /continue [msg]  - Continue conversation\n"
+        "  /sessions [n]    - List or switch sessions\n"
         "  /system <prompt> - Set system prompt\n"
         "  /maxturns <n>    - Set max turns\n"
-        "  /history         - Recent commands\n"
+        "  /history [failed|here] - Your recent commands\n"
+        "  /search <words>  - Search command history\n"
         "  /settings        - Current settings\n"
+        "  /status          - Queue and runtime status\n"
+        "  /cancel [id|all] - Stop running jobs\n"
+        "  /usage [all]     - Token and cost usage\n"
+        "  /stats [week] [all] - Runs, failures and latency\n"
         "  /help            - This help\n\n"
         "Tip: Type any text to send directly to Claude Code."
     )
@@ -113,6 +233,19 @@ async def ask_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     await _execute_claude_and_reply(update, context, prompt, project, user_id)
 
 
+@user_id_required
+async def nocache_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /nocache <prompt> command (bypass the result cache)."""
+    if not context.args:
+        await update.message.reply_text("Usage: /nocache <prompt>")  # type: ignore[union-attr]
+        return
+
+    prompt = " ".join(context.args)
+    project = _get_project(context)
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    await _execute_claude_and_reply(update, context, prompt, project, user_id, use_cache=False)
+
+
 @user_id_required
 async def shell_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /shell <cmd> command."""
@@ -123,18 +256,203 @@ async def shell_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     command = " ".join(context.args)
     user_id = str(update.effective_user.id)  # type: ignore[union-attr]
     project = _get_project(context)
+    config = get_config()
+
+    tail: LiveTail | None = None
+    if config.shell.streaming:
+        placeholder = await update.message.reply_text(f"$ {command}\nStarting...")  # type: ignore[union-attr]
+        tail = LiveTail(
+            placeholder,
+            header=f"$ {command}",
+            lines=config.shell.tail_lines,
+            min_interval=config.shell.stream_edit_interval,
+        )
+
+    async def _on_queued(position: int) -> None:
+        if tail is not None:
+            await placeholder.edit_text(f"$ {command}\nQueued #{position}...")
+        else:
+            await update.message.reply_text(f"Queued #{position}...")  # type: ignore[union-attr]
+
+    async def _run() -> ExecutionResult:
+        if tail is None:
+            return await _get_shell_runner().execute(command, user_id, cwd=project)
+        tail.start()
+        return await _get_shell_runner().execute(command, user_id, cwd=project, on_output=tail.feed)
+
+    try:
+        result = await _get_scheduler().submit(user_id, project, _run, on_queued=_on_queued)
+    except QueueFullError as e:
+        if tail is not None:
+            await tail.stop()
+        await update.message.reply_text(f"{e}. Try again later.")  # type: ignore[union-attr]
+        return
 
-    result = await _get_shell_runner().execute(command, user_id, cwd=project)
     message = format_shell_result(result, command)
+    if tail is not None and tail.has_output:
+        # The tail message becomes the result; the full output follows as a file if it doesn't fit
+        await tail.finish(format_shell_status(result), output=format_output(result))
+        if len(message) > MAX_TELEGRAM_LENGTH:
+            await send_file(update, message, name="shell-output.txt", caption=f"Full output of $ {command}"[:1024])
+        return
+
+    if tail is not None:
+        await tail.stop()
+        try:
+            await placeholder.delete()
+        except Exception:
+            pass
     await send_long_message(update, message)
 
 
+@user_id_required
+async def resetshell_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /resetshell command: discard the user's persistent shell session."""
+    sessions = _get_shell_runner().sessions
+    if sessions is None:
+        await update.message.reply_text("Shell sessions are disabled (shell.sessions).")  # type: ignore[union-attr]
+        return
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    session = sessions.get(user_id)
+    if session is not None and session.lock.locked():
+        await update.message.reply_text("A command is still running; use /cancel first.")  # type: ignore[union-attr]
+        return
+    if await sessions.discard(user_id):
+        await update.message.reply_text("Shell session closed; the next command starts a fresh one.")  # type: ignore[union-attr]
+    else:
+        await update.message.reply_text("No shell session to reset.")  # type: ignore[union-attr]
+
+
+@user_id_required
+async def bg_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /bg <cmd> command: run a detached job with output spooled to disk."""
+    if not context.args:
+        await update.message.reply_text("Usage: /bg <command>")  # type: ignore[union-attr]
+        return
+
+    command = " ".join(context.args)
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    chat_id = update.effective_chat.id if update.effective_chat else None
+    try:
+        job = await _get_job_manager().start(command, user_id, _get_project(context), chat_id=chat_id)
+    except JobError as e:
+        await update.message.reply_text(str(e))  # type: ignore[union-attr]
+        return
+    await update.message.reply_text(  # type: ignore[union-attr]
+        f"Started background job #{job.id}: {command}\n"
+        f"You'll be notified when it exits. /tail {job.id} for output, /jobs kill {job.id} to stop it."
+    )
+
+
+@user_id_required
+async def jobs_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /jobs [kill <id>] command."""
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    manager = _get_job_manager()
+
+    if context.args and context.args[0].lower() == "kill":
+        try:
+            job_id = int(context.args[1].lstrip("#"))
+        except (IndexError, ValueError):
+            await update.message.reply_text("Usage: /jobs kill <id>")  # type: ignore[union-attr]
+            return
+        if await manager.cancel(job_id, user_id):
+            await update.message.reply_text(f"Stopping background job #{job_id}.")  # type: ignore[union-attr]
+        else:
+            await update.message.reply_text(f"No running background job #{job_id}.")  # type: ignore[union-attr]
+        return
+
+    jobs = await manager.list(user_id)
+    if not jobs:
+        await update.message.reply_text("No background jobs. Start one with /bg <command>.")  # type: ignore[union-attr]
+        return
+    lines = ["Background jobs:"]
+    lines.extend(f"  {format_job_line(job)}" for job in jobs)
+    await update.message.reply_text("\n".join(lines))  # type: ignore[union-attr]
+
+
+@user_id_required
+async def tail_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /tail <id> [lines] command."""
+    args = context.args or []
+    try:
+        job_id = int(args[0].lstrip("#"))
+        lines = int(args[1]) if len(args) > 1 else get_config().shell.tail_lines
+    except (IndexError, ValueError):
+        await update.message.reply_text("Usage: /tail <id> [lines]")  # type: ignore[union-attr]
+        return
+
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    job = await _get_job_manager().get(job_id, user_id)
+    if job is None:
+        await update.message.reply_text(f"No background job #{job_id}.")  # type: ignore[union-attr]
+        return
+    try:
+        output = tail_file(job.spool_path, lines=max(1, min(lines, 200)))
+    except OSError:
+        output = "(output file is gone)"
+    await send_long_message(update, f"{format_job_line(job)}\n\n{output or '(no output yet)'}")
+
+
 @user_id_required
 async def exec_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /exec <cmd> command (alias for /shell)."""
     await shell_handler.__wrapped__(update, context)  # type: ignore[attr-defined]
 
 
+@user_id_required
+async def each_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /each <glob> <cmd> command: run a shell command in every matching project."""
+    if not context.args or len(context.args) < 2:
+        await update.message.reply_text("Usage: /each <project glob> <command>")  # type: ignore[union-attr]
+        return
+
+    pattern, command = context.args[0], " ".join(context.args[1:])
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+
+    async def _run(project: Path) -> ExecutionResult:
+        # Fan-out ignores the persistent session: its cwd and state belong to /shell
+        return await _get_scheduler().submit(
+            user_id,
+            str(project),
+            lambda: _get_shell_runner().execute(command, user_id, cwd=str(project), use_session=False),
+        )
+
+    await _fan_out_and_reply(update, pattern, f"$ {command}", _run)
+
+
+@user_id_required
+async def askeach_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /askeach <glob> <prompt> command: ask Claude the same prompt in every matching project."""
+    if not context.args or len(context.args) < 2:
+        await update.message.reply_text("Usage: /askeach <project glob> <prompt>")  # type: ignore[union-attr]
+        return
+
+    pattern, prompt = context.args[0], " ".join(context.args[1:])
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    model = context.user_data.get("model", "")  # type: ignore[union-attr]
+    max_turns = context.user_data.get("max_turns", 0)  # type: ignore[union-attr]
+    system_prompt = context.user_data.get("system_prompt", "")  # type: ignore[union-attr]
+    thread = _get_thread(update)
+
+    async def _run(project: Path) -> ExecutionResult:
+        return await _get_scheduler().submit(
+            user_id,
+            str(project),
+            lambda: _get_claude_runner().execute(
+                prompt=prompt,
+                project_path=str(project),
+                user_id=user_id,
+                model=model,
+                max_turns=max_turns,
+                system_prompt=system_prompt,
+                thread=thread,
+            ),
+        )
+
+    await _fan_out_and_reply(update, pattern, f"Claude: {prompt}", _run)
+
+
 @user_id_required
 async def project_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /project [path] command."""
@@ -161,9 +479,7 @@ async def model_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         current = context.user_data.get("model", get_config().claude.default_model)  # type: ignore[union-attr]
         available = ", ".join(MODEL_ALIASES.keys())
         await update.message.reply_text(  # type: ignore[union-attr]
-            f"Current model: {current}\n"
-            f"Available: {available}\n\n"
-            "Usage: /model <name>"
+            f"Current model: {current}\nAvailable: {available}\n\nUsage: /model <name>"
         )
         return
 
@@ -243,22 +559,106 @@ async def continue_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await _execute_claude_and_reply(update, context, prompt, project, user_id, force_continue=True)
 
 
+def _history_filters(words: list[str], context: ContextTypes.DEFAULT_TYPE) -> HistoryFilters:
+    """get_history filters for /history words. Raises ValueError on an unknown word."""
+    filters: HistoryFilters = {}
+    for word in words:
+        if word in HISTORY_FILTERS:
+            filters.update(HISTORY_FILTERS[word])
+        elif word.startswith("exit=") and word[5:].lstrip("-").isdigit():
+            filters["exit_code"] = int(word[5:])
+        elif word == "here":
+            filters["project"] = str(Path(_get_project(context)).expanduser().resolve())
+        else:
+            raise ValueError(word)
+    return filters
+
+
+async def _history_message(
+    context: ContextTypes.DEFAULT_TYPE,
+    user_id: str,
+    words: list[str],
+    before: int | None = None,
+    after: int | None = None,
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Text and older/newer buttons for one page of a user's history."""
+    filters = _history_filters(words, context)
+    filters["user_id"] = user_id
+    page = await get_history(**filters, before=before, after=after, limit=HISTORY_PAGE_SIZE)
+    if not page.rows:
+        return ("No matching commands." if words else "No command history yet."), None
+
+    # Button data carries the page edge and the filter words: "h:<o|n>:<id>:<words>"
+    suffix = ",".join(words)
+    buttons = []
+    if page.has_older:
+        buttons.append(InlineKeyboardButton("« Older", callback_data=f"h:o:{page.rows[-1]['id']}:{suffix}"))
+    if page.has_newer:
+        buttons.append(InlineKeyboardButton("Newer »", callback_data=f"h:n:{page.rows[0]['id']}:{suffix}"))
+    return format_history_page(page, words), InlineKeyboardMarkup([buttons]) if buttons else None
+
+
 @user_id_required
 async def history_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handle /history command."""
-    rows = await get_recent_commands(limit=10)
+    """Handle /history [ok|failed|exit=N] [shell|claude] [here] command."""
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    words = [arg.lower() for arg in context.args or []]
+    try:
+        text, buttons = await _history_message(context, user_id, words)
+    except ValueError:
+        await update.message.reply_text(HISTORY_USAGE)  # type: ignore[union-attr]
+        return
+    await update.message.reply_text(text, reply_markup=buttons)  # type: ignore[union-attr]
 
-    if not rows:
-        await update.message.reply_text("No command history yet.")  # type: ignore[union-attr]
+
+@user_id_required
+async def history_page_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the older/newer buttons under a /history page."""
+    query = update.callback_query
+    if query is None or query.data is None:
+        return
+    await query.answer()
+    try:
+        _, direction, edge, suffix = query.data.split(":", 3)
+        words = [word for word in suffix.split(",") if word]
+        text, buttons = await _history_message(
+            context,
+            str(update.effective_user.id),  # type: ignore[union-attr]
+            words,
+            before=int(edge) if direction == "o" else None,
+            after=int(edge) if direction == "n" else None,
+        )
+    except ValueError:
         return
+    # Telegram rejects an edit that changes nothing (e.g. a double tap)
+    with contextlib.suppress(BadRequest):
+        await query.edit_message_text(text, reply_markup=buttons)
 
-    lines = ["Recent commands:\n"]
-    for i, row in enumerate(rows, 1):
-        status = "OK" if row["exit_code"] == 0 else f"ERR({row['exit_code']})"
-        cmd = row["command"][:50] + ("..." if len(row["command"]) > 50 else "")
-        lines.append(f"{i}. [{status}] {cmd} ({row['execution_time_ms']}ms)")
 
-    await update.message.reply_text("\n".join(lines))  # type: ignore[union-attr]
+@user_id_required
+async def search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /search [-a cursor] <query> command."""
+    args = list(context.args or [])
+    after = None
+    if len(args) >= 2 and args[0] in ("-a", "--after"):
+        after = args[1]
+        args = args[2:]
+    query = " ".join(args)
+    if not query:
+        await update.message.reply_text(SEARCH_USAGE)  # type: ignore[union-attr]
+        return
+
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    try:
+        rows, more = await search_commands(query, user_id=user_id, limit=SEARCH_PAGE_SIZE, after=after)
+    except ValueError:
+        await update.message.reply_text(SEARCH_USAGE)  # type: ignore[union-attr]
+        return
+    if not rows:
+        await update.message.reply_text("No matches." if after is None else "No more matches.")  # type: ignore[union-attr]
+        return
+    next_after = search_cursor(rows[-1]) if more else None
+    await send_long_message(update, format_search_results(rows, query, next_after))
 
 
 @user_id_required
@@ -286,9 +686,231 @@ async def settings_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     )
 
 
+@user_id_required
+async def status_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /status command."""
+    stats = _get_scheduler().stats()
+    lines = [
+        "Runtime Status",
+        "=" * 25,
+        f"Running: {stats['running']}/{stats['workers']}",
+        f"Queued: {stats['queued']}",
+        f"Completed: {stats['completed']} (failed: {stats['failed']})",
+        f"Cancelled: {stats['cancelled']} | Rejected: {stats['rejected']}",
+        f"Queue wait: avg {format_duration(stats['avg_wait_ms'])}, max {format_duration(stats['max_wait_ms'])}",
+    ]
+    coalesced = _get_claude_runner().inflight.coalesced + _get_shell_runner().inflight.coalesced
+    if coalesced:
+        lines.append(f"Coalesced: {coalesced} duplicate runs")
+    cache = _get_claude_runner().cache
+    if cache is not None:
+        cache_stats = cache.stats()
+        lines.append(
+            f"Result cache: {cache_stats['entries']} entries, "
+            f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+        )
+    sessions = _get_shell_runner().sessions
+    if sessions is not None:
+        lines.append(f"Shell sessions: {len(sessions)}")
+    pool = _get_claude_runner().pool
+    if pool is not None:
+        pool_stats = pool.stats()
+        lines.append(f"Warm pool: {pool_stats['idle']} idle, {pool_stats['hits']} hits / {pool_stats['misses']} misses")
+    writes = history_stats()
+    if writes is not None and writes["batches"]:
+        lines.append(
+            f"History writes: {writes['rows']} rows in {writes['batches']} commits "
+            f"(avg batch {writes['avg_batch']}, avg commit {writes['avg_commit_ms']}ms, "
+            f"max {writes['max_commit_ms']}ms, pending {writes['pending']})"
+        )
+        if writes["dropped"]:
+            lines.append(f"History rows dropped after failed commits: {writes['dropped']}")
+    readers = reader_stats()
+    if readers is not None:
+        lines.append(f"History readers: {readers['size']} ({readers['reads']} reads, {readers['waits']} waited)")
+
+    await update.message.reply_text("\n".join(lines))  # type: ignore[union-attr]
+
+
+@user_id_required
+async def cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /cancel [job id|all] command."""
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    running = process_registry.list(user_id)
+
+    if context.args and context.args[0].lower() == "all":
+        count = await process_registry.cancel_all(user_id)
+        await update.message.reply_text(f"Cancelled {count} job(s).")  # type: ignore[union-attr]
+        return
+
+    if context.args:
+        try:
+            job_id = int(context.args[0].lstrip("#"))
+        except ValueError:
+            await update.message.reply_text("Usage: /cancel [job id|all]")  # type: ignore[union-attr]
+            return
+    elif len(running) == 1:
+        job_id = running[0].id
+    elif not running:
+        await update.message.reply_text("No running jobs.")  # type: ignore[union-attr]
+        return
+    else:
+        now = time.monotonic()
+        lines = ["Running jobs:"]
+        for entry in running:
+            elapsed = format_duration(int((now - entry.started_at) * 1000))
+            lines.append(f"  #{entry.id} {entry.label[:60]} ({elapsed})")
+        lines.append("\nUse /cancel <id> or /cancel all")
+        await update.message.reply_text("\n".join(lines))  # type: ignore[union-attr]
+        return
+
+    if await process_registry.cancel(job_id, user_id):
+        await update.message.reply_text(f"Cancelled job #{job_id}.")  # type: ignore[union-attr]
+    else:
+        await update.message.reply_text(f"No running job #{job_id}.")  # type: ignore[union-attr]
+
+
+@user_id_required
+async def sessions_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /sessions [n] command: list this chat's Claude sessions or switch to one."""
+    project = str(Path(_get_project(context)).expanduser().resolve())
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    thread = _get_thread(update)
+    sessions = await get_claude_sessions(user_id, project, thread)
+
+    if not sessions:
+        await update.message.reply_text("No Claude sessions for this project yet.")  # type: ignore[union-attr]
+        return
+
+    if context.args:
+        try:
+            index = int(context.args[0])
+        except ValueError:
+            index = 0
+        if not 1 <= index <= len(sessions):
+            await update.message.reply_text(f"Usage: /sessions [1-{len(sessions)}]")  # type: ignore[union-attr]
+            return
+        session = sessions[index - 1]
+        await save_claude_session(user_id, project, thread, session["session_id"], session["title"])
+        await update.message.reply_text(  # type: ignore[union-attr]
+            f"Switched to session {index}: {session['title'][:60]}\nUse /continue to resume it."
+        )
+        return
+
+    now = time.time()
+    lines = [f"Sessions | {Path(project).name}", "=" * 25]
+    for i, session in enumerate(sessions, 1):
+        marker = "*" if i == 1 else " "
+        age = format_duration(int((now - session["last_used"]) * 1000))
+        lines.append(f"{marker} {i}. {session['title'][:50]} ({age} ago)")
+    lines.append("\n* = resumed by /continue. Use /sessions <n> to switch.")
+    await update.message.reply_text("\n".join(lines))  # type: ignore[union-attr]
+
+
+@user_id_required
+async def usage_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /usage [all] command: Claude spend against quotas, from daily aggregates."""
+    user_id = str(update.effective_user.id)  # type: ignore[union-attr]
+    tracker = _get_claude_runner().usage
+    day = today()
+    since = month_start(day)
+
+    if context.args and context.args[0].lower() == "all":
+        rows = await get_usage_totals(since, group_by="user_id")
+        lines = [f"Usage since {since} | all users", "=" * 25]
+        for row in rows:
+            tokens = row["input_tokens"] + row["output_tokens"]
+            lines.append(f"{row['name']}: ${row['cost_usd']:.2f}, {tokens:,} tokens, {row['runs']} runs")
+        if not rows:
+            lines.append("No usage recorded yet.")
+        await update.message.reply_text("\n".join(lines))  # type: ignore[union-attr]
+        return
+
+    daily, monthly = await tracker.spend(user_id, day)
+    quota = tracker.quota_for(user_id)
+
+    def _line(label: str, cost: float, tokens: int, cost_limit: float, token_limit: int) -> str:
+        cost_label = f"${cost:.2f}" + (f" / ${cost_limit:.2f}" if cost_limit else "")
+        token_label = f"{tokens:,}" + (f" / {token_limit:,}" if token_limit else "")
+        return f"{label}: {cost_label}, {token_label} tokens"
+
+    lines = [
+        "Claude Usage",
+        "=" * 25,
+        _line("Today", daily.cost_usd, daily.tokens, quota.daily_cost_usd, quota.daily_tokens),
+        _line("This month", monthly.cost_usd, monthly.tokens, quota.monthly_cost_usd, quota.monthly_tokens),
+    ]
+    by_project = await get_usage_totals(since, user_id=user_id, group_by="project")
+    if by_project:
+        lines.append("\nThis month by project:")
+        for row in by_project[:10]:
+            lines.append(f"  {Path(row['name']).name}: ${row['cost_usd']:.2f} ({row['runs']} runs)")
+    await update.message.reply_text("\n".join(lines))  # type: ignore[union-attr]
+
+
+@user_id_required
+async def stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /stats [day|week|month] [all] command: runs, failures and latency, from rollups."""
+    words = [word.lower() for word in context.args or []]
+    if any(word not in RANGES and word != "all" for word in words):
+        await update.message.reply_text(STATS_USAGE)  # type: ignore[union-attr]
+        return
+    range_name = next((word for word in words if word in RANGES), "week")
+    user_id = None if "all" in words else str(update.effective_user.id)  # type: ignore[union-attr]
+
+    period, since = range_start(range_name)
+    totals = await get_stats(since, period, user_id=user_id)
+    by_kind = await get_stats(since, period, ("source", "model"), user_id=user_id)
+    by_program = await get_stats(since, period, ("program",), user_id=user_id, source="telegram")
+    title = f"Stats | last {range_name} | {'all users' if user_id is None else 'you'}"
+    text = format_stats(title, totals, by_kind, by_program)
+    if backlog := await stats_backlog():
+        text += f"\n\n{backlog:,} older commands are not counted yet (cct stats backfill)."
+    await update.message.reply_text(text)  # type: ignore[union-attr]
+
+
 # --- Internal helpers ---
 
 
+async def _fan_out_and_reply(
+    update: Update,
+    pattern: str,
+    label: str,
+    run: Callable[[Path], Awaitable[ExecutionResult]],
+) -> None:
+    """Run `run` across projects matching `pattern`, with live progress and a combined report."""
+    config = get_config()
+    projects = match_projects(pattern, config.claude.default_project)
+    if not projects:
+        await update.message.reply_text(f"No project directories match {pattern}")  # type: ignore[union-attr]
+        return
+    if len(projects) > config.scheduler.fanout_max_projects:
+        await update.message.reply_text(  # type: ignore[union-attr]
+            f"{len(projects)} projects match {pattern}; the limit is {config.scheduler.fanout_max_projects}."
+        )
+        return
+
+    header = f"{label}\nRunning in {len(projects)} projects..."
+    progress = LiveMessage(await update.message.reply_text(header))  # type: ignore[union-attr]
+    finished: list[str] = []
+
+    async def _on_done(done: ProjectResult) -> None:
+        finished.append(format_fanout_line(done))
+        progress.set_text(f"{header} {len(finished)}/{len(projects)}\n\n" + "\n".join(finished[-40:]))
+
+    results = await fan_out(projects, run, config.scheduler.fanout_concurrency, on_done=_on_done)
+    await progress.flush()
+
+    summary = format_fanout_summary(results, label)
+    await send_long_message(update, summary)
+    await send_file(
+        update,
+        format_fanout_report(results, label),
+        name="each-output.txt",
+        caption=f"Combined output ({len(results)} projects)",
+    )
+
+
 async def _execute_claude_and_reply(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
@@ -296,23 +918,72 @@ async def _execute_claude_and_reply(
     project: str,
     user_id: str,
     force_continue: bool = False,
+    use_cache: bool = True,
 ) -> None:
     """Execute Claude Code and send the result."""
-    thinking_msg = await update.message.reply_text("Claude is thinking...")  # type: ignore[union-attr]
-
+    config = get_config()
     model = context.user_data.get("model", "")  # type: ignore[union-attr]
+    thinking = "Claude is thinking..."
+    eta_ms = await _get_claude_runner().estimate_ms(project, model)
+    if eta_ms is not None:
+        thinking += f" (usually ~{format_duration(eta_ms)})"
+    thinking_msg = await update.message.reply_text(thinking)  # type: ignore[union-attr]
+
     max_turns = context.user_data.get("max_turns", 0)  # type: ignore[union-attr]
     system_prompt = context.user_data.get("system_prompt", "")  # type: ignore[union-attr]
 
-    result = await _get_claude_runner().execute(
-        prompt=prompt,
-        project_path=project,
-        user_id=user_id,
-        model=model,
-        max_turns=max_turns,
-        system_prompt=system_prompt,
-        continue_conversation=force_continue,
-    )
+    project_name = Path(project).name
+    stream: StreamingReply | None = None
+    if config.claude.streaming:
+        stream = StreamingReply(
+            thinking_msg,
+            header=f"Claude | {project_name}\n\n",
+            min_interval=config.claude.stream_edit_interval,
+        )
+
+    queued = False
+
+    async def _on_queued(position: int) -> None:
+        nonlocal queued
+        queued = True
+        await thinking_msg.edit_text(f"Queued #{position}, waiting for a free worker...")
+
+    async def _run() -> ExecutionResult:
+        if queued:
+            try:
+                await thinking_msg.edit_text(thinking)
+            except Exception:
+                pass
+        return await _get_claude_runner().execute(
+            prompt=prompt,
+            project_path=project,
+            user_id=user_id,
+            model=model,
+            max_turns=max_turns,
+            system_prompt=system_prompt,
+            continue_conversation=force_continue,
+            on_output=stream.append if stream is not None else None,
+            use_cache=use_cache,
+            thread=_get_thread(update),
+        )
+
+    try:
+        result = await _get_scheduler().submit(user_id, project, _run, on_queued=_on_queued)
+    except QueueFullError as e:
+        await thinking_msg.edit_text(f"{e}. Try again later.")
+        return
+
+    # Streamed output already lives in the placeholder; just close it off
+    if stream is not None and stream.has_output:
+        elapsed = format_duration(result.execution_time_ms)
+        if result.cached:
+            footer = f"\n\n[{elapsed} (cached)]"
+        elif result.exit_code == 0:
+            footer = f"\n\n[{elapsed}]"
+        else:
+            footer = f"\n\n[ERR({result.exit_code}) | {elapsed}]\n{result.stderr}".rstrip()
+        await stream.finish(footer)
+        return
 
     # Delete the "thinking" message
     try:
@@ -321,6 +992,5 @@ async def _execute_claude_and_reply(
         pass
 
     # Format and send result
-    project_name = Path(project).name
     message = format_claude_result(result, project_name)
     await send_long_message(update, message)
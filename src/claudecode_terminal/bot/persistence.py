@@ -0,0 +1,134 @@
+"""Per-user bot settings kept in the history database across restarts."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from claudecode_terminal.storage.database import delete_user_state, load_user_state, save_user_state
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value: object) -> str | None:
+    try:
+        return json.dumps(value, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+
+
+class SQLitePersistence(BasePersistence[dict[Any, Any], dict[Any, Any], dict[Any, Any]]):
+    """`context.user_data` backed by the `user_state` table.
+
+    Everything is read in one query when the application starts. After
+    that PTB's own dicts are the cache: every `update_interval` seconds it
+    hands over the users whose updates ran, and only keys whose JSON differs
+    from what was last stored are queued. All changes from one round go to
+    the database in a single transaction, off the update path. Values that
+    are not JSON-serializable stay in memory only. Chat, bot, callback and
+    conversation data are not persisted.
+    """
+
+    def __init__(self, update_interval: float = 10.0) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        # JSON of each stored (or queued) value, by user and key
+        self._stored: dict[int, dict[str, str]] = {}
+        self._dirty: dict[tuple[int, str], str | None] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+
+    async def get_user_data(self) -> dict[int, dict[Any, Any]]:
+        self._stored = await load_user_state()
+        data: dict[int, dict[Any, Any]] = {}
+        for user_id, values in self._stored.items():
+            data[user_id] = {key: json.loads(value) for key, value in values.items()}
+        logger.info("Loaded settings for %d users", len(data))
+        return data
+
+    async def update_user_data(self, user_id: int, data: dict[Any, Any]) -> None:
+        stored = self._stored.setdefault(user_id, {})
+        kept: set[str] = set()
+        for key, value in data.items():
+            encoded = _encode(value) if isinstance(key, str) else None
+            if encoded is None:
+                logger.debug("Not persisting user_data[%r] of user %d", key, user_id)
+                continue
+            kept.add(key)
+            if stored.get(key) != encoded:
+                stored[key] = encoded
+                self._dirty[(user_id, key)] = encoded
+        for key in stored.keys() - kept:
+            del stored[key]
+            self._dirty[(user_id, key)] = None
+        if not stored:
+            del self._stored[user_id]
+        if self._dirty and (self._task is None or self._task.done()):
+            # Runs once every update_user_data() of this round has been called
+            self._task = asyncio.ensure_future(self._write())
+
+    async def drop_user_data(self, user_id: int) -> None:
+        async with self._lock:
+            self._stored.pop(user_id, None)
+            self._dirty = {key: value for key, value in self._dirty.items() if key[0] != user_id}
+            await delete_user_state(user_id)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict[Any, Any]) -> None:
+        """Nothing to do: this process is the only writer."""
+
+    async def flush(self) -> None:
+        """Write whatever is still queued (called on application shutdown)."""
+        if self._task is not None:
+            await self._task
+        await self._write()
+
+    async def _write(self) -> None:
+        async with self._lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            try:
+                await save_user_state([(user_id, key, value) for (user_id, key), value in batch.items()])
+            except Exception:
+                logger.exception("Failed to save user settings")
+                # Retry with the next round; changes queued meanwhile are newer
+                self._dirty = {**batch, **self._dirty}
+
+    async def get_chat_data(self) -> dict[int, dict[Any, Any]]:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict[Any, Any]) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict[Any, Any]) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict[Any, Any]:
+        return {}
+
+    async def update_bot_data(self, data: dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict[Any, Any]) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def get_conversations(self, name: str) -> dict[tuple[int | str, ...], object]:
+        return {}
+
+    async def update_conversation(self, name: str, key: tuple[int | str, ...], new_state: object | None) -> None:
+        pass
@@ -0,0 +1,196 @@
+"""Live-edited Telegram messages for streaming output."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+
+from telegram.error import RetryAfter, TelegramError
+
+from claudecode_terminal.utils.formatting import MAX_TELEGRAM_LENGTH, format_bytes, format_duration, split_message
+
+if TYPE_CHECKING:
+    from telegram import Message
+
+logger = logging.getLogger(__name__)
+
+# Longest line shown in a live tail; progress bars and minified output get cut
+TAIL_LINE_CHARS = 300
+
+
+class LiveMessage:
+    """A Telegram message edited in place with coalesced, rate-limited updates.
+
+    `set_text()` never blocks: it records the latest desired text and makes sure
+    a single background task applies it no more often than `min_interval`.
+    Intermediate texts that arrive in between are dropped.
+    """
+
+    def __init__(self, message: Message, min_interval: float = 1.5) -> None:
+        self.message = message
+        self._min_interval = min_interval
+        self._shown = message.text or ""
+        self._pending: str | None = None
+        self._next_edit_at = 0.0
+        self._task: asyncio.Task[None] | None = None
+
+    def set_text(self, text: str) -> None:
+        """Schedule the message to show `text`."""
+        self._pending = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._drain())
+
+    async def flush(self) -> None:
+        """Wait until the latest text has been applied."""
+        if self._task is not None:
+            await self._task
+
+    async def _drain(self) -> None:
+        while self._pending is not None:
+            delay = self._next_edit_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text, self._pending = self._pending, None
+            await self._edit(text)
+
+    async def _edit(self, text: str) -> None:
+        if text == self._shown or not text.strip():
+            return
+        try:
+            await self.message.edit_text(text)
+        except RetryAfter as e:
+            retry_after = e.retry_after if isinstance(e.retry_after, (int, float)) else e.retry_after.total_seconds()
+            logger.debug("Edit rate limited, retrying in %ss", retry_after)
+            if self._pending is None:
+                self._pending = text
+            self._next_edit_at = time.monotonic() + retry_after
+            return
+        except TelegramError as e:
+            logger.debug("Failed to edit live message: %s", e)
+        else:
+            self._shown = text
+        self._next_edit_at = time.monotonic() + self._min_interval
+
+
+class StreamingReply:
+    """Append-only streamed reply that rolls over to new messages past Telegram's limit."""
+
+    def __init__(self, placeholder: Message, header: str = "", min_interval: float = 1.5) -> None:
+        self._min_interval = min_interval
+        self._live = LiveMessage(placeholder, min_interval)
+        self._header = header
+        self._body = ""
+        self.has_output = False
+
+    async def append(self, chunk: str) -> None:
+        """Add streamed text, starting a new message whenever the current one is full."""
+        self.has_output = True
+        self._body += chunk
+        while len(self._header) + len(self._body) > MAX_TELEGRAM_LENGTH:
+            head = split_message(self._body, MAX_TELEGRAM_LENGTH - len(self._header))[0]
+            self._live.set_text(self._header + head)
+            await self._live.flush()
+            self._body = self._body[len(head) :].lstrip("\n")
+            self._header = ""
+            next_message = await self._live.message.reply_text("...")
+            self._live = LiveMessage(next_message, self._min_interval)
+        self._live.set_text(self._header + self._body)
+
+    async def finish(self, footer: str = "") -> None:
+        """Append a closing footer and wait for the final edit to land."""
+        if footer:
+            await self.append(footer)
+        await self._live.flush()
+
+
+class LiveTail:
+    """Live `tail -n` view of a running command: its last lines, elapsed time and output size.
+
+    `feed()` is a text callback for the runner. While the command is silent,
+    a ticker still refreshes the elapsed time every `tick` seconds.
+    """
+
+    def __init__(
+        self,
+        message: Message,
+        header: str,
+        lines: int = 20,
+        min_interval: float = 1.5,
+        tick: float = 5.0,
+    ) -> None:
+        self._live = LiveMessage(message, min_interval)
+        self._header = header
+        self._lines: deque[str] = deque(maxlen=max(lines, 1))
+        self._partial = ""
+        self._tick = tick
+        self._ticker: asyncio.Task[None] | None = None
+        self._started = time.monotonic()
+        self.total_bytes = 0
+        self.has_output = False
+
+    def start(self) -> None:
+        """Start the clock (call when the command actually starts running)."""
+        self._started = time.monotonic()
+        self._live.set_text(self.render())
+        if self._ticker is None:
+            self._ticker = asyncio.ensure_future(self._tick_loop())
+
+    async def feed(self, text: str) -> None:
+        self.has_output = True
+        self.total_bytes += len(text.encode())
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        self._lines.extend(lines)
+        self._live.set_text(self.render())
+
+    def render(self, status: str = "") -> str:
+        """Header, status line, then as many of the last lines as fit in one message."""
+        if not status:
+            elapsed = format_duration(int((time.monotonic() - self._started) * 1000))
+            status = f"Running | {elapsed} | {format_bytes(self.total_bytes)}"
+        top = f"{self._header}\n{status}\n\n"
+        lines = [_visible(line) for line in (*self._lines, self._partial)]
+        while lines and not lines[-1]:
+            lines.pop()
+        body = "\n".join(lines)
+        room = MAX_TELEGRAM_LENGTH - len(top)
+        if len(body) > room:
+            body = body[-room:].split("\n", 1)[-1]
+        return top + body
+
+    async def stop(self) -> None:
+        """Stop refreshing without a final edit."""
+        if self._ticker is not None:
+            self._ticker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._ticker
+            self._ticker = None
+
+    async def finish(self, status: str, output: str | None = None) -> None:
+        """Replace the running status line with `status` and wait for the final edit to land.
+
+        `output`, if given and short enough, replaces the tail with the complete output.
+        """
+        await self.stop()
+        text = self.render(status)
+        if output is not None:
+            full = f"{self._header}\n{status}\n\n{output}"
+            if len(full) <= MAX_TELEGRAM_LENGTH:
+                text = full
+        self._live.set_text(text)
+        await self._live.flush()
+
+    async def _tick_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._tick)
+            self._live.set_text(self.render())
+
+
+def _visible(line: str) -> str:
+    """What a terminal would show for a line: the text after its last carriage return."""
+    line = line.rstrip("\r").rsplit("\r", 1)[-1]
+    return line if len(line) <= TAIL_LINE_CHARS else line[: TAIL_LINE_CHARS - 3] + "..."
@@ -5,38 +5,78 @@ from __future__ import annotations
 import asyncio
 import logging
 import sys
+from collections.abc import Awaitable, Callable
+from datetime import datetime
 from pathlib import Path
+from typing import Any, TypeVar
 
 import typer
 from rich.console import Console
+from rich.markup import escape
 from rich.table import Table
 
 from claudecode_terminal import __version__
 from claudecode_terminal.config import (
-    CONFIG_DIR,
     CONFIG_FILE,
     LOG_FILE,
     MODEL_ALIASES,
     PID_FILE,
     AppConfig,
     BotConfig,
+    CacheConfig,
     ClaudeConfig,
+    LimitsConfig,
     LoggingConfig,
+    PolicyConfig,
+    QuotaConfig,
+    SchedulerConfig,
     ShellConfig,
     StorageConfig,
+    TimeoutsConfig,
     ensure_config_dir,
     load_config,
     save_config,
 )
 from claudecode_terminal.daemon import daemonize, read_pid, stop_daemon, write_pid
+from claudecode_terminal.storage.database import (
+    MARK_END,
+    MARK_START,
+    backfill_stats,
+    close_db,
+    get_stats,
+    init_storage,
+    search_commands,
+    search_cursor,
+    stats_backlog,
+)
+from claudecode_terminal.storage.export import (
+    EXPORT_BATCH,
+    check_export,
+    compression_for,
+    export_history,
+    read_state,
+    write_state,
+)
+from claudecode_terminal.storage.maintenance import HistoryMaintenance
+from claudecode_terminal.storage.rollups import DIMENSIONS, RANGES, range_start, summarize
+from claudecode_terminal.utils.formatting import format_bytes, format_duration
 from claudecode_terminal.utils.system import check_claude_cli, check_project_dir
 
+T = TypeVar("T")
+
 app = typer.Typer(
     name="claudecode-terminal",
     help="Control Claude Code remotely via Telegram.",
     add_completion=False,
 )
 console = Console()
+# Messages for commands whose stdout may carry data
+err_console = Console(stderr=True)
+
+history_app = typer.Typer(help="Search and maintain command history.", add_completion=False)
+app.add_typer(history_app, name="history")
+stats_app = typer.Typer(help="Run, failure and latency stats from precomputed rollups.", add_completion=False)
+app.add_typer(stats_app, name="stats")
 
 
 @app.command()
@@ -73,7 +113,7 @@ def init() -> None:
             allowed_users = [int(uid.strip()) for uid in user_ids_str.split(",") if uid.strip()]
         except ValueError:
             console.print("[red]Invalid user ID format. Use numbers only.[/red]")
-            raise typer.Exit(1)
+            raise typer.Exit(1) from None
 
     # 4. Default project directory
     console.print("\n[bold]Step 3:[/bold] Default Project Directory")
@@ -99,6 +139,12 @@ def init() -> None:
         bot=BotConfig(token=token, allowed_users=allowed_users),
         claude=ClaudeConfig(default_project=default_project, default_model=default_model),
         shell=ShellConfig(),
+        scheduler=SchedulerConfig(),
+        cache=CacheConfig(),
+        limits=LimitsConfig(),
+        timeouts=TimeoutsConfig(),
+        quotas=QuotaConfig(),
+        policy=PolicyConfig(),
         storage=StorageConfig(),
         logging=LoggingConfig(),
     )
@@ -152,7 +198,7 @@ def start(
     )
 
     if daemon:
-        console.print(f"Starting bot in background...")
+        console.print("Starting bot in background...")
         log_path = Path(config.logging.file).expanduser().resolve()
         log_path.parent.mkdir(parents=True, exist_ok=True)
         daemonize(log_path)
@@ -160,7 +206,7 @@ def start(
     write_pid(PID_FILE)
 
     if not daemon:
-        console.print(f"[green]Bot started![/green] Send /help to your bot on Telegram.")
+        console.print("[green]Bot started![/green] Send /help to your bot on Telegram.")
         console.print("Press Ctrl+C to stop.\n")
 
     try:
@@ -227,9 +273,78 @@ def config(
         table.add_row("claude.default_model", cfg.claude.default_model)
         table.add_row("claude.timeout", str(cfg.claude.timeout))
         table.add_row("claude.max_output", str(cfg.claude.max_output))
+        table.add_row("claude.streaming", str(cfg.claude.streaming))
+        table.add_row("claude.stream_edit_interval", str(cfg.claude.stream_edit_interval))
+        table.add_row("claude.backend", cfg.claude.backend)
+        table.add_row("claude.pool_size", str(cfg.claude.pool_size))
+        table.add_row("claude.pool_idle_timeout", str(cfg.claude.pool_idle_timeout))
+        table.add_row("claude.pool_max_requests", str(cfg.claude.pool_max_requests))
+        table.add_row("claude.pool_max_rss_mb", str(cfg.claude.pool_max_rss_mb))
+        table.add_row("claude.coalesce", str(cfg.claude.coalesce))
         table.add_row("shell.timeout", str(cfg.shell.timeout))
         table.add_row("shell.enabled", str(cfg.shell.enabled))
+        table.add_row("shell.coalesce_read_only", str(cfg.shell.coalesce_read_only))
+        table.add_row("shell.coalesce_mutating", str(cfg.shell.coalesce_mutating))
+        table.add_row("shell.streaming", str(cfg.shell.streaming))
+        table.add_row("shell.tail_lines", str(cfg.shell.tail_lines))
+        table.add_row("shell.stream_edit_interval", str(cfg.shell.stream_edit_interval))
+        table.add_row("shell.sessions", str(cfg.shell.sessions))
+        table.add_row("shell.session_idle_timeout", str(cfg.shell.session_idle_timeout))
+        table.add_row("shell.max_background_jobs", str(cfg.shell.max_background_jobs))
+        table.add_row("scheduler.workers", str(cfg.scheduler.workers))
+        table.add_row("scheduler.per_user", str(cfg.scheduler.per_user))
+        table.add_row("scheduler.per_project", str(cfg.scheduler.per_project))
+        table.add_row("scheduler.max_queue", str(cfg.scheduler.max_queue))
+        table.add_row("scheduler.fanout_concurrency", str(cfg.scheduler.fanout_concurrency))
+        table.add_row("scheduler.fanout_max_projects", str(cfg.scheduler.fanout_max_projects))
+        table.add_row("cache.enabled", str(cfg.cache.enabled))
+        table.add_row("cache.ttl", str(cfg.cache.ttl))
+        table.add_row("cache.max_entries", str(cfg.cache.max_entries))
+        table.add_row("cache.max_mb", str(cfg.cache.max_mb))
+        table.add_row("limits.enabled", str(cfg.limits.enabled))
+        table.add_row("limits.cgroup_root", cfg.limits.cgroup_root or "(own cgroup)")
+        table.add_row("limits.cpu_weight", str(cfg.limits.cpu_weight))
+        table.add_row("limits.memory_max_mb", str(cfg.limits.memory_max_mb))
+        table.add_row("limits.pids_max", str(cfg.limits.pids_max))
+        table.add_row("limits.sources", str(cfg.limits.sources))
+        table.add_row("limits.users", str(cfg.limits.users))
+        table.add_row("timeouts.adaptive", str(cfg.timeouts.adaptive))
+        table.add_row("timeouts.quantile", str(cfg.timeouts.quantile))
+        table.add_row("timeouts.factor", str(cfg.timeouts.factor))
+        table.add_row("timeouts.min_samples", str(cfg.timeouts.min_samples))
+        table.add_row("timeouts.claude_min", str(cfg.timeouts.claude_min))
+        table.add_row("timeouts.claude_max", str(cfg.timeouts.claude_max))
+        table.add_row("timeouts.shell_min", str(cfg.timeouts.shell_min))
+        table.add_row("timeouts.shell_max", str(cfg.timeouts.shell_max))
+        table.add_row("quotas.daily_cost_usd", str(cfg.quotas.daily_cost_usd or "unlimited"))
+        table.add_row("quotas.monthly_cost_usd", str(cfg.quotas.monthly_cost_usd or "unlimited"))
+        table.add_row("quotas.daily_tokens", str(cfg.quotas.daily_tokens or "unlimited"))
+        table.add_row("quotas.monthly_tokens", str(cfg.quotas.monthly_tokens or "unlimited"))
+        table.add_row("quotas.users", str(cfg.quotas.users))
+        table.add_row("policy.allow", ", ".join(cfg.policy.allow) or "(none)")
+        table.add_row("policy.deny", ", ".join(cfg.policy.deny) or "(none)")
+        table.add_row("policy.users", str(cfg.policy.users))
         table.add_row("storage.db_path", cfg.storage.db_path)
+        table.add_row("storage.spill_output", str(cfg.storage.spill_output))
+        table.add_row("storage.spill_dir", cfg.storage.spill_dir)
+        table.add_row("storage.jobs_dir", cfg.storage.jobs_dir)
+        table.add_row("storage.history_batch_size", str(cfg.storage.history_batch_size))
+        table.add_row("storage.history_flush_ms", str(cfg.storage.history_flush_ms))
+        table.add_row("storage.history_max_pending", str(cfg.storage.history_max_pending))
+        table.add_row("storage.search_output", str(cfg.storage.search_output))
+        table.add_row("storage.retention_days", str(cfg.storage.retention_days))
+        table.add_row("storage.retention_rows", str(cfg.storage.retention_rows))
+        table.add_row("storage.retention_mb", str(cfg.storage.retention_mb))
+        table.add_row("storage.maintenance_interval", str(cfg.storage.maintenance_interval))
+        table.add_row("storage.prune_batch", str(cfg.storage.prune_batch))
+        table.add_row("storage.partition_monthly", str(cfg.storage.partition_monthly))
+        table.add_row("storage.readers", str(cfg.storage.readers))
+        table.add_row("storage.synchronous", str(cfg.storage.synchronous))
+        table.add_row("storage.cache_size_kb", str(cfg.storage.cache_size_kb))
+        table.add_row("storage.mmap_size_mb", str(cfg.storage.mmap_size_mb))
+        table.add_row("storage.busy_timeout_ms", str(cfg.storage.busy_timeout_ms))
+        table.add_row("storage.persist_user_data", str(cfg.storage.persist_user_data))
+        table.add_row("storage.state_flush_interval", str(cfg.storage.state_flush_interval))
         table.add_row("logging.level", cfg.logging.level)
 
         console.print(table)
@@ -246,7 +361,19 @@ def config(
         raise typer.Exit(1)
 
     section, attr = parts
-    section_map = {"bot": cfg.bot, "claude": cfg.claude, "shell": cfg.shell, "storage": cfg.storage, "logging": cfg.logging}
+    section_map = {
+        "bot": cfg.bot,
+        "claude": cfg.claude,
+        "shell": cfg.shell,
+        "scheduler": cfg.scheduler,
+        "cache": cfg.cache,
+        "limits": cfg.limits,
+        "timeouts": cfg.timeouts,
+        "quotas": cfg.quotas,
+        "policy": cfg.policy,
+        "storage": cfg.storage,
+        "logging": cfg.logging,
+    }
 
     if section not in section_map:
         console.print(f"[red]Unknown section: {section}[/red]")
@@ -259,18 +386,25 @@ def config(
 
     # Type coercion
     current = getattr(obj, attr)
+    if isinstance(current, dict):
+        console.print(f"[red]{key} is a table; edit it in {CONFIG_FILE}[/red]")
+        raise typer.Exit(1)
+    typed_value: Any
     try:
         if isinstance(current, bool):
             typed_value = value.lower() in ("true", "1", "yes")
         elif isinstance(current, int):
             typed_value = int(value)
+        elif isinstance(current, float):
+            typed_value = float(value)
         elif isinstance(current, list):
-            typed_value = [int(v.strip()) for v in value.split(",") if v.strip()]
+            items = [v.strip() for v in value.split(",") if v.strip()]
+            typed_value = items if section == "policy" else [int(v) for v in items]
         else:
             typed_value = value
     except ValueError:
         console.print(f"[red]Invalid value type for {key}[/red]")
-        raise typer.Exit(1)
+        raise typer.Exit(1) from None
 
     setattr(obj, attr, typed_value)
     save_config(cfg)
@@ -311,11 +445,195 @@ def version() -> None:
     if installed:
         console.print(f"Claude Code CLI: {version_info}")
     else:
-        console.print(f"Claude Code CLI: [yellow]not installed[/yellow]")
+        console.print("Claude Code CLI: [yellow]not installed[/yellow]")
 
     console.print(f"Python: {sys.version.split()[0]}")
     console.print(f"Config: {CONFIG_FILE}")
 
 
+def _with_storage(func: Callable[[], Awaitable[T]]) -> T:
+    """Run `func` against the configured history database."""
+    if not CONFIG_FILE.exists():
+        console.print("[red]Not configured. Run 'claudecode-terminal init'.[/red]")
+        raise typer.Exit(1)
+
+    async def _run() -> T:
+        await init_storage(load_config())
+        try:
+            return await func()
+        finally:
+            await close_db()
+
+    return asyncio.run(_run())
+
+
+def _highlight(snippet: str) -> str:
+    return escape(snippet).replace(MARK_START, "[bold yellow]").replace(MARK_END, "[/bold yellow]")
+
+
+@history_app.command("search")
+def history_search(
+    query: str = typer.Argument(..., help="Words to look for (prefix match)"),
+    after: str = typer.Option(None, "--after", "-a", help="Cursor printed under the previous page"),
+    limit: int = typer.Option(20, "--limit", "-n", min=1, max=500, help="Results per page"),
+    user: str = typer.Option(None, "--user", "-u", help="Only this Telegram user id"),
+) -> None:
+    """Full-text search over command history, best matches first."""
+    try:
+        rows, more = _with_storage(lambda: search_commands(query, user_id=user, limit=limit, after=after))
+    except ValueError:
+        err_console.print(f"[red]Invalid cursor: {escape(after)}[/red]")
+        raise typer.Exit(1) from None
+    if not rows:
+        console.print("[dim]No matches.[/dim]" if after is None else "[dim]No more matches.[/dim]")
+        return
+
+    table = Table(title=f"History matching '{escape(query)}'")
+    table.add_column("ID", justify="right", style="cyan")
+    table.add_column("When", style="dim")
+    table.add_column("User")
+    table.add_column("Exit", justify="right")
+    table.add_column("Match")
+    for row in rows:
+        exit_style = "green" if row["exit_code"] == 0 else "red"
+        table.add_row(
+            str(row["id"]),
+            str(row["created_at"]),
+            row["user_id"],
+            f"[{exit_style}]{row['exit_code']}[/{exit_style}]",
+            _highlight(row["snippet"] or row["command"]),
+        )
+    console.print(table)
+    if more:
+        console.print(
+            f"[dim]More: claudecode-terminal history search {query!r} --after {search_cursor(rows[-1])}[/dim]"
+        )
+
+
+@history_app.command("prune")
+def history_prune() -> None:
+    """Apply the [storage] retention limits now and compact the database."""
+    cfg = load_config()
+    done = _with_storage(lambda: HistoryMaintenance(cfg.storage).run())
+    console.print(
+        f"Deleted {done['deleted']} rows, archived {done['archived']}, "
+        f"expired {done['expired_archives']} archives, released {format_bytes(done['released_bytes'])}"
+    )
+
+
+def _export_time(value: str | None, option: str) -> str | None:
+    """A --since/--until value (ISO date or date and time, UTC) as stored in `created_at`."""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        err_console.print(f"[red]{option} must be a date or date and time, e.g. 2024-06-01 or 2024-06-01T12:00[/red]")
+        raise typer.Exit(1) from None
+
+
+@history_app.command("export")
+def history_export(
+    output: str = typer.Option("-", "--output", "-o", help="File to write, or - for stdout"),
+    fmt: str = typer.Option("jsonl", "--format", "-f", help="jsonl, csv or parquet"),
+    since: str = typer.Option(None, "--since", help="Only rows created at or after this UTC date/time"),
+    until: str = typer.Option(None, "--until", help="Only rows created before this UTC date/time"),
+    compress: str = typer.Option(None, "--compress", "-z", help="none, gzip or zstd (default: from the file suffix)"),
+    state: str = typer.Option(None, "--state", help="File holding the last exported id; only newer rows are exported"),
+    after_id: int = typer.Option(0, "--after-id", min=0, help="Only rows with a higher id"),
+    with_output: bool = typer.Option(False, "--with-output", help="Include stdout and stderr"),
+    batch: int = typer.Option(EXPORT_BATCH, "--batch", min=1, max=100_000, help="Rows read per query"),
+) -> None:
+    """Stream command history, oldest first, for analytics; --state makes repeated runs incremental."""
+    compression = compress or compression_for(output)
+    try:
+        check_export(fmt, compression)
+    except ValueError as e:
+        err_console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1) from None
+    start = max(after_id, read_state(state) if state else 0)
+    since_at, until_at = _export_time(since, "--since"), _export_time(until, "--until")
+
+    done = _with_storage(
+        lambda: export_history(
+            output,
+            fmt,
+            compression,
+            since=since_at,
+            until=until_at,
+            after_id=start,
+            with_output=with_output,
+            batch=batch,
+        )
+    )
+    if state and done["rows"]:
+        write_state(state, done["last_id"])
+    err_console.print(f"Exported {done['rows']:,} rows, last id {done['last_id']}")
+
+
+def _ms(value: float | None) -> str:
+    return format_duration(round(value)) if value is not None else "-"
+
+
+@stats_app.callback(invoke_without_command=True)
+def stats(
+    ctx: typer.Context,
+    range_name: str = typer.Option("week", "--range", "-r", help="day, week or month"),
+    by: str = typer.Option(
+        "source,model", "--by", "-b", help="Comma-separated: source, model, project, user_id, program"
+    ),
+    user: str = typer.Option(None, "--user", "-u", help="Only this Telegram user id"),
+) -> None:
+    """Runs, failures, latency percentiles and output per group (default: per source and model)."""
+    if ctx.invoked_subcommand is not None:
+        return
+    if range_name not in RANGES:
+        console.print(f"[red]--range must be one of: {', '.join(RANGES)}[/red]")
+        raise typer.Exit(1)
+    group_by = tuple(d.strip() for d in by.split(",") if d.strip())
+    if unknown := [d for d in group_by if d not in DIMENSIONS]:
+        console.print(f"[red]Cannot group by {', '.join(unknown)}; use {', '.join(DIMENSIONS)}[/red]")
+        raise typer.Exit(1)
+    period, since = range_start(range_name)
+
+    async def _load() -> tuple[list[dict[str, Any]], int]:
+        return await get_stats(since, period, group_by, user_id=user), await stats_backlog()
+
+    rows, backlog = _with_storage(_load)
+
+    table = Table(title=f"Stats since {since} (UTC)")
+    for dimension in group_by:
+        table.add_column(dimension)
+    for column in ("Runs", "Failed", "Fail %", "p50", "p95", "Avg", "Output"):
+        table.add_column(column, justify="right")
+    for row in rows:
+        summary = summarize(row)
+        table.add_row(
+            *(escape(str(row[d]) or "-") for d in group_by),
+            str(summary["runs"]),
+            str(summary["errors"]),
+            f"{summary['error_rate']:.1%}",
+            _ms(summary["p50_ms"]),
+            _ms(summary["p95_ms"]),
+            _ms(summary["avg_ms"]),
+            format_bytes(summary["output_bytes"]),
+        )
+    if rows:
+        console.print(table)
+    else:
+        console.print("[dim]No commands in this range.[/dim]")
+    if backlog:
+        console.print(
+            f"[dim]{backlog:,} older commands are not counted yet: run 'claudecode-terminal stats backfill'.[/dim]"
+        )
+
+
+@stats_app.command("backfill")
+def stats_backfill() -> None:
+    """Add history recorded before stats existed to the rollups (resumable)."""
+    added = _with_storage(backfill_stats)
+    console.print(f"Added {added:,} commands to the stats rollups")
+
+
 if __name__ == "__main__":
     app()
@@ -41,17 +41,136 @@ class ClaudeConfig:
     default_model: str = "sonnet"
     timeout: int = 300
     max_output: int = 4096
+    streaming: bool = True
+    stream_edit_interval: float = 1.5
+    backend: str = "subprocess"  # "subprocess" | "pool"
+    pool_size: int = 1
+    pool_idle_timeout: int = 600
+    pool_max_requests: int = 1
+    pool_max_rss_mb: int = 0
+    coalesce: bool = False
 
 
 @dataclass
 class ShellConfig:
     timeout: int = 30
     enabled: bool = True
+    coalesce_read_only: bool = True
+    coalesce_mutating: bool = False
+    # Live-edited tail of the last `tail_lines` lines while a command runs
+    streaming: bool = True
+    tail_lines: int = 20
+    stream_edit_interval: float = 1.5
+    # One long-lived bash per user that keeps cwd and environment between commands
+    sessions: bool = False
+    session_idle_timeout: int = 900
+    # /bg jobs running at once per user (they are not bound by `timeout`)
+    max_background_jobs: int = 5
+
+
+@dataclass
+class SchedulerConfig:
+    workers: int = 4
+    per_user: int = 2
+    per_project: int = 2
+    max_queue: int = 50
+    # /each and /askeach: projects in flight per fan-out, and how many may match
+    fanout_concurrency: int = 4
+    fanout_max_projects: int = 50
+
+
+@dataclass
+class CacheConfig:
+    enabled: bool = False
+    ttl: int = 3600
+    max_entries: int = 256
+    max_mb: int = 16
+
+
+@dataclass
+class LimitsConfig:
+    enabled: bool = False
+    cgroup_root: str = ""  # empty = the bot's own (delegated) cgroup
+    cpu_weight: int = 100
+    memory_max_mb: int = 0
+    pids_max: int = 0
+    # Overrides keyed by source ("shell" | "claude") and by Telegram user id
+    sources: dict[str, dict[str, int]] = field(default_factory=dict)
+    users: dict[str, dict[str, int]] = field(default_factory=dict)
+
+
+@dataclass
+class TimeoutsConfig:
+    # Learn per-project timeouts from past run times instead of the fixed
+    # claude.timeout / shell.timeout (which remain the defaults until
+    # `min_samples` runs have been seen)
+    adaptive: bool = False
+    quantile: float = 0.99
+    factor: float = 2.0
+    min_samples: int = 20
+    claude_min: int = 60
+    claude_max: int = 1800
+    shell_min: int = 5
+    shell_max: int = 600
+
+
+@dataclass
+class QuotaConfig:
+    # Per-user Claude spend limits; 0 = unlimited. Days and months are UTC.
+    daily_cost_usd: float = 0.0
+    monthly_cost_usd: float = 0.0
+    daily_tokens: int = 0
+    monthly_tokens: int = 0
+    # Overrides keyed by Telegram user id
+    users: dict[str, dict[str, float]] = field(default_factory=dict)
+
+
+@dataclass
+class PolicyConfig:
+    # Extra rules for /shell commands, by program name (e.g. "python", "docker").
+    # `allow` lifts the built-in program rules; `deny` blocks outright.
+    allow: list[str] = field(default_factory=list)
+    deny: list[str] = field(default_factory=list)
+    # Per-user additions keyed by Telegram user id: {"allow": [...], "deny": [...]}
+    users: dict[str, dict[str, list[str]]] = field(default_factory=dict)
 
 
 @dataclass
 class StorageConfig:
     db_path: str = "~/.claudecode-terminal/history.db"
+    spill_output: bool = False
+    spill_dir: str = "~/.claudecode-terminal/spill"
+    jobs_dir: str = "~/.claudecode-terminal/jobs"
+    # History rows are committed in batches of up to this many rows, at most
+    # `history_flush_ms` after they were queued. Past `history_max_pending`
+    # queued rows, writers wait for a commit.
+    history_batch_size: int = 64
+    history_flush_ms: int = 50
+    history_max_pending: int = 1000
+    # Index command output for /search too, not just command text
+    search_output: bool = False
+    # History retention, enforced every `maintenance_interval` seconds (0 = no limit).
+    # Rows go oldest first, `prune_batch` per transaction.
+    retention_days: int = 0
+    retention_rows: int = 0
+    retention_mb: int = 0
+    maintenance_interval: int = 3600
+    prune_batch: int = 500
+    # Move months before the previous one into history-YYYY-MM.db files next to db_path
+    partition_monthly: bool = False
+    # Read-only connections for queries (0: queries share the writer connection,
+    # -1: two, or none on a single CPU)
+    readers: int = -1
+    # SQLite settings for every connection. In WAL mode NORMAL stays consistent
+    # after a crash, but may lose the last commits on power loss.
+    synchronous: str = "NORMAL"
+    cache_size_kb: int = 8192
+    mmap_size_mb: int = 64
+    busy_timeout_ms: int = 5000
+    # Keep per-user settings (/project, /model, /maxturns, /system) across restarts,
+    # writing changes every `state_flush_interval` seconds
+    persist_user_data: bool = True
+    state_flush_interval: int = 10
 
 
 @dataclass
@@ -65,6 +184,12 @@ class AppConfig:
     bot: BotConfig = field(default_factory=BotConfig)
     claude: ClaudeConfig = field(default_factory=ClaudeConfig)
     shell: ShellConfig = field(default_factory=ShellConfig)
+    scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    limits: LimitsConfig = field(default_factory=LimitsConfig)
+    timeouts: TimeoutsConfig = field(default_factory=TimeoutsConfig)
+    quotas: QuotaConfig = field(default_factory=QuotaConfig)
+    policy: PolicyConfig = field(default_factory=PolicyConfig)
     storage: StorageConfig = field(default_factory=StorageConfig)
     logging: LoggingConfig = field(default_factory=LoggingConfig)
 
@@ -92,13 +217,96 @@ def load_config() -> AppConfig:
         config.claude.default_model = claude.get("default_model", config.claude.default_model)
         config.claude.timeout = claude.get("timeout", config.claude.timeout)
         config.claude.max_output = claude.get("max_output", config.claude.max_output)
+        config.claude.streaming = claude.get("streaming", config.claude.streaming)
+        config.claude.stream_edit_interval = claude.get("stream_edit_interval", config.claude.stream_edit_interval)
+        config.claude.backend = claude.get("backend", config.claude.backend)
+        config.claude.pool_size = claude.get("pool_size", config.claude.pool_size)
+        config.claude.pool_idle_timeout = claude.get("pool_idle_timeout", config.claude.pool_idle_timeout)
+        config.claude.pool_max_requests = claude.get("pool_max_requests", config.claude.pool_max_requests)
+        config.claude.pool_max_rss_mb = claude.get("pool_max_rss_mb", config.claude.pool_max_rss_mb)
+        config.claude.coalesce = claude.get("coalesce", config.claude.coalesce)
 
         shell = data.get("shell", {})
         config.shell.timeout = shell.get("timeout", config.shell.timeout)
         config.shell.enabled = shell.get("enabled", config.shell.enabled)
+        config.shell.coalesce_read_only = shell.get("coalesce_read_only", config.shell.coalesce_read_only)
+        config.shell.coalesce_mutating = shell.get("coalesce_mutating", config.shell.coalesce_mutating)
+        config.shell.streaming = shell.get("streaming", config.shell.streaming)
+        config.shell.tail_lines = shell.get("tail_lines", config.shell.tail_lines)
+        config.shell.stream_edit_interval = shell.get("stream_edit_interval", config.shell.stream_edit_interval)
+        config.shell.sessions = shell.get("sessions", config.shell.sessions)
+        config.shell.session_idle_timeout = shell.get("session_idle_timeout", config.shell.session_idle_timeout)
+        config.shell.max_background_jobs = shell.get("max_background_jobs", config.shell.max_background_jobs)
+
+        scheduler = data.get("scheduler", {})
+        config.scheduler.workers = scheduler.get("workers", config.scheduler.workers)
+        config.scheduler.per_user = scheduler.get("per_user", config.scheduler.per_user)
+        config.scheduler.per_project = scheduler.get("per_project", config.scheduler.per_project)
+        config.scheduler.max_queue = scheduler.get("max_queue", config.scheduler.max_queue)
+        config.scheduler.fanout_concurrency = scheduler.get("fanout_concurrency", config.scheduler.fanout_concurrency)
+        config.scheduler.fanout_max_projects = scheduler.get(
+            "fanout_max_projects", config.scheduler.fanout_max_projects
+        )
+
+        cache = data.get("cache", {})
+        config.cache.enabled = cache.get("enabled", config.cache.enabled)
+        config.cache.ttl = cache.get("ttl", config.cache.ttl)
+        config.cache.max_entries = cache.get("max_entries", config.cache.max_entries)
+        config.cache.max_mb = cache.get("max_mb", config.cache.max_mb)
+
+        limits = data.get("limits", {})
+        config.limits.enabled = limits.get("enabled", config.limits.enabled)
+        config.limits.cgroup_root = limits.get("cgroup_root", config.limits.cgroup_root)
+        config.limits.cpu_weight = limits.get("cpu_weight", config.limits.cpu_weight)
+        config.limits.memory_max_mb = limits.get("memory_max_mb", config.limits.memory_max_mb)
+        config.limits.pids_max = limits.get("pids_max", config.limits.pids_max)
+        config.limits.sources = limits.get("sources", config.limits.sources)
+        config.limits.users = limits.get("users", config.limits.users)
+
+        timeouts = data.get("timeouts", {})
+        config.timeouts.adaptive = timeouts.get("adaptive", config.timeouts.adaptive)
+        config.timeouts.quantile = timeouts.get("quantile", config.timeouts.quantile)
+        config.timeouts.factor = timeouts.get("factor", config.timeouts.factor)
+        config.timeouts.min_samples = timeouts.get("min_samples", config.timeouts.min_samples)
+        config.timeouts.claude_min = timeouts.get("claude_min", config.timeouts.claude_min)
+        config.timeouts.claude_max = timeouts.get("claude_max", config.timeouts.claude_max)
+        config.timeouts.shell_min = timeouts.get("shell_min", config.timeouts.shell_min)
+        config.timeouts.shell_max = timeouts.get("shell_max", config.timeouts.shell_max)
+
+        quotas = data.get("quotas", {})
+        config.quotas.daily_cost_usd = quotas.get("daily_cost_usd", config.quotas.daily_cost_usd)
+        config.quotas.monthly_cost_usd = quotas.get("monthly_cost_usd", config.quotas.monthly_cost_usd)
+        config.quotas.daily_tokens = quotas.get("daily_tokens", config.quotas.daily_tokens)
+        config.quotas.monthly_tokens = quotas.get("monthly_tokens", config.quotas.monthly_tokens)
+        config.quotas.users = quotas.get("users", config.quotas.users)
+
+        policy = data.get("policy", {})
+        config.policy.allow = policy.get("allow", config.policy.allow)
+        config.policy.deny = policy.get("deny", config.policy.deny)
+        config.policy.users = policy.get("users", config.policy.users)
 
         storage = data.get("storage", {})
         config.storage.db_path = storage.get("db_path", config.storage.db_path)
+        config.storage.spill_output = storage.get("spill_output", config.storage.spill_output)
+        config.storage.spill_dir = storage.get("spill_dir", config.storage.spill_dir)
+        config.storage.jobs_dir = storage.get("jobs_dir", config.storage.jobs_dir)
+        config.storage.history_batch_size = storage.get("history_batch_size", config.storage.history_batch_size)
+        config.storage.history_flush_ms = storage.get("history_flush_ms", config.storage.history_flush_ms)
+        config.storage.history_max_pending = storage.get("history_max_pending", config.storage.history_max_pending)
+        config.storage.search_output = storage.get("search_output", config.storage.search_output)
+        config.storage.retention_days = storage.get("retention_days", config.storage.retention_days)
+        config.storage.retention_rows = storage.get("retention_rows", config.storage.retention_rows)
+        config.storage.retention_mb = storage.get("retention_mb", config.storage.retention_mb)
+        config.storage.maintenance_interval = storage.get("maintenance_interval", config.storage.maintenance_interval)
+        config.storage.prune_batch = storage.get("prune_batch", config.storage.prune_batch)
+        config.storage.partition_monthly = storage.get("partition_monthly", config.storage.partition_monthly)
+        config.storage.readers = storage.get("readers", config.storage.readers)
+        config.storage.synchronous = storage.get("synchronous", config.storage.synchronous)
+        config.storage.cache_size_kb = storage.get("cache_size_kb", config.storage.cache_size_kb)
+        config.storage.mmap_size_mb = storage.get("mmap_size_mb", config.storage.mmap_size_mb)
+        config.storage.busy_timeout_ms = storage.get("busy_timeout_ms", config.storage.busy_timeout_ms)
+        config.storage.persist_user_data = storage.get("persist_user_data", config.storage.persist_user_data)
+        config.storage.state_flush_interval = storage.get("state_flush_interval", config.storage.state_flush_interval)
 
         logging_cfg = data.get("logging", {})
         config.logging.level = logging_cfg.get("level", config.logging.level)
@@ -119,6 +327,8 @@ def load_config() -> AppConfig:
         config.shell.timeout = int(env_shell_timeout)
     if env_max_output := os.environ.get("CLAUDECODE_MAX_OUTPUT"):
         config.claude.max_output = int(env_max_output)
+    if env_workers := os.environ.get("CLAUDECODE_WORKERS"):
+        config.scheduler.workers = int(env_workers)
     if env_db := os.environ.get("CLAUDECODE_DB_PATH"):
         config.storage.db_path = env_db
     if env_log_level := os.environ.get("CLAUDECODE_LOG_LEVEL"):
@@ -141,13 +351,94 @@ def save_config(config: AppConfig) -> None:
             "default_model": config.claude.default_model,
             "timeout": config.claude.timeout,
             "max_output": config.claude.max_output,
+            "streaming": config.claude.streaming,
+            "stream_edit_interval": config.claude.stream_edit_interval,
+            "backend": config.claude.backend,
+            "pool_size": config.claude.pool_size,
+            "pool_idle_timeout": config.claude.pool_idle_timeout,
+            "pool_max_requests": config.claude.pool_max_requests,
+            "pool_max_rss_mb": config.claude.pool_max_rss_mb,
+            "coalesce": config.claude.coalesce,
         },
         "shell": {
             "timeout": config.shell.timeout,
             "enabled": config.shell.enabled,
+            "coalesce_read_only": config.shell.coalesce_read_only,
+            "coalesce_mutating": config.shell.coalesce_mutating,
+            "streaming": config.shell.streaming,
+            "tail_lines": config.shell.tail_lines,
+            "stream_edit_interval": config.shell.stream_edit_interval,
+            "sessions": config.shell.sessions,
+            "session_idle_timeout": config.shell.session_idle_timeout,
+            "max_background_jobs": config.shell.max_background_jobs,
+        },
+        "scheduler": {
+            "workers": config.scheduler.workers,
+            "per_user": config.scheduler.per_user,
+            "per_project": config.scheduler.per_project,
+            "max_queue": config.scheduler.max_queue,
+            "fanout_concurrency": config.scheduler.fanout_concurrency,
+            "fanout_max_projects": config.scheduler.fanout_max_projects,
+        },
+        "cache": {
+            "enabled": config.cache.enabled,
+            "ttl": config.cache.ttl,
+            "max_entries": config.cache.max_entries,
+            "max_mb": config.cache.max_mb,
+        },
+        "limits": {
+            "enabled": config.limits.enabled,
+            "cgroup_root": config.limits.cgroup_root,
+            "cpu_weight": config.limits.cpu_weight,
+            "memory_max_mb": config.limits.memory_max_mb,
+            "pids_max": config.limits.pids_max,
+            "sources": config.limits.sources,
+            "users": config.limits.users,
+        },
+        "timeouts": {
+            "adaptive": config.timeouts.adaptive,
+            "quantile": config.timeouts.quantile,
+            "factor": config.timeouts.factor,
+            "min_samples": config.timeouts.min_samples,
+            "claude_min": config.timeouts.claude_min,
+            "claude_max": config.timeouts.claude_max,
+            "shell_min": config.timeouts.shell_min,
+            "shell_max": config.timeouts.shell_max,
+        },
+        "quotas": {
+            "daily_cost_usd": config.quotas.daily_cost_usd,
+            "monthly_cost_usd": config.quotas.monthly_cost_usd,
+            "daily_tokens": config.quotas.daily_tokens,
+            "monthly_tokens": config.quotas.monthly_tokens,
+            "users": config.quotas.users,
+        },
+        "policy": {
+            "allow": config.policy.allow,
+            "deny": config.policy.deny,
+            "users": config.policy.users,
         },
         "storage": {
             "db_path": config.storage.db_path,
+            "spill_output": config.storage.spill_output,
+            "spill_dir": config.storage.spill_dir,
+            "jobs_dir": config.storage.jobs_dir,
+            "history_batch_size": config.storage.history_batch_size,
+            "history_flush_ms": config.storage.history_flush_ms,
+            "history_max_pending": config.storage.history_max_pending,
+            "search_output": config.storage.search_output,
+            "retention_days": config.storage.retention_days,
+            "retention_rows": config.storage.retention_rows,
+            "retention_mb": config.storage.retention_mb,
+            "maintenance_interval": config.storage.maintenance_interval,
+            "prune_batch": config.storage.prune_batch,
+            "partition_monthly": config.storage.partition_monthly,
+            "readers": config.storage.readers,
+            "synchronous": config.storage.synchronous,
+            "cache_size_kb": config.storage.cache_size_kb,
+            "mmap_size_mb": config.storage.mmap_size_mb,
+            "busy_timeout_ms": config.storage.busy_timeout_ms,
+            "persist_user_data": config.storage.persist_user_data,
+            "state_flush_interval": config.storage.state_flush_interval,
         },
         "logging": {
             "level": config.logging.level,
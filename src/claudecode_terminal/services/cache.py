@@ -0,0 +1,148 @@
+"""Response cache for repeatable Claude prompts."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from claudecode_terminal.storage.database import delete_cache_entries, load_cache_entries, save_cache_entry
+
+logger = logging.getLogger(__name__)
+
+GIT_TIMEOUT = 10
+
+
+@dataclass
+class CacheEntry:
+    stdout: str
+    created_at: float
+    last_used: float
+
+    @property
+    def size(self) -> int:
+        return len(self.stdout.encode())
+
+
+async def _git(project: str, *args: str) -> bytes | None:
+    """Run a git command in `project`, returning stdout or None on failure."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "git",
+            *args,
+            cwd=project,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=GIT_TIMEOUT)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    if proc.returncode != 0:
+        return None
+    return stdout
+
+
+async def project_fingerprint(project: str) -> str | None:
+    """Fingerprint a project as git HEAD plus a hash of uncommitted changes.
+
+    Returns None for directories that are not git work trees, which makes
+    their prompts uncacheable.
+    """
+    head = await _git(project, "rev-parse", "HEAD")
+    if head is None:
+        return None
+    status = await _git(project, "status", "--porcelain=v1", "-z", "--untracked-files=all")
+    diff = await _git(project, "diff", "HEAD", "--binary")
+    if status is None or diff is None:
+        return None
+    dirty = hashlib.sha256(status + b"\0" + diff).hexdigest()[:16]
+    return f"{head.decode().strip()}:{dirty}"
+
+
+def cache_key(prompt: str, model: str, system_prompt: str, max_turns: int, project: str, fingerprint: str) -> str:
+    payload = json.dumps([prompt, model, system_prompt, max_turns, project, fingerprint])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """LRU + TTL cache of Claude results with a size cap and SQLite persistence."""
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 256, max_bytes: int = 16 * 1024 * 1024) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def load(self) -> None:
+        """Warm the in-memory LRU from the database (once)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            rows = await load_cache_entries(self.max_entries)
+        except Exception:
+            logger.exception("Failed to load result cache")
+            return
+        now = time.time()
+        for row in reversed(rows):
+            if now - row["created_at"] > self.ttl:
+                continue
+            entry = CacheEntry(stdout=row["stdout"], created_at=row["created_at"], last_used=row["last_used"])
+            self._entries[row["key"]] = entry
+            self._bytes += entry.size
+        await self._evict()
+
+    async def get(self, key: str) -> str | None:
+        await self.load()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() - entry.created_at > self.ttl:
+            self._remove(key)
+            await delete_cache_entries([key])
+            self.misses += 1
+            return None
+        entry.last_used = time.time()
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.stdout
+
+    async def put(self, key: str, stdout: str) -> None:
+        await self.load()
+        now = time.time()
+        entry = CacheEntry(stdout=stdout, created_at=now, last_used=now)
+        if entry.size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        await save_cache_entry(key, stdout, entry.created_at, entry.last_used)
+        await self._evict()
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    async def _evict(self) -> None:
+        evicted: list[str] = []
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            evicted.append(key)
+        await delete_cache_entries(evicted)
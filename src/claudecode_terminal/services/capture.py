@@ -0,0 +1,151 @@
+"""Bounded-memory capture of subprocess output."""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import contextlib
+import gzip
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from claudecode_terminal.config import AppConfig
+from claudecode_terminal.services.process import reap_group, terminate_group
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 64 * 1024
+# How long to keep draining pipes after a timed-out process was signalled.
+DRAIN_GRACE = 1.0
+
+TextCallback = Callable[[str], Awaitable[None]]
+
+_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+
+class OutputCapture:
+    """Keep the first `head_bytes` and last `tail_bytes` of a stream.
+
+    Everything in between is counted but dropped, so memory stays bounded no
+    matter how much the process writes. The full stream can optionally be
+    spilled to a gzip file on disk.
+    """
+
+    def __init__(self, head_bytes: int, tail_bytes: int, spill_path: Path | None = None) -> None:
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total_bytes = 0
+        self.spill_path = spill_path
+        self._spill: gzip.GzipFile | None = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        if spill_path is not None:
+            spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self._spill = gzip.open(spill_path, "wb", compresslevel=1)
+
+    @property
+    def truncated_bytes(self) -> int:
+        return self.total_bytes - len(self.head) - len(self.tail)
+
+    def feed(self, chunk: bytes) -> str:
+        """Record a chunk and return it decoded; multi-byte characters may span chunks."""
+        self.total_bytes += len(chunk)
+        if self._spill is not None:
+            self._spill.write(chunk)
+        rest = chunk
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += rest[:room]
+            rest = rest[room:]
+        if rest and self.tail_bytes > 0:
+            self.tail += rest
+            del self.tail[: -self.tail_bytes]
+        return self._decoder.decode(chunk)
+
+    def close(self, keep_spill: bool | None = None) -> None:
+        """Finish the spill file; by default it is kept only if output was truncated."""
+        if self._spill is None:
+            return
+        self._spill.close()
+        self._spill = None
+        if keep_spill is None:
+            keep_spill = self.truncated_bytes > 0
+        if not keep_spill and self.spill_path is not None:
+            self.spill_path.unlink(missing_ok=True)
+            self.spill_path = None
+
+    def text(self) -> str:
+        """Decoded head and tail, with a marker where output was dropped."""
+        if self.truncated_bytes <= 0:
+            return (bytes(self.head) + bytes(self.tail)).decode("utf-8", errors="replace")
+        # Drop partial characters at the cut points instead of emitting U+FFFD
+        head = codecs.getincrementaldecoder("utf-8")(errors="replace").decode(bytes(self.head))
+        tail = bytes(self.tail).lstrip(_CONTINUATION_BYTES).decode("utf-8", errors="replace")
+        return f"{head}\n\n... [{self.truncated_bytes} bytes truncated] ...\n\n{tail}"
+
+
+def new_capture(config: AppConfig, spill: bool = False) -> OutputCapture:
+    """Create a capture sized from `claude.max_output`, split evenly between head and tail."""
+    budget = config.claude.max_output
+    spill_path = None
+    if spill and config.storage.spill_output:
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.out.gz"
+        spill_path = Path(config.storage.spill_dir).expanduser() / name
+    return OutputCapture(head_bytes=budget - budget // 2, tail_bytes=budget // 2, spill_path=spill_path)
+
+
+async def read_stream(
+    stream: asyncio.StreamReader,
+    capture: OutputCapture,
+    on_text: TextCallback | None = None,
+) -> None:
+    """Read a pipe to EOF into `capture`, forwarding decoded text to `on_text`."""
+    while chunk := await stream.read(READ_CHUNK):
+        text = capture.feed(chunk)
+        if on_text is not None and text:
+            try:
+                await on_text(text)
+            except Exception:
+                logger.exception("Output callback failed")
+
+
+async def communicate(
+    proc: asyncio.subprocess.Process,
+    stdout: OutputCapture,
+    stderr: OutputCapture,
+    timeout: float,
+    on_stdout: TextCallback | None = None,
+    on_stderr: TextCallback | None = None,
+) -> bool:
+    """Bounded-memory replacement for `proc.communicate()` with a timeout.
+
+    Returns True if the process timed out and its process group was
+    terminated. Output produced before the timeout stays in the captures.
+    The process must have been started with `start_new_session=True`.
+    """
+    assert proc.stdout is not None and proc.stderr is not None
+
+    async def _drain() -> None:
+        await asyncio.gather(
+            read_stream(proc.stdout, stdout, on_stdout),  # type: ignore[arg-type]
+            read_stream(proc.stderr, stderr, on_stderr),  # type: ignore[arg-type]
+        )
+        await proc.wait()
+
+    async def _drain_remaining() -> None:
+        # Collect whatever is still buffered in the pipes while the group shuts down
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_drain(), timeout=DRAIN_GRACE)
+
+    try:
+        await asyncio.wait_for(_drain(), timeout=timeout)
+    except asyncio.TimeoutError:
+        await asyncio.gather(terminate_group(proc), _drain_remaining())
+        return True
+    # The leader exited on its own; make sure nothing it spawned lingers
+    await reap_group(proc)
+    return False
@@ -5,20 +5,69 @@ from __future__ import annotations
 import asyncio
 import logging
 import time
+from collections.abc import Awaitable, Callable
+from dataclasses import replace
+from functools import partial
 from pathlib import Path
 
 from claudecode_terminal.config import MODEL_ALIASES, AppConfig
-from claudecode_terminal.storage.database import save_command
+from claudecode_terminal.services.cache import ResultCache, cache_key, project_fingerprint
+from claudecode_terminal.services.capture import new_capture, read_stream
+from claudecode_terminal.services.claude_pool import ClaudeProcessPool
+from claudecode_terminal.services.latency import latency_tracker
+from claudecode_terminal.services.limits import ResourceLimiter, ResourceUsage
+from claudecode_terminal.services.process import process_registry, reap_group, terminate_group
+from claudecode_terminal.services.singleflight import SingleFlight
+from claudecode_terminal.services.stream_json import StreamJsonParser, read_line
+from claudecode_terminal.services.usage import UsageTracker
+from claudecode_terminal.storage.database import get_active_claude_session, save_claude_session, save_command
 from claudecode_terminal.storage.models import ExecutionResult
 
 logger = logging.getLogger(__name__)
 
+# stream-json lines can carry whole tool results; raise asyncio's 64 KiB line limit.
+STREAM_LINE_LIMIT = 16 * 1024 * 1024
+
+CANCELLED_NOTICE = "Claude Code cancelled"
+
+OutputCallback = Callable[[str], Awaitable[None]]
+
 
 class ClaudeRunner:
     """Execute Claude Code CLI commands."""
 
     def __init__(self, config: AppConfig) -> None:
         self.config = config
+        self.limiter = ResourceLimiter(config.limits)
+        self.pool: ClaudeProcessPool | None = None
+        if config.claude.backend == "pool":
+            self.pool = ClaudeProcessPool(
+                size=config.claude.pool_size,
+                idle_timeout=config.claude.pool_idle_timeout,
+                max_requests=config.claude.pool_max_requests,
+                max_rss_mb=config.claude.pool_max_rss_mb,
+                limiter=self.limiter,
+            )
+        self.cache: ResultCache | None = None
+        if config.cache.enabled:
+            self.cache = ResultCache(
+                ttl=config.cache.ttl,
+                max_entries=config.cache.max_entries,
+                max_bytes=config.cache.max_mb * 1024 * 1024,
+            )
+        self.inflight: SingleFlight[ExecutionResult] = SingleFlight()
+        self.usage = UsageTracker(config.quotas)
+
+    async def estimate_ms(self, project_path: str, model: str = "") -> int | None:
+        """Typical run time of a prompt in this project with this model, if known."""
+        resolved_model = MODEL_ALIASES.get(model, model) if model else ""
+        project = str(Path(project_path).expanduser().resolve())
+        return await latency_tracker.estimate_ms("claude", project, resolved_model)
+
+    async def close(self) -> None:
+        """Release backend resources (pooled processes)."""
+        if self.pool is not None:
+            await self.pool.close()
 
     async def execute(
         self,
@@ -29,8 +78,27 @@ class ClaudeRunner:
         max_turns: int = 0,
         system_prompt: str = "",
         continue_conversation: bool = False,
+        on_output: OutputCallback | None = None,
+        use_cache: bool = True,
+        thread: str = "",
     ) -> ExecutionResult:
-        """Execute a Claude Code CLI command."""
+        """Execute a Claude Code CLI command.
+
+        The CLI runs with `--output-format stream-json`; when `on_output` is
+        given, the callback receives visible text as soon as each event arrives.
+        Session ids are recorded per (user, project, thread), and
+        `continue_conversation` resumes that thread's active session with
+        `--resume` (falling back to `--continue` when none is recorded).
+        With the result cache enabled, identical prompts against an unchanged
+        git work tree are answered from cache unless `use_cache` is False.
+        With `claude.coalesce`, an identical prompt arriving while one is in
+        flight joins it instead of starting another CLI process.
+        Runs are refused once the user is over a `quotas` limit, checked for
+        every caller before it joins a coalesced run; cached answers cost
+        nothing and are always served. A joined caller never receives another
+        user's refused or cancelled run: it runs the prompt itself instead. With
+        `timeouts.adaptive`, the timeout is learned per (project, model).
+        """
         resolved_path = Path(project_path).expanduser().resolve()
         if not resolved_path.is_dir():
             return ExecutionResult(
@@ -39,18 +107,21 @@ class ClaudeRunner:
                 exit_code=-1,
             )
 
-        # Build command args (use exec, not shell, to prevent injection)
+        resolved_model = MODEL_ALIASES.get(model, model) if model else ""
+
+        # Build command args (use exec, not shell, to prevent injection).
+        # stream-json carries the session id and requires --verbose in print mode.
         cmd: list[str] = [
             "claude",
             "-p",
             prompt,
             "--output-format",
-            "text",
+            "stream-json",
+            "--verbose",
             "--dangerously-skip-permissions",
         ]
 
-        if model:
-            resolved_model = MODEL_ALIASES.get(model, model)
+        if resolved_model:
             cmd.extend(["--model", resolved_model])
 
         if max_turns > 0:
@@ -60,27 +131,52 @@ class ClaudeRunner:
             cmd.extend(["--system-prompt", system_prompt])
 
         if continue_conversation:
-            cmd.append("--continue")
+            session = await get_active_claude_session(user_id, str(resolved_path), thread)
+            if session is not None:
+                cmd.extend(["--resume", session["session_id"]])
+            else:
+                cmd.append("--continue")
 
-        start = time.monotonic()
+        timeouts = self.config.timeouts
+        timeout = await latency_tracker.timeout_for(
+            timeouts,
+            "claude",
+            str(resolved_path),
+            resolved_model,
+            self.config.claude.timeout,
+            (timeouts.claude_min, timeouts.claude_max),
+        )
+
+        # The warm pool only serves plain prompts: per-request flags are fixed at spawn time
+        use_pool = self.pool is not None and not (max_turns > 0 or system_prompt or continue_conversation)
+
+        run = partial(
+            self._execute_once,
+            cmd,
+            prompt,
+            resolved_path,
+            resolved_model,
+            system_prompt,
+            max_turns,
+            use_pool,
+            on_output,
+            use_cache and not continue_conversation,
+            user_id,
+            timeout,
+        )
         try:
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=str(resolved_path),
-            )
-            stdout_bytes, stderr_bytes = await asyncio.wait_for(
-                proc.communicate(),
-                timeout=self.config.claude.timeout,
-            )
-            exit_code = proc.returncode or 0
-        except asyncio.TimeoutError:
-            proc.kill()  # type: ignore[possibly-undefined]
-            await proc.communicate()
-            stdout_bytes = b""
-            stderr_bytes = f"Claude Code timed out after {self.config.claude.timeout}s".encode()
-            exit_code = -1
+            # --continue depends on per-chat session state, so it never coalesces. A caller over
+            # quota doesn't join either: it runs alone, which serves a cached answer or refuses.
+            if self.config.claude.coalesce and not continue_conversation and await self.usage.check(user_id) is None:
+                flight_key = (prompt, resolved_model, system_prompt, max_turns, str(resolved_path), use_cache)
+                result, joined = await self.inflight.do(flight_key, run, _shareable)
+                if joined:
+                    # The session belongs to the leader; sharing it would mean cross-talk later
+                    result = replace(
+                        result, coalesced=True, session_id="", peak_memory_bytes=None, cpu_time_ms=None, usage=None
+                    )
+            else:
+                result = await run()
         except FileNotFoundError:
             return ExecutionResult(
                 stdout="",
@@ -90,25 +186,221 @@ class ClaudeRunner:
         except Exception as e:
             logger.exception("Claude execution error")
             return ExecutionResult(stdout="", stderr=str(e), exit_code=-1)
-
-        elapsed_ms = int((time.monotonic() - start) * 1000)
-        max_out = self.config.claude.max_output
-        stdout = stdout_bytes.decode("utf-8", errors="replace")[:max_out]
-        stderr = stderr_bytes.decode("utf-8", errors="replace")[:max_out]
+        if result.blocked:
+            return result
+        if not (result.cached or result.coalesced or result.cancelled):
+            await latency_tracker.observe("claude", str(resolved_path), resolved_model, result.execution_time_ms)
 
         await save_command(
             user_id=user_id,
             command=f"[claude] {prompt}",
-            stdout=stdout,
-            stderr=stderr,
-            exit_code=exit_code,
-            execution_time_ms=elapsed_ms,
+            stdout=result.stdout,
+            stderr=result.stderr,
+            exit_code=result.exit_code,
+            execution_time_ms=result.execution_time_ms,
             source="claude",
+            peak_memory_bytes=result.peak_memory_bytes,
+            cpu_time_ms=result.cpu_time_ms,
+            usage=result.usage,
+            project=str(resolved_path),
+            model=resolved_model,
+        )
+        if result.usage is not None:
+            await self.usage.record(user_id, str(resolved_path), result.usage)
+        if result.session_id:
+            await save_claude_session(user_id, str(resolved_path), thread, result.session_id, title=prompt)
+
+        return result
+
+    async def _execute_once(
+        self,
+        cmd: list[str],
+        prompt: str,
+        resolved_path: Path,
+        resolved_model: str,
+        system_prompt: str,
+        max_turns: int,
+        use_pool: bool,
+        on_output: OutputCallback | None,
+        use_cache: bool,
+        user_id: str,
+        timeout: float,
+    ) -> ExecutionResult:
+        """Answer from cache or run the CLI once, caching a clean result."""
+        start = time.monotonic()
+
+        key: str | None = None
+        fingerprint: str | None = None
+        if self.cache is not None and use_cache:
+            fingerprint = await project_fingerprint(str(resolved_path))
+            if fingerprint is not None:
+                key = cache_key(prompt, resolved_model, system_prompt, max_turns, str(resolved_path), fingerprint)
+
+        cached = await self.cache.get(key) if self.cache is not None and key else None
+        if cached is not None:
+            result = ExecutionResult(stdout=cached, cached=True, output_bytes=len(cached.encode()))
+            if on_output:
+                await on_output(cached)
+        elif reason := await self.usage.check(user_id):
+            return ExecutionResult(stderr=f"Blocked: {reason}", exit_code=-1, blocked=True, reason=reason)
+        elif use_pool:
+            result = await self._run_pooled(prompt, str(resolved_path), resolved_model, on_output, user_id, timeout)
+        else:
+            result = await self._run_subprocess(cmd, resolved_path, on_output, user_id, f"claude: {prompt}", timeout)
+
+        result.execution_time_ms = int((time.monotonic() - start) * 1000)
+
+        # Only cache runs that left the work tree untouched
+        if key and not result.cached and result.exit_code == 0 and result.stdout:
+            if await project_fingerprint(str(resolved_path)) == fingerprint:
+                await self.cache.put(key, result.stdout)  # type: ignore[union-attr]
+        return result
+
+    @staticmethod
+    def _notice(stderr: str, timeout: float | None) -> str:
+        """Append a timeout notice (if `timeout` is given) or a cancellation notice to stderr."""
+        notice = f"Claude Code timed out after {timeout:g}s" if timeout is not None else CANCELLED_NOTICE
+        return f"{stderr.rstrip()}\n{notice}" if stderr.strip() else notice
+
+    async def _run_subprocess(
+        self,
+        cmd: list[str],
+        cwd: Path,
+        on_output: OutputCallback | None,
+        user_id: str,
+        label: str,
+        timeout: float,
+    ) -> ExecutionResult:
+        """Run a fresh `claude -p` process, in its own process group, to completion."""
+        sandbox = self.limiter.prepare(user_id, "claude")
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(cwd),
+                limit=STREAM_LINE_LIMIT,
+                start_new_session=True,
+                preexec_fn=sandbox.preexec_fn,
+            )
+            with process_registry.track(user_id, label, proc) as running:
+                result, timed_out = await self._collect(proc, on_output, timeout)
+        finally:
+            usage = await sandbox.release()
+        _measured(result, usage)
+
+        if timed_out or running.cancelled:
+            result.stderr = self._notice(result.stderr, timeout if timed_out else None)
+            result.exit_code = -1
+            result.cancelled = running.cancelled
+        else:
+            result.exit_code = proc.returncode or 0
+        return result
+
+    async def _collect(
+        self,
+        proc: asyncio.subprocess.Process,
+        on_output: OutputCallback | None,
+        timeout: float,
+    ) -> tuple[ExecutionResult, bool]:
+        """Gather a CLI process' events within the timeout. Returns (result, timed_out)."""
+        stderr_cap = new_capture(self.config)
+        parser = StreamJsonParser(partial(new_capture, self.config, spill=True))
+        stream = asyncio.gather(
+            self._stream(proc, parser, on_output),
+            read_stream(proc.stderr, stderr_cap),  # type: ignore[arg-type]
+        )
+        try:
+            await asyncio.wait_for(stream, timeout=timeout)
+            timed_out = False
+            await reap_group(proc)
+        except asyncio.TimeoutError:
+            await terminate_group(proc)
+            timed_out = True
+
+        stdout = parser.output
+        stdout.close()
+        result = ExecutionResult(
+            stdout=stdout.text(),
+            stderr=stderr_cap.text(),
+            output_bytes=parser.bytes_read,
+            truncated_bytes=stdout.truncated_bytes + stderr_cap.truncated_bytes,
+            spill_path=str(stdout.spill_path or ""),
+            session_id=parser.session_id,
+            usage=parser.usage,
         )
+        if parser.is_error and not timed_out:
+            result.stdout, result.stderr = "", result.stderr or result.stdout
+        return result, timed_out
+
+    async def _run_pooled(
+        self,
+        prompt: str,
+        project: str,
+        model: str,
+        on_output: OutputCallback | None,
+        user_id: str,
+        timeout: float,
+    ) -> ExecutionResult:
+        """Send the prompt to a warm process from the pool."""
+        assert self.pool is not None
+        pooled = await self.pool.acquire(user_id, project, model)
+        with process_registry.track(user_id, f"claude: {prompt}", pooled.proc) as running:
+            try:
+                parser = await asyncio.wait_for(
+                    pooled.run(prompt, on_output, partial(new_capture, self.config)), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                usage = await self.pool.release(pooled, reusable=False)
+                return _measured(ExecutionResult(stderr=self._notice("", timeout), exit_code=-1), usage)
+            except ConnectionError:
+                usage = await self.pool.release(pooled, reusable=False)
+                if running.cancelled:
+                    return _measured(ExecutionResult(stderr=CANCELLED_NOTICE, exit_code=-1, cancelled=True), usage)
+                raise
+            except BaseException:
+                await self.pool.release(pooled, reusable=False)
+                raise
+        usage = await self.pool.release(pooled)
 
-        return ExecutionResult(
-            stdout=stdout,
-            stderr=stderr,
-            exit_code=exit_code,
-            execution_time_ms=elapsed_ms,
+        text = parser.final_text
+        if parser.is_error:
+            stderr = text or bytes(pooled.stderr_tail).decode("utf-8", "replace")
+            return _measured(ExecutionResult(stderr=stderr, exit_code=1, usage=parser.usage), usage)
+        result = ExecutionResult(
+            stdout=text,
+            output_bytes=parser.bytes_read,
+            truncated_bytes=parser.output.truncated_bytes,
+            session_id=parser.session_id,
+            usage=parser.usage,
         )
+        return _measured(result, usage)
+
+    @staticmethod
+    async def _stream(
+        proc: asyncio.subprocess.Process,
+        parser: StreamJsonParser,
+        on_output: OutputCallback | None,
+    ) -> None:
+        """Read stream-json events line by line, forwarding visible text as it arrives."""
+        assert proc.stdout is not None
+        while raw := await read_line(proc.stdout):
+            text = parser.feed(raw)
+            if text and on_output is not None:
+                try:
+                    await on_output(text)
+                except Exception:
+                    logger.exception("Streaming output callback failed")
+        await proc.wait()
+
+
+def _measured(result: ExecutionResult, usage: ResourceUsage) -> ExecutionResult:
+    """Attach a sandbox's resource usage to a result."""
+    result.peak_memory_bytes = usage.peak_memory_bytes
+    result.cpu_time_ms = usage.cpu_time_ms
+    return result
+
+
+def _shareable(result: ExecutionResult) -> bool:
+    """Whether a coalesced run's result may go to the callers that joined it."""
+    return not (result.cancelled or result.blocked)
@@ -0,0 +1,302 @@
+"""Warm pool of long-lived Claude Code CLI processes driven over stream-json."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from claudecode_terminal.services.capture import OutputCapture
+from claudecode_terminal.services.limits import ResourceLimiter, ResourceUsage, Sandbox
+from claudecode_terminal.services.process import terminate_group
+from claudecode_terminal.services.stream_json import StreamJsonParser, read_line
+
+logger = logging.getLogger(__name__)
+
+# (user id, project, model): a process keeps its conversation, so it never serves another user
+PoolKey = tuple[str, str, str]
+
+# Keep only the tail of a pooled process' stderr; it is drained continuously.
+STDERR_TAIL_BYTES = 16 * 1024
+STREAM_LINE_LIMIT = 16 * 1024 * 1024
+
+
+def _rss_bytes(pid: int) -> int | None:
+    """Resident set size of a process from /proc, or None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+@dataclass(eq=False)
+class PooledProcess:
+    """A pre-spawned Claude CLI process waiting for prompts on stdin."""
+
+    key: PoolKey
+    proc: asyncio.subprocess.Process
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    requests: int = 0
+    stderr_tail: bytearray = field(default_factory=bytearray)
+    sandbox: Sandbox = field(default_factory=Sandbox)
+    _cpu_reported_ms: int = 0
+    _stderr_task: asyncio.Future[None] | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    def start_stderr_drain(self) -> None:
+        self._stderr_task = asyncio.ensure_future(self._drain_stderr())
+
+    async def _drain_stderr(self) -> None:
+        assert self.proc.stderr is not None
+        while chunk := await self.proc.stderr.read(4096):
+            self.stderr_tail += chunk
+            del self.stderr_tail[:-STDERR_TAIL_BYTES]
+
+    async def run(
+        self,
+        prompt: str,
+        on_output: Callable[[str], Awaitable[None]] | None = None,
+        new_capture: Callable[[], OutputCapture] | None = None,
+    ) -> StreamJsonParser:
+        """Send one user turn and read events until its result arrives.
+
+        Text is kept in captures made by `new_capture` (see `StreamJsonParser`).
+        """
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+        message = {"type": "user", "message": {"role": "user", "content": [{"type": "text", "text": prompt}]}}
+        self.proc.stdin.write(json.dumps(message).encode() + b"\n")
+        await self.proc.stdin.drain()
+
+        parser = StreamJsonParser(new_capture)
+        while parser.result is None:
+            raw = await read_line(self.proc.stdout)
+            if not raw:
+                raise ConnectionError("Claude process exited before producing a result")
+            text = parser.feed(raw)
+            if text and on_output is not None:
+                try:
+                    await on_output(text)
+                except Exception:
+                    logger.exception("Streaming output callback failed")
+        return parser
+
+    def measure(self, usage: ResourceUsage | None = None) -> ResourceUsage:
+        """Peak memory so far and CPU time since the last measurement.
+
+        The process' cgroup outlives a single prompt, so CPU time is reported
+        as a delta; peak memory is the process' high-water mark.
+        """
+        if usage is None:
+            usage = self.sandbox.usage()
+        if usage.cpu_time_ms is not None:
+            total = usage.cpu_time_ms
+            usage.cpu_time_ms -= self._cpu_reported_ms
+            self._cpu_reported_ms = total
+        return usage
+
+    async def terminate(self) -> ResourceUsage:
+        """Kill the process group and remove its cgroup; returns the final `measure()`."""
+        if self.alive:
+            with contextlib.suppress(Exception):
+                await terminate_group(self.proc)
+        if self._stderr_task is not None:
+            self._stderr_task.cancel()
+        return self.measure(await self.sandbox.release())
+
+
+class ClaudeProcessPool:
+    """Pool of idle Claude CLI processes keyed by (user, project, model).
+
+    Taking a process from the pool immediately starts a replacement in the
+    background, so the user's next prompt for the same project and model skips
+    the Node.js and CLI cold start. Processes are recycled after `max_requests`
+    prompts (each one keeps conversation context across turns, which is why
+    users never share one), when their RSS grows past `max_rss_mb`, or when
+    they sit idle longer than `idle_timeout`.
+
+    With a `limiter`, every process runs in its own sandbox with its user's limits.
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        idle_timeout: int = 600,
+        max_requests: int = 1,
+        max_rss_mb: int = 0,
+        limiter: ResourceLimiter | None = None,
+    ) -> None:
+        self.size = max(size, 1)
+        self.idle_timeout = idle_timeout
+        self.max_requests = max(max_requests, 1)
+        self.max_rss_mb = max_rss_mb
+        self.limiter = limiter
+        self.hits = 0
+        self.misses = 0
+        self._idle: dict[PoolKey, list[PooledProcess]] = {}
+        self._spawning: dict[PoolKey, int] = {}
+        self._prewarm_tasks: set[asyncio.Future[None]] = set()
+        self._maintenance: asyncio.Task[None] | None = None
+        self._closed = False
+
+    async def acquire(self, user_id: str, project: str, model: str) -> PooledProcess:
+        """Take a healthy idle process of the user's, spawning one if none is warm."""
+        key = (str(user_id), project, model)
+        self._ensure_maintenance()
+        pooled: PooledProcess | None = None
+        idle = self._idle.get(key, [])
+        while idle:
+            candidate = idle.pop()
+            if self._healthy(candidate):
+                pooled = candidate
+                break
+            await candidate.terminate()
+
+        if pooled is None:
+            self.misses += 1
+            pooled = await self._spawn(key)
+        else:
+            self.hits += 1
+        self._refill(key)
+        return pooled
+
+    async def release(self, pooled: PooledProcess, reusable: bool = True) -> ResourceUsage:
+        """Return a process after a prompt; recycle it if it is spent or unhealthy.
+
+        Returns what the process used for the prompt (see `PooledProcess.measure`).
+        """
+        pooled.requests += 1
+        pooled.last_used = time.monotonic()
+        idle = self._idle.setdefault(pooled.key, [])
+        if reusable and not self._closed and pooled.requests < self.max_requests and self._healthy(pooled):
+            if len(idle) < self.size:
+                idle.append(pooled)
+                return pooled.measure()
+        return await pooled.terminate()
+
+    async def close(self) -> None:
+        """Terminate every idle process and stop background maintenance."""
+        self._closed = True
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+        # Let in-flight spawns finish (they terminate themselves once closed);
+        # cancelling a half-created subprocess would leak it.
+        if self._prewarm_tasks:
+            await asyncio.gather(*self._prewarm_tasks, return_exceptions=True)
+        for idle in self._idle.values():
+            for pooled in idle:
+                await pooled.terminate()
+        self._idle.clear()
+
+    async def evict_idle(self) -> None:
+        """Kill idle processes past their idle timeout or failing health checks."""
+        now = time.monotonic()
+        for key, idle in list(self._idle.items()):
+            keep: list[PooledProcess] = []
+            for pooled in idle:
+                if now - pooled.last_used > self.idle_timeout or not self._healthy(pooled):
+                    await pooled.terminate()
+                else:
+                    keep.append(pooled)
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "idle": sum(len(v) for v in self._idle.values()),
+            "keys": len(self._idle),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _healthy(self, pooled: PooledProcess) -> bool:
+        if not pooled.alive:
+            return False
+        if self.max_rss_mb > 0:
+            rss = _rss_bytes(pooled.proc.pid)
+            if rss is not None and rss > self.max_rss_mb * 1024 * 1024:
+                logger.info("Recycling Claude process %d (RSS %d MB)", pooled.proc.pid, rss // (1024 * 1024))
+                return False
+        return True
+
+    def _refill(self, key: PoolKey) -> None:
+        missing = self.size - len(self._idle.get(key, [])) - self._spawning.get(key, 0)
+        for _ in range(missing):
+            self._spawning[key] = self._spawning.get(key, 0) + 1
+            task = asyncio.ensure_future(self._prewarm(key))
+            self._prewarm_tasks.add(task)
+            task.add_done_callback(self._prewarm_tasks.discard)
+
+    async def _prewarm(self, key: PoolKey) -> None:
+        try:
+            pooled = await self._spawn(key)
+        except Exception:
+            logger.exception("Failed to pre-spawn Claude process for %s", key)
+            return
+        finally:
+            self._spawning[key] -= 1
+        idle = self._idle.setdefault(key, [])
+        if self._closed or len(idle) >= self.size:
+            await pooled.terminate()
+            return
+        idle.append(pooled)
+
+    async def _spawn(self, key: PoolKey) -> PooledProcess:
+        user_id, project, model = key
+        cmd = [
+            "claude",
+            "-p",
+            "--input-format",
+            "stream-json",
+            "--output-format",
+            "stream-json",
+            "--verbose",
+            "--dangerously-skip-permissions",
+        ]
+        if model:
+            cmd.extend(["--model", model])
+        sandbox = self.limiter.prepare(user_id, "claude") if self.limiter is not None else Sandbox()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(Path(project)),
+                limit=STREAM_LINE_LIMIT,
+                start_new_session=True,
+                preexec_fn=sandbox.preexec_fn,
+            )
+        except BaseException:
+            await sandbox.release()
+            raise
+        pooled = PooledProcess(key=key, proc=proc, sandbox=sandbox)
+        pooled.start_stderr_drain()
+        return pooled
+
+    def _ensure_maintenance(self) -> None:
+        if self._maintenance is None or self._maintenance.done():
+            self._maintenance = asyncio.ensure_future(self._maintain())
+
+    async def _maintain(self) -> None:
+        interval = max(min(self.idle_timeout / 2, 60), 1)
+        while not self._closed:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception:
+                logger.exception("Claude pool maintenance failed")
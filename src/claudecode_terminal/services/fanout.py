@@ -0,0 +1,71 @@
+"""Run one shell command or Claude prompt across many project directories."""
+
+from __future__ import annotations
+
+import asyncio
+import glob
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from claudecode_terminal.storage.models import ExecutionResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProjectResult:
+    project: Path
+    result: ExecutionResult
+
+    @property
+    def ok(self) -> bool:
+        return self.result.exit_code == 0 and not self.result.blocked
+
+
+ProjectCallback = Callable[[ProjectResult], Awaitable[Any]]
+
+
+def match_projects(pattern: str, base: str) -> list[Path]:
+    """Directories matching `pattern`, relative to `base` unless absolute or `~`-prefixed.
+
+    Hidden directories only match patterns that name them explicitly.
+    """
+    expanded = Path(pattern).expanduser()
+    root = expanded if expanded.is_absolute() else Path(base).expanduser() / pattern
+    matches = {Path(p).resolve() for p in glob.glob(str(root)) if Path(p).is_dir()}
+    return sorted(matches)
+
+
+async def fan_out(
+    projects: list[Path],
+    run: Callable[[Path], Awaitable[ExecutionResult]],
+    concurrency: int = 4,
+    on_done: ProjectCallback | None = None,
+) -> list[ProjectResult]:
+    """Run `run(project)` for every project, at most `concurrency` at a time.
+
+    `on_done` is awaited as each project finishes, in completion order. A
+    project whose run raises is reported as a failed result rather than
+    aborting the others. Results come back in the order of `projects`.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def _one(project: Path) -> ProjectResult:
+        async with semaphore:
+            try:
+                result = await run(project)
+            except Exception as e:
+                logger.exception("Fan-out run failed in %s", project)
+                result = ExecutionResult(stderr=str(e) or type(e).__name__, exit_code=-1)
+        done = ProjectResult(project=project, result=result)
+        if on_done is not None:
+            try:
+                await on_done(done)
+            except Exception:
+                logger.debug("Fan-out progress callback failed", exc_info=True)
+        return done
+
+    return list(await asyncio.gather(*(_one(p) for p in projects)))
@@ -0,0 +1,279 @@
+"""Detached background shell jobs with output spooled to disk."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any
+
+from claudecode_terminal.config import AppConfig
+from claudecode_terminal.services.blacklist import blacklist_checker
+from claudecode_terminal.services.limits import ResourceLimiter
+from claudecode_terminal.services.process import TERM_GRACE, group_alive
+from claudecode_terminal.storage.database import (
+    create_background_job,
+    get_background_job,
+    get_background_jobs,
+    update_background_job,
+)
+
+logger = logging.getLogger(__name__)
+
+# The outer shell outlives the command just long enough to record its exit
+# status, which lets a restarted bot learn how a job it did not spawn ended.
+WRAPPER = 'sh -c "$1"; echo $? > "$2"'
+# How often jobs inherited from a previous bot process are checked
+POLL_INTERVAL = 5.0
+TAIL_MAX_BYTES = 64 * 1024
+
+
+class JobError(Exception):
+    """Raised when a background job cannot be started."""
+
+
+@dataclass
+class BackgroundJob:
+    id: int
+    user_id: str
+    chat_id: int | None
+    command: str
+    cwd: str
+    spool_path: str
+    pid: int | None = None
+    pid_start: int | None = None
+    state: str = "running"
+    exit_code: int | None = None
+    bytes_out: int = 0
+    started_at: float = 0.0
+    finished_at: float | None = None
+
+    @classmethod
+    def from_row(cls, row: dict[str, Any]) -> BackgroundJob:
+        return cls(**{f.name: row[f.name] for f in fields(cls)})
+
+    @property
+    def exit_path(self) -> Path:
+        return Path(self.spool_path).with_suffix(".exit")
+
+    @property
+    def runtime(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    def output_size(self) -> int:
+        """Bytes written so far (the spool file size), or the final count."""
+        try:
+            return os.path.getsize(self.spool_path)
+        except OSError:
+            return self.bytes_out or 0
+
+
+JobCallback = Callable[[BackgroundJob], Awaitable[Any]]
+
+
+def _proc_start_time(pid: int) -> int | None:
+    """Start time of a live (non-zombie) process in clock ticks, to detect pid reuse."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    if stat[0] == "Z":
+        return None
+    return int(stat[19])
+
+
+def tail_file(path: str, lines: int = 20, max_bytes: int = TAIL_MAX_BYTES) -> str:
+    """The last `lines` lines of a file, reading at most `max_bytes` from its end."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(size - max_bytes, 0))
+        data = f.read()
+    if size > max_bytes:
+        # The first line is probably partial
+        data = data.split(b"\n", 1)[-1]
+    text = data.decode("utf-8", errors="replace")
+    return "\n".join(text.rstrip("\n").split("\n")[-lines:]) if text.strip() else ""
+
+
+class JobManager:
+    """Start background jobs, watch them to completion and report how they ended.
+
+    Jobs run in their own session with stdout and stderr appended to a spool
+    file, so they keep running (and keep their output) across bot restarts.
+    State lives in the `background_jobs` table; `recover()` re-attaches to
+    jobs left running by a previous bot process.
+    """
+
+    def __init__(self, config: AppConfig, notify: JobCallback | None = None) -> None:
+        self.config = config
+        self.notify = notify
+        self.limiter = ResourceLimiter(config.limits)
+        self._orphans: dict[int, BackgroundJob] = {}
+        self._cancelled: set[int] = set()
+        self._tasks: set[asyncio.Future[None]] = set()
+        self._poller: asyncio.Task[None] | None = None
+
+    async def start(self, command: str, user_id: str, cwd: str, chat_id: int | None = None) -> BackgroundJob:
+        """Launch `command` detached in `cwd`. Raises JobError if it may not run."""
+        if not self.config.shell.enabled:
+            raise JobError("Shell commands are disabled in configuration.")
+        blocked, reason = blacklist_checker.check(command, user_id, self.config.policy)
+        if blocked:
+            raise JobError(f"Blocked: {reason}")
+        running = await get_background_jobs(user_id, state="running", limit=self.config.shell.max_background_jobs)
+        if len(running) >= self.config.shell.max_background_jobs:
+            raise JobError(f"{len(running)} background jobs already running; wait or /jobs kill one")
+
+        spool_dir = Path(self.config.storage.jobs_dir).expanduser()
+        spool_dir.mkdir(parents=True, exist_ok=True)
+        spool_path = spool_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.log"
+        started_at = time.time()
+        job_id = await create_background_job(user_id, chat_id, command, cwd, str(spool_path), started_at)
+        job = BackgroundJob(
+            id=job_id,
+            user_id=user_id,
+            chat_id=chat_id,
+            command=command,
+            cwd=cwd,
+            spool_path=str(spool_path),
+            started_at=started_at,
+        )
+
+        sandbox = self.limiter.prepare(user_id, "shell")
+        try:
+            with open(spool_path, "wb") as spool:
+                proc = await asyncio.create_subprocess_exec(
+                    "/bin/sh",
+                    "-c",
+                    WRAPPER,
+                    "cct-job",
+                    command,
+                    str(job.exit_path),
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=spool,
+                    stderr=asyncio.subprocess.STDOUT,
+                    cwd=cwd,
+                    start_new_session=True,
+                    preexec_fn=sandbox.preexec_fn,
+                )
+        except Exception as e:
+            await sandbox.release()
+            await update_background_job(job_id, state="failed", exit_code=-1, finished_at=time.time())
+            raise JobError(f"Failed to start job: {e}") from e
+
+        job.pid, job.pid_start = proc.pid, _proc_start_time(proc.pid)
+        await update_background_job(job_id, pid=job.pid, pid_start=job.pid_start)
+
+        async def _watch() -> None:
+            await proc.wait()
+            await sandbox.release()
+            await self._finish(job)
+
+        self._spawn(_watch())
+        return job
+
+    async def recover(self) -> int:
+        """Re-attach to jobs a previous bot process left running. Returns how many are still alive."""
+        for row in await get_background_jobs(state="running", limit=1000):
+            job = BackgroundJob.from_row(row)
+            if job.id in self._orphans:
+                continue
+            if self._alive(job):
+                self._orphans[job.id] = job
+            else:
+                await self._finish(job)
+        if self._orphans and (self._poller is None or self._poller.done()):
+            self._poller = asyncio.ensure_future(self._poll())
+        return len(self._orphans)
+
+    async def get(self, job_id: int, user_id: str | None = None) -> BackgroundJob | None:
+        row = await get_background_job(job_id)
+        if row is None or (user_id is not None and row["user_id"] != user_id):
+            return None
+        return BackgroundJob.from_row(row)
+
+    async def list(self, user_id: str, limit: int = 10) -> list[BackgroundJob]:
+        return [BackgroundJob.from_row(row) for row in await get_background_jobs(user_id, limit=limit)]
+
+    async def cancel(self, job_id: int, user_id: str | None = None) -> bool:
+        """Terminate a running job's process group (SIGTERM, then SIGKILL)."""
+        job = await self.get(job_id, user_id)
+        if job is None or job.state != "running" or job.pid is None or not self._alive(job):
+            return False
+        self._cancelled.add(job.id)
+        for sig, wait in ((signal.SIGTERM, TERM_GRACE), (signal.SIGKILL, 1.0)):
+            with contextlib.suppress(ProcessLookupError, PermissionError):
+                os.killpg(job.pid, sig)
+            deadline = time.monotonic() + wait
+            while group_alive(job.pid) and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            if not group_alive(job.pid):
+                break
+        return True
+
+    async def close(self) -> None:
+        """Stop watching jobs; the jobs themselves keep running."""
+        if self._poller is not None:
+            self._poller.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _alive(self, job: BackgroundJob) -> bool:
+        if job.pid is None:
+            return False
+        start = _proc_start_time(job.pid)
+        return start is not None and (job.pid_start is None or start == job.pid_start)
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _poll(self) -> None:
+        while self._orphans:
+            await asyncio.sleep(POLL_INTERVAL)
+            for job in list(self._orphans.values()):
+                if not self._alive(job):
+                    del self._orphans[job.id]
+                    try:
+                        await self._finish(job)
+                    except Exception:
+                        logger.exception("Failed to finish background job %d", job.id)
+
+    async def _finish(self, job: BackgroundJob) -> None:
+        try:
+            job.exit_code = int(job.exit_path.read_text().strip())
+        except (OSError, ValueError):
+            job.exit_code = None
+        if job.id in self._cancelled:
+            job.state = "cancelled"
+            self._cancelled.discard(job.id)
+        elif job.exit_code is None:
+            job.state = "lost"
+        else:
+            job.state = "done" if job.exit_code == 0 else "failed"
+        job.finished_at = time.time()
+        job.bytes_out = job.output_size()
+        job.exit_path.unlink(missing_ok=True)
+        await update_background_job(
+            job.id,
+            state=job.state,
+            exit_code=job.exit_code,
+            bytes_out=job.bytes_out,
+            finished_at=job.finished_at,
+        )
+        if self.notify is not None:
+            try:
+                await self.notify(job)
+            except Exception:
+                logger.exception("Background job notification failed")
@@ -0,0 +1,126 @@
+"""Latency sketches per (source, project, model) and the adaptive timeouts derived from them."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+
+from claudecode_terminal.config import TimeoutsConfig
+from claudecode_terminal.storage.database import load_latency_sketch, save_latency_sketch
+
+logger = logging.getLogger(__name__)
+
+# Relative accuracy of quantile estimates
+SKETCH_ALPHA = 0.02
+# Once a sketch holds this much weight, it is halved: old runs fade out
+SKETCH_MAX_WEIGHT = 1000.0
+# Samples needed before the median is shown as an ETA
+ESTIMATE_MIN_SAMPLES = 3
+
+
+class LatencySketch:
+    """Log-bucketed latency histogram with bounded relative error (DDSketch-style).
+
+    Memory is proportional to log(max/min latency), not to the number of runs,
+    and any quantile is within `alpha` of a true sample value.
+    """
+
+    def __init__(self, alpha: float = SKETCH_ALPHA, buckets: dict[int, float] | None = None) -> None:
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: dict[int, float] = dict(buckets or {})
+
+    @property
+    def count(self) -> float:
+        return sum(self.buckets.values())
+
+    def add(self, ms: float) -> None:
+        index = math.ceil(math.log(max(ms, 1.0)) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0.0) + 1.0
+        if self.count > SKETCH_MAX_WEIGHT:
+            self.buckets = {i: w / 2 for i, w in self.buckets.items() if w / 2 >= 0.01}
+
+    def quantile(self, q: float) -> float | None:
+        """Estimated `q`-quantile in milliseconds, or None if empty."""
+        total = self.count
+        if total <= 0:
+            return None
+        rank = q * total
+        seen = 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return 2 * self.gamma**index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_json(self) -> str:
+        return json.dumps({"alpha": self.alpha, "buckets": self.buckets})
+
+    @classmethod
+    def from_json(cls, raw: str) -> LatencySketch:
+        data = json.loads(raw)
+        return cls(alpha=data["alpha"], buckets={int(i): float(w) for i, w in data["buckets"].items()})
+
+
+class LatencyTracker:
+    """Sketches per (source, project, model), loaded lazily and updated after every run."""
+
+    def __init__(self) -> None:
+        self._sketches: dict[tuple[str, str, str], LatencySketch] = {}
+        self._lock = asyncio.Lock()
+
+    async def sketch(self, source: str, project: str, model: str) -> LatencySketch:
+        key = (source, project, model)
+        sketch = self._sketches.get(key)
+        if sketch is not None:
+            return sketch
+        async with self._lock:
+            if key not in self._sketches:
+                try:
+                    raw = await load_latency_sketch(source, project, model)
+                    self._sketches[key] = LatencySketch.from_json(raw) if raw else LatencySketch()
+                except Exception:
+                    logger.exception("Failed to load latency sketch")
+                    return LatencySketch()
+            return self._sketches[key]
+
+    async def observe(self, source: str, project: str, model: str, ms: int) -> None:
+        sketch = await self.sketch(source, project, model)
+        sketch.add(ms)
+        await save_latency_sketch(source, project, model, sketch.to_json())
+
+    async def estimate_ms(self, source: str, project: str, model: str) -> int | None:
+        """Typical (median) run time, once a few runs have been seen."""
+        sketch = await self.sketch(source, project, model)
+        if sketch.count < ESTIMATE_MIN_SAMPLES:
+            return None
+        median = sketch.quantile(0.5)
+        return int(median) if median is not None else None
+
+    async def timeout_for(
+        self,
+        config: TimeoutsConfig,
+        source: str,
+        project: str,
+        model: str,
+        default: float,
+        bounds: tuple[float, float],
+    ) -> float:
+        """`quantile` x `factor` of past runs, clamped to `bounds`; `default` until enough runs were seen."""
+        if not config.adaptive:
+            return default
+        sketch = await self.sketch(source, project, model)
+        if sketch.count < config.min_samples:
+            return default
+        estimate = sketch.quantile(config.quantile)
+        if estimate is None:
+            return default
+        low, high = bounds
+        return round(min(max(estimate / 1000 * config.factor, low), high), 1)
+
+
+# Global singleton
+latency_tracker = LatencyTracker()
@@ -0,0 +1,281 @@
+"""Per-execution resource limits via cgroup v2, with a setrlimit fallback."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import math
+import os
+import resource
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+from claudecode_terminal.config import LimitsConfig
+
+logger = logging.getLogger(__name__)
+
+CGROUP_MOUNT = Path("/sys/fs/cgroup")
+CONTROLLERS = ("cpu", "memory", "pids")
+# Where the bot's own processes go when it turns its cgroup into a parent
+SUPERVISOR_CGROUP = "supervisor"
+RELEASE_RETRIES = 20
+
+
+@dataclass
+class ResourceLimits:
+    cpu_weight: int = 100  # cgroup cpu.weight, 1..10000
+    memory_max_mb: int = 0  # 0 = unlimited
+    pids_max: int = 0  # 0 = unlimited
+
+
+@dataclass
+class ResourceUsage:
+    peak_memory_bytes: int | None = None
+    cpu_time_ms: int | None = None
+
+
+def _own_cgroup() -> Path | None:
+    """The unified-hierarchy cgroup of this process, if cgroup v2 is mounted."""
+    if not (CGROUP_MOUNT / "cgroup.controllers").exists():
+        return None
+    try:
+        for line in Path("/proc/self/cgroup").read_text().splitlines():
+            if line.startswith("0::"):
+                return CGROUP_MOUNT / line[3:].lstrip("/")
+    except OSError:
+        pass
+    return None
+
+
+def _nice_for_weight(weight: int) -> int:
+    """Approximate a cpu.weight as a nice value (each nice step is ~1.25x weight)."""
+    if weight >= 100:
+        return 0  # raising priority needs privileges
+    return min(19, round(math.log(100 / max(weight, 1), 1.25)))
+
+
+def _uid_tasks() -> int | None:
+    """Processes and threads running as this uid, which is what RLIMIT_NPROC counts; None without /proc."""
+    uid = os.getuid()
+    tasks = 0
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            if os.stat(f"/proc/{entry}").st_uid == uid:
+                tasks += len(os.listdir(f"/proc/{entry}/task"))
+        except OSError:
+            continue  # exited meanwhile
+    return tasks
+
+
+def _nproc_limit(pids_max: int) -> int | None:
+    """RLIMIT_NPROC allowing `pids_max` more tasks than this uid runs now, capped at the hard limit."""
+    if pids_max <= 0:
+        return None
+    running = _uid_tasks()
+    if running is None:
+        return None
+    limit = running + pids_max
+    hard = resource.getrlimit(resource.RLIMIT_NPROC)[1]
+    return limit if hard == resource.RLIM_INFINITY else min(limit, hard)
+
+
+def _rlimit_preexec(limits: ResourceLimits) -> Callable[[], None] | None:
+    if limits.memory_max_mb <= 0 and limits.pids_max <= 0 and limits.cpu_weight >= 100:
+        return None
+    nice = _nice_for_weight(limits.cpu_weight)
+    memory = limits.memory_max_mb * 1024 * 1024
+    # RLIMIT_NPROC counts every task of the uid, not just the job's tree, so the
+    # job gets `pids_max` on top of what the uid already runs
+    nproc = _nproc_limit(limits.pids_max)
+
+    def _apply() -> None:
+        if memory > 0:
+            # RLIMIT_DATA rather than RLIMIT_AS: Node reserves far more address space than it uses
+            resource.setrlimit(resource.RLIMIT_DATA, (memory, memory))
+        if nproc is not None:
+            resource.setrlimit(resource.RLIMIT_NPROC, (nproc, nproc))
+        if nice:
+            os.nice(nice)
+
+    return _apply
+
+
+@functools.cache
+def setup_cgroup_root(configured: str = "") -> tuple[Path | None, set[str]]:
+    """Prepare (once per process) a cgroup that delegates cpu/memory/pids to children.
+
+    Returns the root and its usable controllers, or (None, set()) if cgroup
+    v2 isolation is unavailable.
+    """
+    try:
+        return _setup_cgroup_root(configured)
+    except OSError as e:
+        logger.warning("cgroup v2 isolation unavailable (%s); using setrlimit", e)
+        return None, set()
+
+
+def _setup_cgroup_root(configured: str) -> tuple[Path | None, set[str]]:
+    if configured:
+        root = Path(configured)
+        root.mkdir(parents=True, exist_ok=True)
+    else:
+        own = _own_cgroup()
+        if own is None:
+            logger.info("cgroup v2 not mounted; using setrlimit for execution limits")
+            return None, set()
+        if own == CGROUP_MOUNT:
+            root = own / "claudecode-terminal"
+            root.mkdir(exist_ok=True)
+        else:
+            # No internal processes: move ourselves into a leaf before
+            # enabling controllers for children of our own cgroup.
+            root = own
+            supervisor = root / SUPERVISOR_CGROUP
+            supervisor.mkdir(exist_ok=True)
+            for pid in (root / "cgroup.procs").read_text().split():
+                (supervisor / "cgroup.procs").write_text(pid)
+
+    controllers = set((root / "cgroup.controllers").read_text().split()) & set(CONTROLLERS)
+    if controllers:
+        (root / "cgroup.subtree_control").write_text(" ".join(f"+{c}" for c in sorted(controllers)))
+
+    # Clean up transient cgroups left behind by a previous bot process
+    for stale in root.glob("job-*"):
+        if stale.name.startswith(f"job-{os.getpid()}-"):
+            continue
+        try:
+            stale.rmdir()
+        except OSError:
+            pass
+    return root, controllers
+
+
+class Sandbox:
+    """Resource isolation for a single execution.
+
+    Pass `preexec_fn` to the subprocess call and `await release()` once the
+    process group is gone to collect usage and remove the transient cgroup.
+    """
+
+    def __init__(self, cgroup: Path | None = None, preexec_fn: Callable[[], None] | None = None) -> None:
+        self.cgroup = cgroup
+        self.preexec_fn = preexec_fn
+        if cgroup is not None:
+            procs = str(cgroup / "cgroup.procs")
+
+            def _join() -> None:
+                # Runs in the child between fork and exec: keep it to raw syscalls
+                fd = os.open(procs, os.O_WRONLY)
+                try:
+                    os.write(fd, b"0")
+                finally:
+                    os.close(fd)
+
+            self.preexec_fn = _join
+
+    async def release(self) -> ResourceUsage:
+        if self.cgroup is None:
+            return ResourceUsage()
+        usage = self.usage()
+        for attempt in range(RELEASE_RETRIES):
+            try:
+                self.cgroup.rmdir()
+                break
+            except FileNotFoundError:
+                break
+            except OSError:
+                # Zombies are still being reaped; force the issue halfway through
+                if attempt == RELEASE_RETRIES // 2 and (self.cgroup / "cgroup.kill").exists():
+                    try:
+                        (self.cgroup / "cgroup.kill").write_text("1")
+                    except OSError:
+                        pass
+                await asyncio.sleep(0.05)
+        else:
+            logger.warning("Could not remove cgroup %s", self.cgroup)
+        return usage
+
+    def usage(self) -> ResourceUsage:
+        """Peak memory and CPU time so far; unknown without a cgroup."""
+        usage = ResourceUsage()
+        if self.cgroup is None:
+            return usage
+        try:
+            usage.peak_memory_bytes = int((self.cgroup / "memory.peak").read_text())
+        except (OSError, ValueError):
+            pass
+        try:
+            for line in (self.cgroup / "cpu.stat").read_text().splitlines():
+                key, _, value = line.partition(" ")
+                if key == "usage_usec":
+                    usage.cpu_time_ms = int(value) // 1000
+        except (OSError, ValueError):
+            pass
+        return usage
+
+
+class ResourceLimiter:
+    """Resolve per-user / per-source limits and build a Sandbox per execution.
+
+    Executions go into transient child cgroups of `limits.cgroup_root` (by
+    default the bot's own cgroup, which must be delegated to the bot's
+    user). If that hierarchy is not usable, limits fall back to setrlimit
+    and nice in the child, and usage is not recorded.
+    """
+
+    def __init__(self, config: LimitsConfig) -> None:
+        self.config = config
+        self._controllers: set[str] = set()
+
+    def limits_for(self, user_id: str, source: str) -> ResourceLimits:
+        """Defaults, overridden by `limits.sources.<source>`, then `limits.users.<id>`."""
+        limits = ResourceLimits(
+            cpu_weight=self.config.cpu_weight,
+            memory_max_mb=self.config.memory_max_mb,
+            pids_max=self.config.pids_max,
+        )
+        names = {f.name for f in fields(ResourceLimits)}
+        for override in (self.config.sources.get(source, {}), self.config.users.get(str(user_id), {})):
+            for key, value in override.items():
+                if key in names:
+                    setattr(limits, key, int(value))
+        return limits
+
+    def prepare(self, user_id: str, source: str) -> Sandbox:
+        if not self.config.enabled:
+            return Sandbox()
+        limits = self.limits_for(user_id, source)
+        root = self._cgroup_root()
+        if root is None:
+            return Sandbox(preexec_fn=_rlimit_preexec(limits))
+        cgroup = root / f"job-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        try:
+            cgroup.mkdir()
+            if "cpu" in self._controllers:
+                (cgroup / "cpu.weight").write_text(str(min(max(limits.cpu_weight, 1), 10000)))
+            if "memory" in self._controllers:
+                memory = limits.memory_max_mb * 1024 * 1024
+                (cgroup / "memory.max").write_text(str(memory) if memory else "max")
+            if "pids" in self._controllers:
+                (cgroup / "pids.max").write_text(str(limits.pids_max) if limits.pids_max else "max")
+        except OSError:
+            logger.exception("Failed to create cgroup %s; falling back to rlimits", cgroup)
+            try:
+                cgroup.rmdir()
+            except OSError:
+                pass
+            return Sandbox(preexec_fn=_rlimit_preexec(limits))
+        return Sandbox(cgroup=cgroup)
+
+    def _cgroup_root(self) -> Path | None:
+        root, self._controllers = setup_cgroup_root(self.config.cgroup_root)
+        return root
@@ -0,0 +1,157 @@
+"""Process-group lifecycle and the registry of running executions."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import logging
+import os
+import signal
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# How long a process group gets between SIGTERM and SIGKILL.
+TERM_GRACE = 3.0
+REAP_POLL = 0.05
+
+
+def _group_members(pgid: int) -> list[int] | None:
+    """Live (non-zombie) pids in a process group from /proc, or None if unavailable."""
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    members: list[int] = []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # "pid (comm) state ppid pgrp ..."; comm may itself contain ") "
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if fields[0] != "Z" and int(fields[2]) == pgid:
+            members.append(int(entry))
+    return members
+
+
+def group_alive(pgid: int) -> bool:
+    """Whether any non-zombie process is left in the group."""
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    members = _group_members(pgid)
+    return members is None or bool(members)
+
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    with contextlib.suppress(ProcessLookupError, PermissionError):
+        os.killpg(proc.pid, sig)
+    # Also signal the leader directly in case it moved out of its group
+    if proc.returncode is None:
+        with contextlib.suppress(ProcessLookupError):
+            if sig == signal.SIGKILL:
+                proc.kill()
+            else:
+                proc.terminate()
+
+
+async def reap_group(proc: asyncio.subprocess.Process, grace: float = TERM_GRACE) -> bool:
+    """Make sure nothing in the process group outlives its leader.
+
+    Leftover descendants get SIGTERM, then SIGKILL after `grace`. Returns
+    False if some process survived even that.
+    """
+    pgid = proc.pid
+    for sig, wait in ((signal.SIGTERM, grace), (signal.SIGKILL, 1.0)):
+        if not group_alive(pgid):
+            return True
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(pgid, sig)
+        deadline = time.monotonic() + wait
+        while group_alive(pgid) and time.monotonic() < deadline:
+            await asyncio.sleep(REAP_POLL)
+    if group_alive(pgid):
+        logger.warning("Process group %d survived SIGKILL", pgid)
+        return False
+    return True
+
+
+async def terminate_group(proc: asyncio.subprocess.Process, grace: float = TERM_GRACE) -> None:
+    """Stop a process started with `start_new_session=True` and all its descendants.
+
+    Sends SIGTERM to the whole group, escalates to SIGKILL after `grace`,
+    then reaps any stragglers.
+    """
+    _signal_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=grace)
+    except asyncio.TimeoutError:
+        _signal_group(proc, signal.SIGKILL)
+        await proc.wait()
+    await reap_group(proc, grace)
+
+
+@dataclass(eq=False)
+class RunningProcess:
+    """A process currently executing on behalf of a user."""
+
+    id: int
+    user_id: str
+    label: str
+    proc: asyncio.subprocess.Process
+    started_at: float = field(default_factory=time.monotonic)
+    cancelled: bool = False
+
+
+class ProcessRegistry:
+    """Running executions keyed by job id, cancellable per user."""
+
+    def __init__(self) -> None:
+        self._ids = itertools.count(1)
+        self._running: dict[int, RunningProcess] = {}
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+    @contextlib.contextmanager
+    def track(self, user_id: str, label: str, proc: asyncio.subprocess.Process) -> Iterator[RunningProcess]:
+        """Register `proc` for the duration of the block."""
+        entry = RunningProcess(id=next(self._ids), user_id=user_id, label=label, proc=proc)
+        self._running[entry.id] = entry
+        try:
+            yield entry
+        finally:
+            self._running.pop(entry.id, None)
+
+    def list(self, user_id: str | None = None) -> list[RunningProcess]:
+        return [e for e in self._running.values() if user_id is None or e.user_id == user_id]
+
+    async def cancel(self, job_id: int, user_id: str | None = None) -> bool:
+        """Terminate a running job. With `user_id`, only that user's jobs match."""
+        entry = self._running.get(job_id)
+        if entry is None or (user_id is not None and entry.user_id != user_id):
+            return False
+        entry.cancelled = True
+        await terminate_group(entry.proc)
+        return True
+
+    async def cancel_all(self, user_id: str | None = None) -> int:
+        """Terminate every running job (of `user_id`, if given). Returns how many."""
+        entries = self.list(user_id)
+        for entry in entries:
+            entry.cancelled = True
+        await asyncio.gather(*(terminate_group(e.proc) for e in entries), return_exceptions=True)
+        return len(entries)
+
+
+# Global singleton
+process_registry = ProcessRegistry()
@@ -0,0 +1,197 @@
+"""Admission control for Claude and shell executions."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PositionCallback = Callable[[int], Awaitable[Any]]
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler queue has no room for another job."""
+
+
+@dataclass
+class SchedulerMetrics:
+    """Cumulative scheduler counters."""
+
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    rejected: int = 0
+    total_wait_ms: int = 0
+    max_wait_ms: int = 0
+
+
+@dataclass(eq=False)
+class _Job:
+    user_id: str
+    project: str
+    started: asyncio.Future[None]
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class JobScheduler:
+    """Bounded async job scheduler with per-user/per-project caps and round-robin fairness.
+
+    Each user has a FIFO queue; the dispatcher walks users in rotation and
+    starts at most one job per user per pass, so a user with a long backlog
+    cannot starve others.
+    """
+
+    def __init__(self, workers: int = 4, per_user: int = 2, per_project: int = 2, max_queue: int = 50) -> None:
+        self.workers = max(workers, 1)
+        self.per_user = max(per_user, 1)
+        self.per_project = max(per_project, 1)
+        self.max_queue = max_queue
+        self.metrics = SchedulerMetrics()
+        self._queues: OrderedDict[str, deque[_Job]] = OrderedDict()
+        self._running = 0
+        self._running_users: Counter[str] = Counter()
+        self._running_projects: Counter[str] = Counter()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def submit(
+        self,
+        user_id: str,
+        project: str,
+        factory: Callable[[], Awaitable[T]],
+        on_queued: PositionCallback | None = None,
+    ) -> T:
+        """Run `factory()` once a slot is free and return its result.
+
+        `on_queued` is awaited with the 1-based queue position when the job
+        cannot start immediately. Raises `QueueFullError` if the queue is full.
+        """
+        if self.max_queue > 0 and self.queued >= self.max_queue:
+            self.metrics.rejected += 1
+            raise QueueFullError(f"Queue is full ({self.max_queue} jobs waiting)")
+
+        job = _Job(user_id=user_id, project=project, started=asyncio.get_running_loop().create_future())
+        self.metrics.submitted += 1
+        self._queues.setdefault(user_id, deque()).append(job)
+        self._dispatch()
+
+        try:
+            if not job.started.done() and on_queued is not None:
+                try:
+                    await on_queued(self.position(job))
+                except Exception:
+                    logger.debug("Queue position callback failed", exc_info=True)
+            await job.started
+        except asyncio.CancelledError:
+            if job.started.done() and not job.started.cancelled():
+                self._release(job)
+            else:
+                self._discard(job)
+            self.metrics.cancelled += 1
+            raise
+
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            self.metrics.cancelled += 1
+            raise
+        except Exception:
+            self.metrics.failed += 1
+            raise
+        else:
+            self.metrics.completed += 1
+            return result
+        finally:
+            self._release(job)
+
+    def position(self, job: _Job) -> int:
+        """Estimated 1-based position of a queued job in round-robin order."""
+        queues = list(self._queues.values())
+        position = 0
+        depth = 0
+        while any(depth < len(q) for q in queues):
+            for q in queues:
+                if depth < len(q):
+                    position += 1
+                    if q[depth] is job:
+                        return position
+            depth += 1
+        return 0
+
+    def stats(self) -> dict[str, int]:
+        """Snapshot of current load and cumulative counters."""
+        finished = self.metrics.completed + self.metrics.failed
+        started = finished + self._running
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queued": self.queued,
+            "submitted": self.metrics.submitted,
+            "completed": self.metrics.completed,
+            "failed": self.metrics.failed,
+            "cancelled": self.metrics.cancelled,
+            "rejected": self.metrics.rejected,
+            "avg_wait_ms": self.metrics.total_wait_ms // started if started else 0,
+            "max_wait_ms": self.metrics.max_wait_ms,
+        }
+
+    def _eligible(self, job: _Job) -> bool:
+        return (
+            self._running_users[job.user_id] < self.per_user and self._running_projects[job.project] < self.per_project
+        )
+
+    def _dispatch(self) -> None:
+        progressed = True
+        while progressed and self._running < self.workers:
+            progressed = False
+            for user_id in list(self._queues):
+                if self._running >= self.workers:
+                    break
+                queue = self._queues[user_id]
+                job = next((j for j in queue if self._eligible(j)), None)
+                if job is None:
+                    continue
+                queue.remove(job)
+                if queue:
+                    self._queues.move_to_end(user_id)
+                else:
+                    del self._queues[user_id]
+                self._start(job)
+                progressed = True
+
+    def _start(self, job: _Job) -> None:
+        self._running += 1
+        self._running_users[job.user_id] += 1
+        self._running_projects[job.project] += 1
+        wait_ms = int((time.monotonic() - job.enqueued_at) * 1000)
+        self.metrics.total_wait_ms += wait_ms
+        self.metrics.max_wait_ms = max(self.metrics.max_wait_ms, wait_ms)
+        job.started.set_result(None)
+
+    def _release(self, job: _Job) -> None:
+        self._running -= 1
+        self._running_users[job.user_id] -= 1
+        self._running_projects[job.project] -= 1
+        self._dispatch()
+
+    def _discard(self, job: _Job) -> None:
+        queue = self._queues.get(job.user_id)
+        if queue is not None and job in queue:
+            queue.remove(job)
+            if not queue:
+                del self._queues[job.user_id]
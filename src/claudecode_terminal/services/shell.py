@@ -4,11 +4,20 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import os
+import shlex
 import time
+from dataclasses import replace
 from pathlib import Path
 
-from claudecode_terminal.services.blacklist import blacklist_checker
 from claudecode_terminal.config import AppConfig
+from claudecode_terminal.services.blacklist import blacklist_checker
+from claudecode_terminal.services.capture import TextCallback, communicate, new_capture
+from claudecode_terminal.services.latency import latency_tracker
+from claudecode_terminal.services.limits import ResourceLimiter
+from claudecode_terminal.services.process import process_registry
+from claudecode_terminal.services.shell_session import ShellSessionManager
+from claudecode_terminal.services.singleflight import SingleFlight, is_read_only_command
 from claudecode_terminal.storage.database import save_command
 from claudecode_terminal.storage.models import ExecutionResult
 
@@ -20,14 +29,41 @@ class ShellRunner:
 
     def __init__(self, config: AppConfig) -> None:
         self.config = config
+        self.inflight: SingleFlight[ExecutionResult] = SingleFlight()
+        self.limiter = ResourceLimiter(config.limits)
+        self.sessions: ShellSessionManager | None = None
+        if config.shell.sessions:
+            self.sessions = ShellSessionManager(self.limiter, idle_timeout=config.shell.session_idle_timeout)
+
+    async def close(self) -> None:
+        """Close persistent shell sessions."""
+        if self.sessions is not None:
+            await self.sessions.close()
 
     async def execute(
         self,
         command: str,
         user_id: str,
         cwd: str | None = None,
+        on_output: TextCallback | None = None,
+        use_session: bool = True,
     ) -> ExecutionResult:
-        """Execute a shell command."""
+        """Execute a shell command.
+
+        Identical commands in the same directory that arrive while one is
+        still running share its result, subject to the `shell.coalesce_*`
+        policy (read-only commands by default). With `timeouts.adaptive`, the
+        timeout comes from past run times of the same program in the same
+        directory. When `on_output` is given, it receives stdout and stderr
+        text as soon as it is read (a run joined through coalescing streams
+        nothing). A run its starter cancels is not shared; the callers that
+        joined it run the command again.
+
+        With `shell.sessions` (and `use_session`), commands run one at a time
+        in the user's persistent bash instead, so `cd`, `export` and `source`
+        carry over.
+        Those runs never coalesce, since their result depends on session state.
+        """
         if not self.config.shell.enabled:
             return ExecutionResult(
                 stderr="Shell commands are disabled in configuration.",
@@ -37,7 +73,7 @@ class ShellRunner:
             )
 
         # Blacklist check
-        blocked, reason = blacklist_checker.check(command)
+        blocked, reason = blacklist_checker.check(command, user_id, self.config.policy)
         if blocked:
             return ExecutionResult(
                 stderr=f"Blocked: {reason}",
@@ -50,49 +86,170 @@ class ShellRunner:
         work_dir = cwd or self.config.claude.default_project
         work_dir = str(Path(work_dir).expanduser().resolve())
 
+        program = _program(command)
+        timeouts = self.config.timeouts
+        timeout = await latency_tracker.timeout_for(
+            timeouts, "shell", work_dir, program, self.config.shell.timeout, (timeouts.shell_min, timeouts.shell_max)
+        )
+
+        if self.sessions is not None and use_session:
+            result = await self._run_in_session(command, work_dir, user_id, timeout, on_output)
+        elif self._should_coalesce(command):
+            result, joined = await self.inflight.do(
+                (command, work_dir), lambda: self._run(command, work_dir, user_id, timeout, on_output), _shareable
+            )
+            if joined:
+                # Resources were spent once; only the leader's row records them
+                result = replace(result, coalesced=True, peak_memory_bytes=None, cpu_time_ms=None)
+        else:
+            result = await self._run(command, work_dir, user_id, timeout, on_output)
+        if not (result.coalesced or result.cancelled):
+            await latency_tracker.observe("shell", work_dir, program, result.execution_time_ms)
+
+        await save_command(
+            user_id=user_id,
+            command=command,
+            stdout=result.stdout,
+            stderr=result.stderr,
+            exit_code=result.exit_code,
+            execution_time_ms=result.execution_time_ms,
+            source="telegram",
+            peak_memory_bytes=result.peak_memory_bytes,
+            cpu_time_ms=result.cpu_time_ms,
+            project=work_dir,
+        )
+
+        return result
+
+    async def _run_in_session(
+        self,
+        command: str,
+        work_dir: str,
+        user_id: str,
+        timeout: float,
+        on_output: TextCallback | None = None,
+    ) -> ExecutionResult:
+        """Run the command in the user's persistent shell, restarting it on timeout or exit."""
+        assert self.sessions is not None
+        stdout_cap = new_capture(self.config, spill=True)
+        stderr_cap = new_capture(self.config)
+        start = time.monotonic()
+        notice = ""
+        cancelled = restart = False
+        try:
+            session = await self.sessions.acquire(user_id, work_dir)
+            async with session.lock:
+                if session.project != work_dir:
+                    # /project switched: follow it, keeping the environment
+                    await session.run(f"cd -- {shlex.quote(work_dir)}", new_capture(self.config), stderr_cap)
+                    session.project = work_dir
+                with process_registry.track(user_id, f"$ {command}", session.proc) as running:
+                    try:
+                        exit_code = await asyncio.wait_for(
+                            session.run(command, stdout_cap, stderr_cap, on_output), timeout=timeout
+                        )
+                    except asyncio.TimeoutError:
+                        exit_code, restart = -1, True
+                        notice = f"Command timed out after {timeout:g}s; shell session restarted"
+                    except ConnectionError:
+                        exit_code, restart = -1, True
+                        cancelled = running.cancelled
+                        notice = "Command cancelled" if cancelled else "Shell session exited"
+            if restart:
+                await self.sessions.discard(user_id)
+        except Exception as e:
+            logger.exception("Shell session error")
+            stderr_cap.feed(str(e).encode())
+            exit_code = -1
+        finally:
+            stdout_cap.close()
+
+        stderr = stderr_cap.text()
+        if notice:
+            stderr = f"{stderr.rstrip()}\n{notice}" if stderr.strip() else notice
+        return ExecutionResult(
+            stdout=stdout_cap.text(),
+            stderr=stderr,
+            exit_code=exit_code,
+            execution_time_ms=int((time.monotonic() - start) * 1000),
+            output_bytes=stdout_cap.total_bytes + stderr_cap.total_bytes,
+            truncated_bytes=stdout_cap.truncated_bytes + stderr_cap.truncated_bytes,
+            spill_path=str(stdout_cap.spill_path or ""),
+            cancelled=cancelled,
+        )
+
+    def _should_coalesce(self, command: str) -> bool:
+        if is_read_only_command(command):
+            return self.config.shell.coalesce_read_only
+        return self.config.shell.coalesce_mutating
+
+    async def _run(
+        self,
+        command: str,
+        work_dir: str,
+        user_id: str,
+        timeout: float,
+        on_output: TextCallback | None = None,
+    ) -> ExecutionResult:
+        """Spawn the command in its own process group and capture its output."""
+        stdout_cap = new_capture(self.config, spill=True)
+        stderr_cap = new_capture(self.config)
+        sandbox = self.limiter.prepare(user_id, "shell")
         start = time.monotonic()
+        cancelled = timed_out = False
         try:
             proc = await asyncio.create_subprocess_shell(
                 command,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
                 cwd=work_dir,
+                start_new_session=True,
+                preexec_fn=sandbox.preexec_fn,
             )
-            stdout_bytes, stderr_bytes = await asyncio.wait_for(
-                proc.communicate(),
-                timeout=self.config.shell.timeout,
-            )
-            exit_code = proc.returncode or 0
-        except asyncio.TimeoutError:
-            proc.kill()  # type: ignore[possibly-undefined]
-            await proc.communicate()
-            stdout_bytes = b""
-            stderr_bytes = f"Command timed out after {self.config.shell.timeout}s".encode()
-            exit_code = -1
+            with process_registry.track(user_id, f"$ {command}", proc) as running:
+                timed_out = await communicate(
+                    proc, stdout_cap, stderr_cap, timeout=timeout, on_stdout=on_output, on_stderr=on_output
+                )
+            cancelled = running.cancelled
+            exit_code = -1 if timed_out or cancelled else proc.returncode or 0
         except Exception as e:
             logger.exception("Shell execution error")
-            stdout_bytes = b""
-            stderr_bytes = str(e).encode()
+            stderr_cap.feed(str(e).encode())
             exit_code = -1
+        finally:
+            stdout_cap.close()
+            usage = await sandbox.release()
 
         elapsed_ms = int((time.monotonic() - start) * 1000)
-        max_out = self.config.claude.max_output
-        stdout = stdout_bytes.decode("utf-8", errors="replace")[:max_out]
-        stderr = stderr_bytes.decode("utf-8", errors="replace")[:max_out]
-
-        await save_command(
-            user_id=user_id,
-            command=command,
-            stdout=stdout,
-            stderr=stderr,
-            exit_code=exit_code,
-            execution_time_ms=elapsed_ms,
-            source="telegram",
-        )
+        stderr = stderr_cap.text()
+        notice = ""
+        if timed_out:
+            notice = f"Command timed out after {timeout:g}s"
+        elif cancelled:
+            notice = "Command cancelled"
+        if notice:
+            stderr = f"{stderr.rstrip()}\n{notice}" if stderr.strip() else notice
 
         return ExecutionResult(
-            stdout=stdout,
+            stdout=stdout_cap.text(),
             stderr=stderr,
             exit_code=exit_code,
             execution_time_ms=elapsed_ms,
+            output_bytes=stdout_cap.total_bytes + stderr_cap.total_bytes,
+            truncated_bytes=stdout_cap.truncated_bytes + stderr_cap.truncated_bytes,
+            spill_path=str(stdout_cap.spill_path or ""),
+            peak_memory_bytes=usage.peak_memory_bytes,
+            cpu_time_ms=usage.cpu_time_ms,
+            cancelled=cancelled,
         )
+
+
+def _program(command: str) -> str:
+    """The program a command line starts with, which keys its latency sketch."""
+    parts = command.split(None, 1)
+    return os.path.basename(parts[0]) if parts else ""
+
+
+def _shareable(result: ExecutionResult) -> bool:
+    """Whether a coalesced run's result may go to the callers that joined it."""
+    return not (result.cancelled or result.blocked)
@@ -0,0 +1,230 @@
+"""Persistent per-user bash sessions driven over pipes with sentinel-framed commands."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import shlex
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from claudecode_terminal.services.capture import READ_CHUNK, OutputCapture, TextCallback
+from claudecode_terminal.services.limits import ResourceLimiter, Sandbox
+from claudecode_terminal.services.process import terminate_group
+
+logger = logging.getLogger(__name__)
+
+SHELL_CMD = ("bash", "--noprofile", "--norc")
+
+
+@dataclass(eq=False)
+class ShellSession:
+    """A long-lived bash process that keeps cwd and environment between commands.
+
+    Each command is sent as `eval <quoted command>` with stdin from /dev/null,
+    followed by a printf of a per-command random token (plus `$?` on stdout)
+    to both pipes. Output is read up to the token, so command boundaries and
+    exit codes survive output that lacks a trailing newline.
+    """
+
+    user_id: str
+    project: str
+    proc: asyncio.subprocess.Process
+    sandbox: Sandbox
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    commands: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    @property
+    def cwd(self) -> str:
+        """The shell's current directory (from /proc), falling back to its start directory."""
+        try:
+            return os.readlink(f"/proc/{self.proc.pid}/cwd")
+        except OSError:
+            return self.project
+
+    async def run(
+        self,
+        command: str,
+        stdout: OutputCapture,
+        stderr: OutputCapture,
+        on_output: TextCallback | None = None,
+    ) -> int:
+        """Run one command in the session and return its exit code.
+
+        Raises ConnectionError if the shell exits (e.g. `exit`, or it was killed)
+        before the command's sentinel arrives.
+        """
+        assert self.proc.stdin is not None and self.proc.stdout is not None and self.proc.stderr is not None
+        token = f"__cct_done_{uuid.uuid4().hex}"
+        script = (
+            f"eval {shlex.quote(command)} </dev/null\nprintf '\\n{token} %d\\n' \"$?\"; printf '\\n{token}\\n' >&2\n"
+        )
+        try:
+            self.proc.stdin.write(script.encode())
+            await self.proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise ConnectionError("Shell session exited") from e
+
+        out, err = await asyncio.gather(
+            _read_framed(self.proc.stdout, f"\n{token} ".encode(), stdout, on_output, trailer=True),
+            _read_framed(self.proc.stderr, f"\n{token}\n".encode(), stderr, on_output),
+            return_exceptions=True,
+        )
+        for outcome in (out, err):
+            if isinstance(outcome, BaseException):
+                raise outcome
+        self.commands += 1
+        self.last_used = time.monotonic()
+        try:
+            return int(out)  # type: ignore[arg-type]
+        except ValueError:
+            return -1
+
+    async def close(self) -> None:
+        if self.alive:
+            with contextlib.suppress(Exception):
+                await terminate_group(self.proc)
+        await self.sandbox.release()
+
+
+async def _read_framed(
+    stream: asyncio.StreamReader,
+    marker: bytes,
+    capture: OutputCapture,
+    on_output: TextCallback | None,
+    trailer: bool = False,
+) -> bytes:
+    """Feed `stream` into `capture` up to `marker`.
+
+    With `trailer`, also read the rest of the marker's line and return it.
+    """
+    pending = b""
+
+    async def _feed(data: bytes) -> None:
+        text = capture.feed(data)
+        if on_output is not None and text:
+            try:
+                await on_output(text)
+            except Exception:
+                logger.exception("Output callback failed")
+
+    while True:
+        chunk = await stream.read(READ_CHUNK)
+        if not chunk:
+            await _feed(pending)
+            raise ConnectionError("Shell session exited")
+        pending += chunk
+        index = pending.find(marker)
+        if index >= 0:
+            await _feed(pending[:index])
+            rest = pending[index + len(marker) :]
+            break
+        # Hold back just enough to recognise a marker split across reads
+        keep = len(marker) - 1
+        if len(pending) > keep:
+            await _feed(pending[:-keep])
+            pending = pending[-keep:]
+
+    if not trailer:
+        return b""
+    while b"\n" not in rest:
+        chunk = await stream.read(READ_CHUNK)
+        if not chunk:
+            raise ConnectionError("Shell session exited")
+        rest += chunk
+    return rest.split(b"\n", 1)[0]
+
+
+class ShellSessionManager:
+    """One persistent shell per user, recycled after `idle_timeout` seconds unused."""
+
+    def __init__(self, limiter: ResourceLimiter, idle_timeout: int = 900) -> None:
+        self.limiter = limiter
+        self.idle_timeout = idle_timeout
+        self._sessions: dict[str, ShellSession] = {}
+        # Held while a user's session is spawned, so concurrent commands share one
+        self._spawning: dict[str, asyncio.Lock] = {}
+        self._maintenance: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, user_id: str) -> ShellSession | None:
+        session = self._sessions.get(user_id)
+        return session if session is not None and session.alive else None
+
+    async def acquire(self, user_id: str, project: str) -> ShellSession:
+        """The user's live session, spawning one in `project` if there is none."""
+        self._ensure_maintenance()
+        session = self.get(user_id)
+        if session is not None:
+            return session
+        async with self._spawning.setdefault(user_id, asyncio.Lock()):
+            session = self.get(user_id)
+            if session is None:
+                await self.discard(user_id)
+                session = await self._spawn(user_id, project)
+                self._sessions[user_id] = session
+        return session
+
+    async def discard(self, user_id: str) -> bool:
+        """Close a user's session; the next command starts a fresh one."""
+        session = self._sessions.pop(user_id, None)
+        if session is None:
+            return False
+        await session.close()
+        return True
+
+    async def evict_idle(self) -> None:
+        now = time.monotonic()
+        for user_id, session in list(self._sessions.items()):
+            if session.lock.locked():
+                continue
+            if not session.alive or now - session.last_used > self.idle_timeout:
+                logger.info("Recycling shell session of user %s", user_id)
+                await self.discard(user_id)
+
+    async def close(self) -> None:
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+        for user_id in list(self._sessions):
+            await self.discard(user_id)
+
+    async def _spawn(self, user_id: str, project: str) -> ShellSession:
+        sandbox = self.limiter.prepare(user_id, "shell")
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *SHELL_CMD,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=project,
+                start_new_session=True,
+                preexec_fn=sandbox.preexec_fn,
+            )
+        except BaseException:
+            await sandbox.release()
+            raise
+        return ShellSession(user_id=user_id, project=project, proc=proc, sandbox=sandbox)
+
+    def _ensure_maintenance(self) -> None:
+        if self._maintenance is None or self._maintenance.done():
+            self._maintenance = asyncio.ensure_future(self._maintain())
+
+    async def _maintain(self) -> None:
+        interval = max(min(self.idle_timeout / 2, 60), 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception:
+                logger.exception("Shell session maintenance failed")
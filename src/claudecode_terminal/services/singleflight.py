@@ -0,0 +1,135 @@
+"""In-flight deduplication of identical executions."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import shlex
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Programs that only read state. Anything not listed is treated as mutating.
+READ_ONLY_PROGRAMS = frozenset(
+    {
+        "cat", "date", "df", "diff", "du", "echo", "file", "free", "grep", "head", "hostname",
+        "id", "ls", "ps", "pwd", "rg", "stat", "tail", "tree", "uname", "uptime", "wc", "which", "whoami",
+    }
+)  # fmt: skip
+READ_ONLY_GIT_SUBCOMMANDS = frozenset(
+    {"blame", "describe", "diff", "log", "ls-files", "rev-parse", "shortlog", "show", "status"}
+)
+# Operators that chain commands; redirections and substitutions are never read-only.
+_CHAIN_OPERATORS = frozenset({"|", "||", "&&", ";"})
+
+
+def is_read_only_command(command: str) -> bool:
+    """Conservatively decide whether a shell command only reads state."""
+    if "`" in command or "$(" in command:
+        return False
+    try:
+        lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return False
+
+    segment: list[str] = []
+    for token in [*tokens, ";"]:
+        if token in _CHAIN_OPERATORS:
+            if segment and not _segment_read_only(segment):
+                return False
+            segment = []
+        elif token and set(token) <= set("<>&|;()"):
+            return False  # redirection, background, subshell
+        else:
+            segment.append(token)
+    return bool(tokens)
+
+
+def _segment_read_only(argv: list[str]) -> bool:
+    program = argv[0].rsplit("/", 1)[-1]
+    if program == "git":
+        args = iter(argv[1:])
+        for arg in args:
+            if arg in ("-C", "-c"):
+                next(args, None)  # option value, not the subcommand
+            elif not arg.startswith("-"):
+                return arg in READ_ONLY_GIT_SUBCOMMANDS
+        return False
+    return program in READ_ONLY_PROGRAMS
+
+
+class _Flight(Generic[T]):
+    """One shared execution and the number of callers waiting on it."""
+
+    def __init__(self, task: asyncio.Task[T]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key starts the factory as its own task; callers
+    that arrive while it is still running wait for and receive the same
+    result (or exception). Cancelling one caller never cancels the others:
+    the shared task keeps running as long as anyone is still waiting on it.
+    """
+
+    def __init__(self) -> None:
+        self.coalesced = 0
+        self._inflight: dict[Hashable, _Flight[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[T]],
+        share: Callable[[T], bool] | None = None,
+    ) -> tuple[T, bool]:
+        """Run or join the execution for `key`. Returns (result, joined_existing).
+
+        A joined caller only receives results for which `share` is true; for
+        any other (say, a run its starter cancelled) it runs or joins a fresh
+        execution instead.
+        """
+        while True:
+            flight = self._inflight.get(key)
+            joined = flight is not None and not flight.task.done()
+            if flight is None or not joined:
+                flight = self._start(key, factory)
+            flight.waiters += 1
+            try:
+                result = await asyncio.shield(flight.task)
+            finally:
+                flight.waiters -= 1
+                if not flight.waiters and not flight.task.done():
+                    # Every caller has gone; nobody is left to use the result
+                    flight.task.cancel()
+            if not joined:
+                return result, False
+            if share is None or share(result):
+                self.coalesced += 1
+                return result, True
+
+    def _start(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> _Flight[T]:
+        async def run() -> T:
+            return await factory()
+
+        flight = _Flight(asyncio.ensure_future(run()))
+        self._inflight[key] = flight
+        flight.task.add_done_callback(lambda task: self._finish(key, flight))
+        return flight
+
+    def _finish(self, key: Hashable, flight: _Flight[T]) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # Followers may never show up; don't warn about an unretrieved exception
+        if not flight.task.cancelled():
+            flight.task.exception()
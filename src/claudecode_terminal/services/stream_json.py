@@ -0,0 +1,158 @@
+"""Incremental parser for Claude Code CLI `stream-json` output."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sys
+from collections.abc import Callable
+from typing import Any
+
+from claudecode_terminal.services.capture import OutputCapture
+from claudecode_terminal.storage.models import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+# Tool input keys worth showing next to the tool name, in order of preference.
+_TOOL_SUMMARY_KEYS = ("command", "file_path", "path", "pattern", "url", "description")
+
+
+class StreamJsonParser:
+    """Parse newline-delimited JSON events emitted by `claude --output-format stream-json`.
+
+    Each call to `feed()` consumes one line and returns the text that should be
+    shown to the user for it (assistant text blocks and short tool-use markers).
+    The final `result` event is captured for the caller once the run ends.
+    Assistant text and the final answer go into captures made by
+    `new_capture` as they arrive, so with bounded captures memory stays
+    bounded however long the run; by default nothing is dropped.
+    """
+
+    def __init__(self, new_capture: Callable[[], OutputCapture] | None = None) -> None:
+        self.session_id: str = ""
+        self.result: dict[str, Any] | None = None
+        self.bytes_read = 0
+        self._new_capture = new_capture or _unbounded_capture
+        self.streamed = self._new_capture()
+        self.answer: OutputCapture | None = None
+        self._emitted = False
+
+    @property
+    def is_error(self) -> bool:
+        """Whether the final result event reported an error."""
+        return bool(self.result and self.result.get("is_error"))
+
+    @property
+    def output(self) -> OutputCapture:
+        """Capture of the final answer, falling back to the streamed assistant text."""
+        return self.answer if self.answer is not None else self.streamed
+
+    @property
+    def final_text(self) -> str:
+        """The final answer, falling back to the streamed assistant text."""
+        return self.output.text()
+
+    @property
+    def usage(self) -> TokenUsage | None:
+        """Token, cost and turn accounting from the result event, if one arrived."""
+        if self.result is None:
+            return None
+        raw = self.result.get("usage") or {}
+        return TokenUsage(
+            input_tokens=int(_number(raw.get("input_tokens"))),
+            output_tokens=int(_number(raw.get("output_tokens"))),
+            cache_read_tokens=int(_number(raw.get("cache_read_input_tokens"))),
+            cache_creation_tokens=int(_number(raw.get("cache_creation_input_tokens"))),
+            cost_usd=_number(self.result.get("total_cost_usd")),
+            num_turns=int(_number(self.result.get("num_turns"))),
+            duration_api_ms=int(_number(self.result.get("duration_api_ms"))),
+        )
+
+    def feed(self, line: str | bytes) -> str:
+        """Consume one line of output and return any newly visible text."""
+        if isinstance(line, bytes):
+            self.bytes_read += len(line)
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            return ""
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            logger.debug("Ignoring non-JSON stream line: %s", line[:200])
+            return ""
+        if not isinstance(event, dict):
+            return ""
+
+        if event.get("session_id"):
+            self.session_id = str(event["session_id"])
+
+        event_type = event.get("type")
+        if event_type == "assistant":
+            return self._render_assistant(event.get("message") or {})
+        if event_type == "result":
+            answer = event.pop("result", None)
+            if isinstance(answer, str):
+                self.answer = self._new_capture()
+                self.answer.feed(answer.encode())
+                self.streamed.close(keep_spill=False)
+            self.result = event
+        return ""
+
+    def _render_assistant(self, message: dict[str, Any]) -> str:
+        pieces: list[str] = []
+        for block in message.get("content") or []:
+            if not isinstance(block, dict):
+                continue
+            if block.get("type") == "text" and block.get("text"):
+                text = str(block["text"])
+                if self.streamed.total_bytes:
+                    self.streamed.feed(b"\n\n")
+                self.streamed.feed(text.encode())
+                pieces.append(text)
+            elif block.get("type") == "tool_use":
+                pieces.append(_format_tool_use(block))
+        if not pieces:
+            return ""
+        rendered = "\n\n".join(pieces)
+        if self._emitted:
+            rendered = "\n\n" + rendered
+        self._emitted = True
+        return rendered
+
+
+async def read_line(stream: asyncio.StreamReader) -> bytes:
+    """Read one line (b"" at EOF), skipping lines longer than the stream's limit.
+
+    An oversized event is dropped rather than failing the whole run; what is
+    left of it arrives as a partial line, which `feed()` ignores as non-JSON.
+    """
+    while True:
+        try:
+            return await stream.readline()
+        except ValueError:
+            logger.warning("Skipping a stream-json line longer than the read limit")
+
+
+def _unbounded_capture() -> OutputCapture:
+    return OutputCapture(head_bytes=sys.maxsize, tail_bytes=0)
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _format_tool_use(block: dict[str, Any]) -> str:
+    name = str(block.get("name") or "tool")
+    tool_input = block.get("input") or {}
+    if isinstance(tool_input, dict):
+        for key in _TOOL_SUMMARY_KEYS:
+            value = tool_input.get(key)
+            if value:
+                summary = str(value).splitlines()[0][:80]
+                return f"> {name}: {summary}"
+    return f"> {name}"
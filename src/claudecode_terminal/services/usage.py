@@ -0,0 +1,112 @@
+"""Claude token/cost accounting and per-user quotas."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from claudecode_terminal.config import QuotaConfig
+from claudecode_terminal.storage.database import get_usage_totals, record_usage
+from claudecode_terminal.storage.models import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+
+def today() -> str:
+    """The current UTC day as YYYY-MM-DD (the `usage_daily.day` key)."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def month_start(day: str) -> str:
+    return day[:8] + "01"
+
+
+@dataclass
+class Spend:
+    cost_usd: float = 0.0
+    tokens: int = 0
+
+
+class UsageTracker:
+    """Per-user spend for the current UTC day and month, checked against quotas.
+
+    Totals live in memory, seeded once per user and period from the
+    `usage_daily` aggregates, so checks never touch history. Concurrent runs
+    are checked before any of them reports usage, so a quota can be
+    overshot by the runs that were already in flight when it was reached.
+    """
+
+    def __init__(self, config: QuotaConfig) -> None:
+        self.config = config
+        # (user id, "day" or "month", first day) -> spend; on the 1st both periods start the same day
+        self._spend: dict[tuple[str, str, str], Spend] = {}
+        self._lock = asyncio.Lock()
+
+    def quota_for(self, user_id: str) -> QuotaConfig:
+        """Global quotas, overridden by `quotas.users.<id>`."""
+        override = self.config.users.get(str(user_id), {})
+        return QuotaConfig(
+            daily_cost_usd=float(override.get("daily_cost_usd", self.config.daily_cost_usd)),
+            monthly_cost_usd=float(override.get("monthly_cost_usd", self.config.monthly_cost_usd)),
+            daily_tokens=int(override.get("daily_tokens", self.config.daily_tokens)),
+            monthly_tokens=int(override.get("monthly_tokens", self.config.monthly_tokens)),
+        )
+
+    async def spend(self, user_id: str, day: str | None = None) -> tuple[Spend, Spend]:
+        """(today, this month) spend for a user."""
+        day = day or today()
+        return await self._period(user_id, "day", day), await self._period(user_id, "month", month_start(day))
+
+    async def check(self, user_id: str) -> str | None:
+        """Return why `user_id` is over quota, or None if they may run."""
+        quota = self.quota_for(user_id)
+        if not (quota.daily_cost_usd or quota.monthly_cost_usd or quota.daily_tokens or quota.monthly_tokens):
+            return None
+        daily, monthly = await self.spend(user_id)
+        for period, spent, cost_limit, token_limit in (
+            ("Daily", daily, quota.daily_cost_usd, quota.daily_tokens),
+            ("Monthly", monthly, quota.monthly_cost_usd, quota.monthly_tokens),
+        ):
+            if cost_limit and spent.cost_usd >= cost_limit:
+                return f"{period} cost quota reached (${spent.cost_usd:.2f} of ${cost_limit:.2f})"
+            if token_limit and spent.tokens >= token_limit:
+                return f"{period} token quota reached ({spent.tokens:,} of {token_limit:,})"
+        return None
+
+    async def record(self, user_id: str, project: str, usage: TokenUsage) -> None:
+        """Add one run's usage to the in-memory totals and the daily aggregate."""
+        day = today()
+        for spent in await self.spend(user_id, day):
+            spent.cost_usd += usage.cost_usd
+            spent.tokens += usage.total_tokens
+        await record_usage(day, str(user_id), project, usage)
+
+    async def _period(self, user_id: str, kind: str, since: str) -> Spend:
+        key = (str(user_id), kind, since)
+        spent = self._spend.get(key)
+        if spent is not None:
+            return spent
+        async with self._lock:
+            if key not in self._spend:
+                self._prune()
+                try:
+                    rows = await get_usage_totals(since, user_id=str(user_id))
+                except Exception:
+                    # Fail open: a broken history must not lock everyone out
+                    logger.exception("Failed to load usage totals")
+                    return Spend()
+                row = rows[0] if rows else {}
+                self._spend[key] = Spend(
+                    cost_usd=float(row.get("cost_usd", 0)),
+                    tokens=int(row.get("input_tokens", 0)) + int(row.get("output_tokens", 0)),
+                )
+            return self._spend[key]
+
+    def _prune(self) -> None:
+        """Forget totals of periods that have ended."""
+        day = today()
+        current = {("day", day), ("month", month_start(day))}
+        for key in [k for k in self._spend if k[1:] not in current]:
+            del self._spend[key]
@@ -2,24 +2,206 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import logging
+import re
+import time
+from collections.abc import AsyncIterator
 from pathlib import Path
+from typing import Any
 
 import aiosqlite
 
+from claudecode_terminal.config import AppConfig
+from claudecode_terminal.storage.models import HistoryFilters, HistoryPage, TokenUsage
+from claudecode_terminal.storage.outputs import pack, unpack
+from claudecode_terminal.storage.pool import Pragmas, ReaderPool, connect, default_readers
+from claudecode_terminal.storage.rollups import BUCKET_COLUMNS, COUNTERS, DIMENSIONS, PERIODS, rollup_sql
+
 logger = logging.getLogger(__name__)
 
+# The writer connection, and read-only connections for queries (None: reads use the writer)
 _db: aiosqlite.Connection | None = None
+_readers: ReaderPool | None = None
+_history: HistoryWriter | None = None
+# Held for every write transaction on the shared connection, so they never interleave
+_write_lock: asyncio.Lock | None = None
+# Whether SQLite has FTS5, and whether command output is indexed as well as command text
+_fts = False
+_search_output = False
+
+
+class HistoryWriter:
+    """Write-behind queue for `commands` rows.
+
+    Rows are committed in one transaction per batch: once `batch_size` rows
+    are pending, or `flush_interval` seconds after the first one arrived.
+    A burst of executions then costs one commit (and one fsync) instead of
+    one each. Past `max_pending` rows, `put()` flushes inline, so producers
+    slow down to the speed of the disk instead of growing the queue. A batch
+    whose commit fails is rolled back and put back at the front of the queue;
+    after `max_attempts` failed commits in a row it is dropped.
+    """
+
+    def __init__(
+        self,
+        db: aiosqlite.Connection,
+        batch_size: int = 64,
+        flush_interval: float = 0.05,
+        max_pending: int = 1000,
+        lock: asyncio.Lock | None = None,
+        max_attempts: int = 3,
+    ) -> None:
+        self.db = db
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, self.batch_size)
+        self.max_attempts = max(max_attempts, 1)
+        self._rows: list[tuple[Any, ...]] = []
+        # Rows ever queued, and rows ever settled (committed or dropped) by a flush
+        self._queued = 0
+        self._settled = 0
+        self._lock = lock or asyncio.Lock()
+        self._pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        # Failed commits since the last one that succeeded
+        self._attempts = 0
+        self._batches = 0
+        self._written = 0
+        self._failed = 0
+        self._dropped = 0
+        self._throttled = 0
+        self._max_batch = 0
+        self._commit_ms_total = 0.0
+        self._max_commit_ms = 0.0
+        self._last_commit_ms = 0.0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def put(self, row: tuple[Any, ...]) -> None:
+        if len(self._rows) >= self.max_pending:
+            self._throttled += 1
+            await self.flush()
+        self._rows.append(row)
+        self._queued += 1
+        self._pending.set()
+        if len(self._rows) >= self.batch_size:
+            self._full.set()
+
+    async def flush(self) -> None:
+        """Commit every row queued so far. Returns at once if they all are.
 
+        If the commit fails, the rows stay queued for the next flush.
+        """
+        target = self._queued
+        if self._settled >= target:
+            return
+        async with self._lock:
+            batch, self._rows = self._rows, []
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                # Hashing and compression happen off the event loop
+                outputs, commands, texts = await asyncio.to_thread(_pack_history, batch)
+                unseen = await _unseen_outputs(self.db, texts) if _search_output else {}
+                await self.db.executemany(_UPSERT_OUTPUT, outputs)
+                await _index_outputs(self.db, unseen)
+                first_id = await _next_command_id(self.db)
+                await self.db.executemany(_INSERT_COMMAND, commands)
+                await _roll_up(self.db, first_id)
+                await self.db.commit()
+            except Exception:
+                self._failed += 1
+                self._attempts += 1
+                with contextlib.suppress(Exception):
+                    await self.db.rollback()
+                if self._attempts < self.max_attempts:
+                    logger.exception("Failed to save %d command history rows; will retry", len(batch))
+                    self._rows[:0] = batch
+                    self._pending.set()
+                else:
+                    logger.exception("Failed to save %d command history rows; dropping them", len(batch))
+                    self._attempts = 0
+                    self._dropped += len(batch)
+                    self._settled += len(batch)
+                return
+            except BaseException:
+                # Cancelled mid-commit: it may have landed, so it is not retried
+                self._settled += len(batch)
+                raise
+            self._attempts = 0
+            self._settled += len(batch)
+            elapsed = (time.perf_counter() - started) * 1000
+            self._batches += 1
+            self._written += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            self._commit_ms_total += elapsed
+            self._max_commit_ms = max(self._max_commit_ms, elapsed)
+            self._last_commit_ms = elapsed
 
-async def init_db(db_path: str) -> None:
-    """Initialize database and create tables."""
-    global _db
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        # Failed batches are retried until committed or dropped
+        while self._rows:
+            await self.flush()
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "pending": len(self._rows),
+            "rows": self._written,
+            "batches": self._batches,
+            "failed": self._failed,
+            "dropped": self._dropped,
+            "throttled": self._throttled,
+            "avg_batch": round(self._written / self._batches, 1) if self._batches else 0,
+            "max_batch": self._max_batch,
+            "avg_commit_ms": round(self._commit_ms_total / self._batches, 2) if self._batches else 0,
+            "max_commit_ms": round(self._max_commit_ms, 2),
+            "last_commit_ms": round(self._last_commit_ms, 2),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await self._pending.wait()
+            # Give the batch a moment to fill, unless it already has
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            self._pending.clear()
+            self._full.clear()
+            await self.flush()
+
+
+async def init_db(
+    db_path: str,
+    history_batch_size: int = 64,
+    history_flush_ms: int = 50,
+    history_max_pending: int = 1000,
+    search_output: bool = False,
+    readers: int = -1,
+    pragmas: Pragmas | None = None,
+) -> None:
+    """Initialize database and create tables.
+
+    All writes go through one connection; with `readers` > 0, queries run on
+    that many read-only connections instead of queueing behind the writes
+    (-1: `default_readers()`).
+    """
+    global _db, _readers, _history, _write_lock, _fts, _search_output
     resolved = Path(db_path).expanduser().resolve()
     resolved.parent.mkdir(parents=True, exist_ok=True)
+    pragmas = pragmas or Pragmas()
 
-    _db = await aiosqlite.connect(str(resolved))
-    _db.row_factory = aiosqlite.Row
+    _db = await connect(resolved, pragmas)
+    # Only takes effect on a new database; maintenance converts older ones
+    await _db.execute("PRAGMA auto_vacuum = INCREMENTAL")
     await _db.execute("PRAGMA journal_mode = WAL")
 
     await _db.execute("""
@@ -33,14 +215,340 @@ async def init_db(db_path: str) -> None:
             execution_time_ms INTEGER,
             source TEXT DEFAULT 'telegram'
                 CHECK(source IN ('telegram', 'claude')),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            peak_memory_bytes INTEGER,
+            cpu_time_ms INTEGER,
+            input_tokens INTEGER,
+            output_tokens INTEGER,
+            cache_read_tokens INTEGER,
+            cache_creation_tokens INTEGER,
+            cost_usd REAL,
+            num_turns INTEGER,
+            duration_api_ms INTEGER,
+            project TEXT,
+            model TEXT,
+            stdout_hash TEXT,
+            stderr_hash TEXT
+        )
+    """)
+    await _add_missing_columns(_db, "commands", _COMMAND_COLUMNS)
+    # Command output, compressed and stored once per distinct content.
+    # `commands.stdout_hash`/`stderr_hash` reference it; `refcount` counts those references.
+    await _db.execute("""
+        CREATE TABLE IF NOT EXISTS outputs (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0
         )
     """)
     await _db.execute("CREATE INDEX IF NOT EXISTS idx_commands_created_at ON commands(created_at)")
+    # History pages per user, per source and per user and project, newest first
+    await _db.execute("CREATE INDEX IF NOT EXISTS idx_commands_user ON commands(user_id, id DESC)")
+    await _db.execute("CREATE INDEX IF NOT EXISTS idx_commands_source ON commands(source, id DESC)")
+    await _db.execute("CREATE INDEX IF NOT EXISTS idx_commands_user_project ON commands(user_id, project, id DESC)")
+    await _db.execute("""
+        CREATE TABLE IF NOT EXISTS claude_cache (
+            key TEXT PRIMARY KEY,
+            stdout TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """)
+    await _db.execute("""
+        CREATE TABLE IF NOT EXISTS claude_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            project TEXT NOT NULL,
+            thread TEXT NOT NULL DEFAULT '',
+            session_id TEXT NOT NULL,
+            title TEXT DEFAULT '',
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            UNIQUE(user_id, project, thread, session_id)
+        )
+    """)
+    # Per-day usage aggregates, so reports and quotas never scan `commands`
+    await _db.execute("""
+        CREATE TABLE IF NOT EXISTS usage_daily (
+            day TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            project TEXT NOT NULL,
+            runs INTEGER NOT NULL DEFAULT 0,
+            input_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0,
+            cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+            cache_creation_tokens INTEGER NOT NULL DEFAULT 0,
+            cost_usd REAL NOT NULL DEFAULT 0,
+            num_turns INTEGER NOT NULL DEFAULT 0,
+            duration_api_ms INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id, project)
+        )
+    """)
+    await _db.execute("CREATE INDEX IF NOT EXISTS idx_usage_daily_user ON usage_daily(user_id, day)")
+    await _db.execute("""
+        CREATE TABLE IF NOT EXISTS latency_sketches (
+            source TEXT NOT NULL,
+            project TEXT NOT NULL,
+            model TEXT NOT NULL DEFAULT '',
+            sketch TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (source, project, model)
+        )
+    """)
+    await _db.execute("""
+        CREATE TABLE IF NOT EXISTS background_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            chat_id INTEGER,
+            command TEXT NOT NULL,
+            cwd TEXT NOT NULL,
+            spool_path TEXT NOT NULL,
+            pid INTEGER,
+            pid_start INTEGER,
+            state TEXT NOT NULL DEFAULT 'running'
+                CHECK(state IN ('running', 'done', 'failed', 'cancelled', 'lost')),
+            exit_code INTEGER,
+            bytes_out INTEGER DEFAULT 0,
+            started_at REAL NOT NULL,
+            finished_at REAL
+        )
+    """)
+    await _db.execute("CREATE INDEX IF NOT EXISTS idx_background_jobs_state ON background_jobs(state)")
+    # Bot `context.user_data`, one JSON value per (Telegram user, key)
+    await _db.execute("""
+        CREATE TABLE IF NOT EXISTS user_state (
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (user_id, key)
+        ) WITHOUT ROWID
+    """)
+    # Per hour and per day aggregates of `commands`, updated with each history batch.
+    # Rows outlive the history they summarize: retention does not touch them.
+    await _db.execute(f"""
+        CREATE TABLE IF NOT EXISTS command_stats (
+            period TEXT NOT NULL CHECK(period IN ('hour', 'day')),
+            start TEXT NOT NULL,
+            source TEXT NOT NULL,
+            model TEXT NOT NULL,
+            project TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            program TEXT NOT NULL,
+            {" ".join(f"{f} INTEGER NOT NULL DEFAULT 0," for f in COUNTERS)}
+            PRIMARY KEY (period, start, {", ".join(DIMENSIONS)})
+        ) WITHOUT ROWID
+    """)
+    # `commands` rows with a lower id are not in `command_stats` yet (see backfill_stats)
+    await _db.execute("CREATE TABLE IF NOT EXISTS command_stats_backfill (below_id INTEGER NOT NULL)")
+    await _db.execute("""
+        INSERT INTO command_stats_backfill (below_id)
+        SELECT COALESCE(MAX(id), 0) + 1 FROM commands WHERE NOT EXISTS (SELECT 1 FROM command_stats_backfill)
+    """)
     await _db.commit()
+    await _migrate_outputs(_db)
+    _fts = await _init_search(_db, search_output)
+    _search_output = _fts and search_output
+    _write_lock = asyncio.Lock()
+    _history = HistoryWriter(
+        _db,
+        batch_size=history_batch_size,
+        flush_interval=history_flush_ms / 1000,
+        max_pending=history_max_pending,
+        lock=_write_lock,
+    )
+    _history.start()
+    if readers < 0:
+        readers = default_readers()
+    if readers > 0:
+        _readers = ReaderPool(resolved, readers, pragmas)
+        await _readers.open()
     logger.info("Database initialized: %s", resolved)
 
 
+async def init_storage(config: AppConfig) -> None:
+    """`init_db` with the `[storage]` settings of `config`."""
+    storage = config.storage
+    await init_db(
+        storage.db_path,
+        history_batch_size=storage.history_batch_size,
+        history_flush_ms=storage.history_flush_ms,
+        history_max_pending=storage.history_max_pending,
+        search_output=storage.search_output,
+        readers=storage.readers,
+        pragmas=Pragmas(
+            synchronous=storage.synchronous,
+            cache_size_kb=storage.cache_size_kb,
+            mmap_size_mb=storage.mmap_size_mb,
+            busy_timeout_ms=storage.busy_timeout_ms,
+        ),
+    )
+
+
+# Columns added to `commands` after its first release
+_COMMAND_COLUMNS = {
+    "peak_memory_bytes": "INTEGER",
+    "cpu_time_ms": "INTEGER",
+    "input_tokens": "INTEGER",
+    "output_tokens": "INTEGER",
+    "cache_read_tokens": "INTEGER",
+    "cache_creation_tokens": "INTEGER",
+    "cost_usd": "REAL",
+    "num_turns": "INTEGER",
+    "duration_api_ms": "INTEGER",
+    "project": "TEXT",
+    "model": "TEXT",
+    "stdout_hash": "TEXT",
+    "stderr_hash": "TEXT",
+}
+
+# PRAGMA user_version once inline outputs were moved to `outputs`
+_OUTPUTS_SCHEMA_VERSION = 1
+_MIGRATE_CHUNK = 500
+
+_USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_read_tokens",
+    "cache_creation_tokens",
+    "cost_usd",
+    "num_turns",
+    "duration_api_ms",
+)
+
+
+async def _table_columns(db: aiosqlite.Connection, table: str, schema: str = "main") -> dict[str, str]:
+    cursor = await db.execute(f"PRAGMA {schema}.table_info({table})")
+    return {row["name"]: row["type"] for row in await cursor.fetchall()}
+
+
+async def _add_missing_columns(
+    db: aiosqlite.Connection, table: str, columns: dict[str, str], schema: str = "main"
+) -> None:
+    """Add columns introduced after `table` was first created."""
+    existing = await _table_columns(db, table, schema)
+    for name, decl in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {name} {decl}")
+
+
+async def _migrate_outputs(db: aiosqlite.Connection) -> None:
+    """One-shot move of inline `commands.stdout`/`stderr` into `outputs`; resumable per chunk."""
+    if await _pragma(db, "user_version") >= _OUTPUTS_SCHEMA_VERSION:
+        return
+    migrated = 0
+    while True:
+        rows = await _fetchall(
+            db,
+            """SELECT id, stdout, stderr FROM commands
+               WHERE stdout_hash IS NULL AND stderr_hash IS NULL AND (stdout != '' OR stderr != '')
+               LIMIT ?""",
+            (_MIGRATE_CHUNK,),
+        )
+        if not rows:
+            break
+        outputs: list[tuple[str, str, bytes, int]] = []
+        updates: list[tuple[str | int | None, ...]] = []
+        for row in rows:
+            hashes: list[str | None] = []
+            for text in (row["stdout"], row["stderr"]):
+                if text:
+                    packed = pack(text)
+                    outputs.append(packed)
+                    hashes.append(packed[0])
+                else:
+                    hashes.append(None)
+            updates.append((*hashes, row["id"]))
+        await db.executemany(_UPSERT_OUTPUT, outputs)
+        await db.executemany(
+            "UPDATE commands SET stdout = '', stderr = '', stdout_hash = ?, stderr_hash = ? WHERE id = ?", updates
+        )
+        await db.commit()
+        migrated += len(rows)
+    await db.execute(f"PRAGMA user_version = {_OUTPUTS_SCHEMA_VERSION}")
+    await db.commit()
+    if migrated:
+        logger.info("Moved output of %d history rows into compressed storage", migrated)
+        await db.execute("VACUUM")
+
+
+async def _table_exists(db: aiosqlite.Connection, name: str) -> bool:
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    return await cursor.fetchone() is not None
+
+
+async def _init_search(db: aiosqlite.Connection, search_output: bool) -> bool:
+    """Create the full-text indexes, backfilling them on first use. Returns False without FTS5.
+
+    `commands_fts` indexes command text and is kept in sync by triggers.
+    `outputs_fts` indexes output, which is stored compressed where a trigger
+    cannot read it, so the history writer indexes each new output itself.
+    It is contentless: snippets of output are cut from the decompressed text.
+    """
+    try:
+        created = not await _table_exists(db, "commands_fts")
+        await db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS commands_fts "
+            "USING fts5(command, content='commands', content_rowid='id')"
+        )
+    except Exception as e:
+        logger.warning("Full-text search unavailable (%s); /search falls back to substring matching", e)
+        return False
+    await db.executescript("""
+        CREATE TRIGGER IF NOT EXISTS commands_fts_insert AFTER INSERT ON commands BEGIN
+            INSERT INTO commands_fts(rowid, command) VALUES (new.id, new.command);
+        END;
+        CREATE TRIGGER IF NOT EXISTS commands_fts_delete AFTER DELETE ON commands BEGIN
+            INSERT INTO commands_fts(commands_fts, rowid, command) VALUES ('delete', old.id, old.command);
+        END;
+        CREATE TRIGGER IF NOT EXISTS commands_fts_update AFTER UPDATE OF command ON commands BEGIN
+            INSERT INTO commands_fts(commands_fts, rowid, command) VALUES ('delete', old.id, old.command);
+            INSERT INTO commands_fts(rowid, command) VALUES (new.id, new.command);
+        END;
+        CREATE INDEX IF NOT EXISTS idx_commands_stdout_hash ON commands(stdout_hash);
+        CREATE INDEX IF NOT EXISTS idx_commands_stderr_hash ON commands(stderr_hash);
+    """)
+    if created:
+        await db.execute("INSERT INTO commands_fts(commands_fts) VALUES ('rebuild')")
+
+    if not search_output:
+        await db.execute("DROP TABLE IF EXISTS outputs_fts")
+    elif not await _table_exists(db, "outputs_fts"):
+        await db.execute("CREATE VIRTUAL TABLE outputs_fts USING fts5(text, content='')")
+        cursor = await db.execute("SELECT rowid, codec, data FROM outputs")
+        while rows := await cursor.fetchmany(_MIGRATE_CHUNK):
+            await db.executemany(
+                "INSERT INTO outputs_fts(rowid, text) VALUES (?, ?)",
+                [(row["rowid"], unpack(row["codec"], row["data"])) for row in rows],
+            )
+    await db.commit()
+    return True
+
+
+async def _unseen_outputs(db: aiosqlite.Connection, texts: dict[str, str]) -> dict[str, str]:
+    """The outputs in `texts` (by hash) that are not stored yet."""
+    if not texts:
+        return {}
+    cursor = await db.execute(f"SELECT hash FROM outputs WHERE hash IN ({', '.join('?' * len(texts))})", list(texts))
+    seen = {row[0] for row in await cursor.fetchall()}
+    return {h: text for h, text in texts.items() if h not in seen}
+
+
+async def _index_outputs(db: aiosqlite.Connection, texts: dict[str, str]) -> None:
+    """Add newly stored outputs to `outputs_fts`, under their `outputs` rowid."""
+    if not texts:
+        return
+    cursor = await db.execute(
+        f"SELECT rowid, hash FROM outputs WHERE hash IN ({', '.join('?' * len(texts))})", list(texts)
+    )
+    await db.executemany(
+        "INSERT INTO outputs_fts(rowid, text) VALUES (?, ?)",
+        [(row[0], texts[row[1]]) for row in await cursor.fetchall()],
+    )
+
+
 async def get_db() -> aiosqlite.Connection:
     """Get the database connection."""
     if _db is None:
@@ -48,15 +556,88 @@ async def get_db() -> aiosqlite.Connection:
     return _db
 
 
+@contextlib.asynccontextmanager
+async def read_connection() -> AsyncIterator[aiosqlite.Connection]:
+    """A connection for queries: a pooled reader, or the writer without a pool.
+
+    Readers see what was committed when each statement started, so callers
+    that must see queued history rows call `flush_history()` first.
+    """
+    if _readers is None:
+        yield await get_db()
+        return
+    async with _readers.connection() as db:
+        yield db
+
+
+def reader_stats() -> dict[str, int] | None:
+    return _readers.stats() if _readers is not None else None
+
+
+@contextlib.asynccontextmanager
+async def write_transaction() -> AsyncIterator[aiosqlite.Connection]:
+    """The connection, for one transaction that history batch commits cannot interleave with.
+
+    Commits when the block exits, rolls back if it raises.
+    """
+    db = await get_db()
+    async with _write_lock or contextlib.nullcontext():
+        try:
+            yield db
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.commit()
+
+
 async def close_db() -> None:
-    """Close the database connection."""
-    global _db
+    """Flush pending history and close the database connection."""
+    global _db, _readers, _history
+    if _history is not None:
+        await _history.close()
+        _history = None
+    if _readers is not None:
+        await _readers.close()
+        _readers = None
     if _db is not None:
         await _db.close()
         _db = None
         logger.info("Database closed")
 
 
+_INSERT_COMMAND = f"""
+    INSERT INTO commands (user_id, command, stdout_hash, stderr_hash, exit_code, execution_time_ms, source,
+                          peak_memory_bytes, cpu_time_ms, project, model, {", ".join(_USAGE_FIELDS)})
+    VALUES ({", ".join("?" * (11 + len(_USAGE_FIELDS)))})
+"""
+_UPSERT_OUTPUT = """
+    INSERT INTO outputs (hash, codec, data, size, refcount) VALUES (?, ?, ?, ?, 1)
+    ON CONFLICT(hash) DO UPDATE SET refcount = refcount + 1
+"""
+
+
+def _pack_history(
+    rows: list[tuple[Any, ...]],
+) -> tuple[list[tuple[str, str, bytes, int]], list[tuple[Any, ...]], dict[str, str]]:
+    """Split queued history rows into `outputs` upserts, `commands` rows referencing them, and texts by hash."""
+    packed: dict[str, tuple[str, str, bytes, int]] = {}
+    outputs: list[tuple[str, str, bytes, int]] = []
+    commands: list[tuple[Any, ...]] = []
+    for user_id, command, stdout, stderr, *rest in rows:
+        hashes: list[str | None] = []
+        for text in (stdout, stderr):
+            if not text:
+                hashes.append(None)
+                continue
+            entry = packed.get(text)
+            if entry is None:
+                entry = packed[text] = pack(text)
+            outputs.append(entry)
+            hashes.append(entry[0])
+        commands.append((user_id, command, *hashes, *rest))
+    return outputs, commands, {entry[0]: text for text, entry in packed.items()}
+
+
 async def save_command(
     user_id: str,
     command: str,
@@ -65,26 +646,761 @@ async def save_command(
     exit_code: int,
     execution_time_ms: int,
     source: str = "telegram",
+    peak_memory_bytes: int | None = None,
+    cpu_time_ms: int | None = None,
+    usage: TokenUsage | None = None,
+    project: str | None = None,
+    model: str | None = None,
 ) -> None:
-    """Save a command execution to history."""
-    try:
-        db = await get_db()
-        await db.execute(
-            """INSERT INTO commands (user_id, command, stdout, stderr, exit_code, execution_time_ms, source)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (user_id, command, stdout, stderr, exit_code, execution_time_ms, source),
+    """Queue a command execution for the history (committed in batches)."""
+    usage_values = tuple(getattr(usage, f) for f in _USAGE_FIELDS) if usage else (None,) * len(_USAGE_FIELDS)
+    if _history is None:
+        logger.error("Failed to save command history: database not initialized")
+        return
+    await _history.put(
+        (
+            user_id,
+            command,
+            stdout,
+            stderr,
+            exit_code,
+            execution_time_ms,
+            source,
+            peak_memory_bytes,
+            cpu_time_ms,
+            project,
+            model,
+            *usage_values,
         )
-        await db.commit()
-    except Exception:
-        logger.exception("Failed to save command history")
+    )
 
 
-async def get_recent_commands(limit: int = 10) -> list[dict]:
-    """Get recent command history."""
-    db = await get_db()
+async def flush_history() -> None:
+    """Commit queued history rows, so that reads see them."""
+    if _history is not None:
+        await _history.flush()
+
+
+async def _load_outputs(db: aiosqlite.Connection, hashes: set[str]) -> dict[str, str]:
+    if not hashes:
+        return {}
     cursor = await db.execute(
-        "SELECT command, exit_code, execution_time_ms, source, created_at FROM commands ORDER BY id DESC LIMIT ?",
-        (limit,),
+        f"SELECT hash, codec, data FROM outputs WHERE hash IN ({', '.join('?' * len(hashes))})", tuple(hashes)
+    )
+    return {row["hash"]: unpack(row["codec"], row["data"]) for row in await cursor.fetchall()}
+
+
+async def _with_outputs(db: aiosqlite.Connection, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Fill `stdout`/`stderr` of history rows from `outputs`."""
+    hashes = {row[col] for row in rows for col in ("stdout_hash", "stderr_hash") if row.get(col)}
+    texts = await _load_outputs(db, hashes)
+    for row in rows:
+        for name in ("stdout", "stderr"):
+            digest = row.pop(f"{name}_hash", None)
+            if digest:
+                row[name] = texts.get(digest, "")
+    return rows
+
+
+async def get_command(command_id: int) -> dict[str, Any] | None:
+    """One history row with its full output."""
+    await flush_history()
+    async with read_connection() as db:
+        rows = await _fetchall(db, "SELECT * FROM commands WHERE id = ?", (command_id,))
+        if not rows:
+            return None
+        return (await _with_outputs(db, [dict(rows[0])]))[0]
+
+
+async def _delete_commands(db: aiosqlite.Connection, command_ids: list[int]) -> int:
+    """Delete history rows and release their outputs, without committing."""
+    placeholders = ", ".join("?" * len(command_ids))
+    cursor = await db.execute(
+        f"SELECT stdout_hash, stderr_hash FROM commands WHERE id IN ({placeholders})", tuple(command_ids)
+    )
+    released = [(h,) for row in await cursor.fetchall() for h in row if h]
+    cursor = await db.execute(f"DELETE FROM commands WHERE id IN ({placeholders})", tuple(command_ids))
+    deleted = cursor.rowcount
+    await db.executemany("UPDATE outputs SET refcount = refcount - 1 WHERE hash = ?", released)
+    if _search_output and released:
+        # A contentless index needs the original text to remove it
+        hashes = ", ".join("?" * len(released))
+        cursor = await db.execute(
+            f"SELECT rowid, codec, data FROM outputs WHERE refcount <= 0 AND hash IN ({hashes})",
+            [h for (h,) in released],
+        )
+        await db.executemany(
+            "INSERT INTO outputs_fts(outputs_fts, rowid, text) VALUES ('delete', ?, ?)",
+            [(row[0], unpack(row[1], row[2])) for row in await cursor.fetchall()],
+        )
+    await db.executemany("DELETE FROM outputs WHERE hash = ? AND refcount <= 0", released)
+    return deleted
+
+
+async def delete_commands(command_ids: list[int]) -> int:
+    """Delete history rows, and any output no longer referenced. Returns rows deleted."""
+    if not command_ids:
+        return 0
+    await flush_history()
+    async with write_transaction() as db:
+        return await _delete_commands(db, command_ids)
+
+
+async def oldest_commands(limit: int, before: str | None = None) -> list[tuple[int, str]]:
+    """(id, created_at) of the oldest history rows, optionally only those created before `before`.
+
+    Timestamps are UTC, formatted like `created_at` ("YYYY-MM-DD HH:MM:SS").
+    """
+    await flush_history()
+    async with read_connection() as db:
+        if before is None:
+            rows = await _fetchall(db, "SELECT id, created_at FROM commands ORDER BY id LIMIT ?", (limit,))
+        else:
+            rows = await _fetchall(
+                db,
+                "SELECT id, created_at FROM commands WHERE created_at < ? ORDER BY created_at, id LIMIT ?",
+                (before, limit),
+            )
+    return [(row[0], row[1]) for row in rows]
+
+
+async def archive_commands(command_ids: list[int], path: str) -> int:
+    """Move history rows, with their output, into the SQLite file at `path`. Returns rows moved.
+
+    The archive holds plain `commands` and `outputs` tables (created on first
+    use) and is never written again once its month is over, so dropping it is
+    a file unlink.
+    """
+    if not command_ids:
+        return 0
+    await flush_history()
+    placeholders = ", ".join("?" * len(command_ids))
+    async with write_transaction() as db:
+        await db.execute("ATTACH DATABASE ? AS archive", (path,))
+        try:
+            columns = await _table_columns(db, "commands")
+            await db.execute("CREATE TABLE IF NOT EXISTS archive.commands AS SELECT * FROM main.commands WHERE 0")
+            await db.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_commands_id ON commands(id)")
+            await _add_missing_columns(db, "commands", columns, schema="archive")
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS archive.outputs (
+                    hash TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            names = ", ".join(columns)
+            await db.execute(
+                f"INSERT OR IGNORE INTO archive.commands ({names}) "
+                f"SELECT {names} FROM main.commands WHERE id IN ({placeholders})",
+                tuple(command_ids),
+            )
+            await db.execute(
+                f"""INSERT OR IGNORE INTO archive.outputs (hash, codec, data, size)
+                    SELECT hash, codec, data, size FROM main.outputs WHERE hash IN (
+                        SELECT stdout_hash FROM main.commands WHERE id IN ({placeholders})
+                        UNION SELECT stderr_hash FROM main.commands WHERE id IN ({placeholders})
+                    )""",
+                tuple(command_ids) * 2,
+            )
+            moved = await _delete_commands(db, command_ids)
+            await db.commit()
+        except BaseException:
+            await db.rollback()  # DETACH needs the transaction closed
+            raise
+        finally:
+            await db.execute("DETACH DATABASE archive")
+    return moved
+
+
+async def _fetchall(
+    db: aiosqlite.Connection, sql: str, params: tuple[Any, ...] | list[Any] = ()
+) -> list[aiosqlite.Row]:
+    """Every row of a query. The statement is run to completion, which ends its read snapshot."""
+    return list(await db.execute_fetchall(sql, params))
+
+
+async def _pragma(db: aiosqlite.Connection, name: str) -> int:
+    return int((await _fetchall(db, f"PRAGMA {name}"))[0][0])
+
+
+async def history_size() -> dict[str, int]:
+    """History rows, and the bytes of the database file in use and free."""
+    await flush_history()
+    async with read_connection() as db:
+        rows = (await _fetchall(db, "SELECT COUNT(*) FROM commands"))[0][0]
+        page_size = await _pragma(db, "page_size")
+        pages = await _pragma(db, "page_count")
+        free = await _pragma(db, "freelist_count")
+    return {"rows": rows, "used_bytes": (pages - free) * page_size, "free_bytes": free * page_size}
+
+
+# Without incremental auto-vacuum, a full VACUUM (which also enables it) once this share of pages is free
+VACUUM_FREE_RATIO = 0.25
+
+
+async def compact_db() -> int:
+    """Return free pages to the filesystem and truncate the WAL. Returns bytes released."""
+    async with write_transaction() as db:
+        page_size = await _pragma(db, "page_size")
+        before = await _pragma(db, "page_count")
+        free = await _pragma(db, "freelist_count")
+        if await _pragma(db, "auto_vacuum") == 2:
+            # One step of this pragma frees one page; executescript runs it to completion
+            await db.executescript("PRAGMA incremental_vacuum")
+        elif free and free >= before * VACUUM_FREE_RATIO:
+            logger.info("Rebuilding history database with incremental auto-vacuum")
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+        after = await _pragma(db, "page_count")
+        cursor = await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        await cursor.fetchall()
+    return (before - after) * page_size
+
+
+# Around matched terms in search snippets; formatters turn them into highlighting
+MARK_START, MARK_END = "\x02", "\x03"
+SNIPPET_WIDTH = 80
+
+
+def search_terms(query: str) -> list[str]:
+    """Words of a free-text query, as the FTS tokenizer sees them."""
+    # unicode61 splits on anything but letters and digits, underscores included
+    return re.findall(r"[^\W_]+", query.lower())
+
+
+def _fts_query(terms: list[str]) -> str:
+    # Every word must match, as a prefix; quoting keeps FTS5 syntax out of user input
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _snippet(text: str, terms: list[str], width: int = SNIPPET_WIDTH) -> str:
+    """A window of `text` around the first matched term, with every match marked."""
+    pattern = re.compile(r"(?<![^\W_])(" + "|".join(map(re.escape, terms)) + r")[^\W_]*", re.IGNORECASE)
+    first = pattern.search(text)
+    if first is None:
+        return ""
+    start = max(first.start() - width // 3, 0)
+    window = text[start : start + width].replace("\n", " ").strip()
+    marked = pattern.sub(lambda m: f"{MARK_START}{m.group()}{MARK_END}", window)
+    return ("..." if start else "") + marked + ("..." if start + width < len(text) else "")
+
+
+def search_cursor(row: dict[str, Any]) -> str:
+    """Token for the search results after `row`; pass it back as `search_commands(after=...)`."""
+    return f"{row['id']}:{row['rank']!r}"
+
+
+def _search_query(
+    terms: list[str], user_id: str | None, after: tuple[int, float] | None, limit: int
+) -> tuple[str, tuple[Any, ...]]:
+    """SQL for one page of search hits, best first, then newest first among equal ranks."""
+    user_clause = "AND c.user_id = ?" if user_id is not None else ""
+    user_params: tuple[Any, ...] = (user_id,) if user_id is not None else ()
+    # Keyset on (rank, id): later pages never re-rank what earlier ones returned
+    keyset = "AND (h.rank > ? OR (h.rank = ? AND h.id < ?))" if after is not None else ""
+    keyset_params: tuple[Any, ...] = (after[1], after[1], after[0]) if after is not None else ()
+
+    if not _fts:
+        # No relevance without FTS5: every hit ranks 0, so pages run newest first
+        likes = " AND ".join("c.command LIKE ?" for _ in terms)
+        id_clause = "AND c.id < ?" if after is not None else ""
+        id_params = (after[0],) if after is not None else ()
+        sql = f"""
+            SELECT c.*, 0.0 AS rank FROM commands c
+            WHERE {likes} {user_clause} {id_clause}
+            ORDER BY c.id DESC LIMIT ?"""
+        return sql, (*(f"%{t}%" for t in terms), *user_params, *id_params, limit)
+
+    fts = _fts_query(terms)
+    # Each branch keeps only the user's hits, so nobody else's matches are ranked or materialized.
+    # CROSS JOIN keeps the full-text match as the outer loop rather than every row the user has.
+    hits = f"""
+        SELECT c.id, bm25(commands_fts) AS rank FROM commands_fts
+        CROSS JOIN commands c ON c.id = commands_fts.rowid
+        WHERE commands_fts MATCH ? {user_clause}"""
+    params: tuple[Any, ...] = (fts, *user_params)
+    if _search_output:
+        for column in ("stdout_hash", "stderr_hash"):
+            hits += f"""
+                UNION ALL
+                SELECT c.id, bm25(outputs_fts) FROM outputs_fts
+                CROSS JOIN outputs o ON o.rowid = outputs_fts.rowid
+                CROSS JOIN commands c ON c.{column} = o.hash
+                WHERE outputs_fts MATCH ? {user_clause}"""
+            params += (fts, *user_params)
+    sql = f"""
+        WITH hits AS MATERIALIZED ({hits}),
+        best AS (SELECT id, MIN(rank) AS rank FROM hits GROUP BY id)
+        SELECT c.*, h.rank FROM best h JOIN commands c ON c.id = h.id
+        WHERE 1 {keyset}
+        ORDER BY h.rank, h.id DESC LIMIT ?"""
+    return sql, (*params, *keyset_params, limit)
+
+
+async def search_commands(
+    query: str,
+    user_id: str | None = None,
+    limit: int = 10,
+    after: str | None = None,
+) -> tuple[list[dict[str, Any]], bool]:
+    """Best matches for `query` in command text (and output, with `storage.search_output`).
+
+    Returns one page of rows, each with a `snippet` of the matching command or
+    output, and whether more pages follow. The next page is the one `after`
+    the `search_cursor()` of the last row. Raises ValueError for a malformed
+    cursor.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    cursor: tuple[int, float] | None = None
+    if after is not None:
+        last_id, _, rank = after.partition(":")
+        cursor = (int(last_id), float(rank))
+    await flush_history()
+
+    sql, params = _search_query(terms, user_id, cursor, limit + 1)
+    async with read_connection() as db:
+        rows = [dict(row) for row in await _fetchall(db, sql, params)]
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if _search_output:
+            await _with_outputs(db, rows)
+    for row in rows:
+        row["snippet"] = _snippet(row["command"], terms) or _snippet(
+            f"{row.get('stdout') or ''}\n{row.get('stderr') or ''}", terms
+        )
+        for name in ("stdout", "stderr", "stdout_hash", "stderr_hash"):
+            row.pop(name, None)
+    return rows, more
+
+
+def history_stats() -> dict[str, float] | None:
+    """Batch size and commit latency of history writes."""
+    return _history.stats() if _history is not None else None
+
+
+def _history_query(
+    user_id: str | None = None,
+    source: str | None = None,
+    project: str | None = None,
+    status: str | None = None,
+    exit_code: int | None = None,
+    before: int | None = None,
+    after: int | None = None,
+    limit: int = 10,
+) -> tuple[str, tuple[Any, ...]]:
+    """SQL for one page of history: newest first, or oldest first after `after`."""
+    where: list[str] = []
+    params: list[Any] = []
+    for column, value in (("user_id", user_id), ("source", source), ("project", project), ("exit_code", exit_code)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if exit_code is None and status == "ok":
+        where.append("exit_code = 0")
+    elif exit_code is None and status == "failed":
+        where.append("exit_code != 0")
+    if before is not None:
+        where.append("id < ?")
+        params.append(before)
+    elif after is not None:
+        where.append("id > ?")
+        params.append(after)
+    sql = (
+        "SELECT id, user_id, command, exit_code, execution_time_ms, source, project, created_at FROM commands"
+        + (f" WHERE {' AND '.join(where)}" if where else "")
+        + f" ORDER BY id {'ASC' if after is not None and before is None else 'DESC'} LIMIT ?"
     )
-    rows = await cursor.fetchall()
+    return sql, (*params, limit)
+
+
+async def get_history(
+    user_id: str | None = None,
+    source: str | None = None,
+    project: str | None = None,
+    status: str | None = None,
+    exit_code: int | None = None,
+    before: int | None = None,
+    after: int | None = None,
+    limit: int = 10,
+) -> HistoryPage:
+    """A page of history rows, newest first, matching every filter given.
+
+    Pages are addressed by row id rather than offset: `before` gives the page
+    of older rows, `after` the page of newer rows, so each page costs one
+    index range read however deep it is. `status` is "ok" or "failed";
+    `exit_code` matches one exit code exactly.
+    """
+    await flush_history()
+    filters: HistoryFilters = {
+        "user_id": user_id,
+        "source": source,
+        "project": project,
+        "status": status,
+        "exit_code": exit_code,
+    }
+    newer_first = after is None or before is not None
+    async with read_connection() as db:
+        rows = [
+            dict(row)
+            for row in await _fetchall(db, *_history_query(**filters, before=before, after=after, limit=limit + 1))
+        ]
+        more = len(rows) > limit
+        rows = rows[:limit] if newer_first else rows[:limit][::-1]
+        if not rows:
+            return HistoryPage()
+
+        # Whether anything lies past the other end of the page
+        if newer_first:
+            edge = _history_query(**filters, after=rows[0]["id"], limit=1)
+        else:
+            edge = _history_query(**filters, before=rows[-1]["id"], limit=1)
+        beyond = bool(await _fetchall(db, *edge))
+    return HistoryPage(
+        rows=rows,
+        has_older=more if newer_first else beyond,
+        has_newer=beyond if newer_first else more,
+    )
+
+
+async def iter_commands(
+    columns: tuple[str, ...],
+    after_id: int = 0,
+    since: str | None = None,
+    until: str | None = None,
+    batch: int = 1000,
+    with_output: bool = False,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """History rows after `after_id` and created in [since, until), oldest first, `batch` rows at a time.
+
+    Each batch is its own query for ids past the last one seen, walking the
+    primary key, so memory stays at one batch however large the table is and
+    no read snapshot stays open while the caller writes a batch out.
+    `columns` must include `id`; `with_output` adds `stdout` and `stderr`.
+    """
+    await flush_history()
+    select = ", ".join((*columns, "stdout_hash", "stderr_hash") if with_output else columns)
+    # Unary + keeps the planner on the primary key: an index on created_at would need a sort per batch
+    where, params = ["id > ?"], []
+    if since is not None:
+        where.append("+created_at >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("+created_at < ?")
+        params.append(until)
+    sql = f"SELECT {select} FROM commands WHERE {' AND '.join(where)} ORDER BY id LIMIT ?"
+
+    last_id = after_id
+    if since is not None:
+        # Skip straight to the first row of the range
+        async with read_connection() as db:
+            first = await _fetchall(db, "SELECT MIN(id) FROM commands WHERE created_at >= ?", (since,))
+        if first[0][0] is None:
+            return
+        last_id = max(last_id, int(first[0][0]) - 1)
+    while True:
+        async with read_connection() as db:
+            rows = [dict(row) for row in await _fetchall(db, sql, (last_id, *params, batch))]
+            if with_output:
+                for row in await _with_outputs(db, rows):
+                    row.setdefault("stdout", "")
+                    row.setdefault("stderr", "")
+        if not rows:
+            return
+        last_id = rows[-1]["id"]
+        yield rows
+        if len(rows) < batch:
+            return
+
+
+async def get_recent_commands(limit: int = 10, user_id: str | None = None) -> list[dict[str, Any]]:
+    """Get recent command history, of one user or of everyone."""
+    return (await get_history(user_id=user_id, limit=limit)).rows
+
+
+async def load_cache_entries(limit: int) -> list[dict[str, Any]]:
+    """Load the most recently used cached Claude results."""
+    async with read_connection() as db:
+        rows = await _fetchall(
+            db,
+            "SELECT key, stdout, created_at, last_used FROM claude_cache ORDER BY last_used DESC LIMIT ?",
+            (limit,),
+        )
+    return [dict(row) for row in rows]
+
+
+async def save_cache_entry(key: str, stdout: str, created_at: float, last_used: float) -> None:
+    """Insert or replace a cached Claude result."""
+    try:
+        async with write_transaction() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO claude_cache (key, stdout, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, stdout, created_at, last_used),
+            )
+    except Exception:
+        logger.exception("Failed to save cache entry")
+
+
+async def delete_cache_entries(keys: list[str]) -> None:
+    """Remove cached Claude results."""
+    if not keys:
+        return
+    try:
+        async with write_transaction() as db:
+            await db.executemany("DELETE FROM claude_cache WHERE key = ?", [(k,) for k in keys])
+    except Exception:
+        logger.exception("Failed to delete cache entries")
+
+
+async def save_claude_session(user_id: str, project: str, thread: str, session_id: str, title: str = "") -> None:
+    """Record a Claude session and make it the thread's active one."""
+    try:
+        now = time.time()
+        async with write_transaction() as db:
+            await db.execute(
+                """INSERT INTO claude_sessions (user_id, project, thread, session_id, title, created_at, last_used)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(user_id, project, thread, session_id) DO UPDATE SET last_used = excluded.last_used""",
+                (user_id, project, thread, session_id, title[:200], now, now),
+            )
+    except Exception:
+        logger.exception("Failed to save Claude session")
+
+
+async def get_claude_sessions(user_id: str, project: str, thread: str, limit: int = 10) -> list[dict[str, Any]]:
+    """Sessions for a (user, project, thread), most recently used (active) first."""
+    async with read_connection() as db:
+        rows = await _fetchall(
+            db,
+            """SELECT session_id, title, created_at, last_used FROM claude_sessions
+               WHERE user_id = ? AND project = ? AND thread = ? ORDER BY last_used DESC LIMIT ?""",
+            (user_id, project, thread, limit),
+        )
+    return [dict(row) for row in rows]
+
+
+async def get_active_claude_session(user_id: str, project: str, thread: str) -> dict[str, Any] | None:
+    """The session `--resume` should use for a (user, project, thread), if any."""
+    sessions = await get_claude_sessions(user_id, project, thread, limit=1)
+    return sessions[0] if sessions else None
+
+
+_UPSERT_USAGE = f"""
+    INSERT INTO usage_daily (day, user_id, project, runs, {", ".join(_USAGE_FIELDS)})
+    VALUES (?, ?, ?, 1, {", ".join("?" * len(_USAGE_FIELDS))})
+    ON CONFLICT(day, user_id, project) DO UPDATE SET
+        runs = runs + 1, {", ".join(f"{f} = {f} + excluded.{f}" for f in _USAGE_FIELDS)}
+"""
+
+
+async def record_usage(day: str, user_id: str, project: str, usage: TokenUsage) -> None:
+    """Add one run's usage to the (day, user, project) aggregate."""
+    try:
+        async with write_transaction() as db:
+            await db.execute(_UPSERT_USAGE, (day, user_id, project, *(getattr(usage, f) for f in _USAGE_FIELDS)))
+    except Exception:
+        logger.exception("Failed to record usage")
+
+
+async def get_usage_totals(since_day: str, user_id: str | None = None, group_by: str = "") -> list[dict[str, Any]]:
+    """Sum usage from `since_day` (inclusive), optionally for one user and grouped by user_id or project."""
+    if group_by not in ("", "user_id", "project"):
+        raise ValueError(f"Cannot group usage by {group_by!r}")
+    select = f"{group_by} AS name, " if group_by else ""
+    sums = ", ".join(f"SUM({f}) AS {f}" for f in ("runs", *_USAGE_FIELDS))
+    where = "day >= ?" + (" AND user_id = ?" if user_id is not None else "")
+    params: tuple[str, ...] = (since_day,) if user_id is None else (since_day, user_id)
+    group = f" GROUP BY {group_by} ORDER BY cost_usd DESC" if group_by else ""
+    async with read_connection() as db:
+        rows = await _fetchall(db, f"SELECT {select}{sums} FROM usage_daily WHERE {where}{group}", params)
+    return [{k: (row[k] or 0) for k in row.keys()} for row in rows]
+
+
+async def load_latency_sketch(source: str, project: str, model: str) -> str | None:
+    """The serialized latency sketch for a (source, project, model), if one was saved."""
+    async with read_connection() as db:
+        rows = await _fetchall(
+            db,
+            "SELECT sketch FROM latency_sketches WHERE source = ? AND project = ? AND model = ?",
+            (source, project, model),
+        )
+    return rows[0]["sketch"] if rows else None
+
+
+async def save_latency_sketch(source: str, project: str, model: str, sketch: str) -> None:
+    """Insert or replace a serialized latency sketch."""
+    try:
+        async with write_transaction() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO latency_sketches (source, project, model, sketch, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (source, project, model, sketch, time.time()),
+            )
+    except Exception:
+        logger.exception("Failed to save latency sketch")
+
+
+async def create_background_job(
+    user_id: str, chat_id: int | None, command: str, cwd: str, spool_path: str, started_at: float
+) -> int:
+    """Record a new background job and return its id."""
+    async with write_transaction() as db:
+        cursor = await db.execute(
+            """INSERT INTO background_jobs (user_id, chat_id, command, cwd, spool_path, started_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (user_id, chat_id, command, cwd, spool_path, started_at),
+        )
+    return int(cursor.lastrowid)  # type: ignore[arg-type]
+
+
+async def update_background_job(job_id: int, **values: object) -> None:
+    """Update columns of a background job."""
+    if not values:
+        return
+    try:
+        assignments = ", ".join(f"{name} = ?" for name in values)
+        async with write_transaction() as db:
+            await db.execute(f"UPDATE background_jobs SET {assignments} WHERE id = ?", (*values.values(), job_id))
+    except Exception:
+        logger.exception("Failed to update background job %d", job_id)
+
+
+async def get_background_job(job_id: int) -> dict[str, Any] | None:
+    async with read_connection() as db:
+        rows = await _fetchall(db, "SELECT * FROM background_jobs WHERE id = ?", (job_id,))
+    return dict(rows[0]) if rows else None
+
+
+async def get_background_jobs(
+    user_id: str | None = None, state: str | None = None, limit: int = 20
+) -> list[dict[str, Any]]:
+    """Background jobs, newest first, optionally for one user and in one state."""
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if state is not None:
+        clauses.append("state = ?")
+        params.append(state)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    async with read_connection() as db:
+        rows = await _fetchall(db, f"SELECT * FROM background_jobs {where} ORDER BY id DESC LIMIT ?", (*params, limit))
     return [dict(row) for row in rows]
+
+
+async def load_user_state() -> dict[int, dict[str, str]]:
+    """Every stored user_data value, as JSON text by user and key."""
+    async with read_connection() as db:
+        rows = await _fetchall(db, "SELECT user_id, key, value FROM user_state")
+    state: dict[int, dict[str, str]] = {}
+    for row in rows:
+        state.setdefault(row["user_id"], {})[row["key"]] = row["value"]
+    return state
+
+
+async def save_user_state(changes: list[tuple[int, str, str | None]]) -> None:
+    """Apply (user_id, key, JSON value) changes in one transaction; a None value deletes the key."""
+    now = time.time()
+    upserts = [(user_id, key, value, now) for user_id, key, value in changes if value is not None]
+    deletes = [(user_id, key) for user_id, key, value in changes if value is None]
+    async with write_transaction() as db:
+        if upserts:
+            await db.executemany(
+                """INSERT INTO user_state (user_id, key, value, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(user_id, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at""",
+                upserts,
+            )
+        if deletes:
+            await db.executemany("DELETE FROM user_state WHERE user_id = ? AND key = ?", deletes)
+
+
+async def delete_user_state(user_id: int) -> None:
+    """Forget everything stored for a user."""
+    async with write_transaction() as db:
+        await db.execute("DELETE FROM user_state WHERE user_id = ?", (user_id,))
+
+
+async def _next_command_id(db: aiosqlite.Connection) -> int:
+    """A lower bound for the id of the next `commands` row."""
+    rows = await _fetchall(db, "SELECT COALESCE(MAX(id), 0) + 1 FROM commands")
+    return int(rows[0][0])
+
+
+async def _roll_up(db: aiosqlite.Connection, first_id: int, end_id: int = 2**63 - 1) -> None:
+    """Add `commands` rows with `first_id <= id < end_id` to the rollups (in the caller's transaction)."""
+    for period in PERIODS:
+        await db.execute(rollup_sql(period), (first_id, end_id))
+
+
+async def stats_backlog() -> int:
+    """History rows written before rollups existed and not backfilled yet."""
+    async with read_connection() as db:
+        rows = await _fetchall(
+            db, "SELECT COUNT(*) FROM commands WHERE id < (SELECT below_id FROM command_stats_backfill)"
+        )
+    return int(rows[0][0])
+
+
+async def backfill_stats(batch: int = 5000) -> int:
+    """Add history rows from before rollups existed to them, newest first. Returns rows added.
+
+    Each batch commits together with the new watermark, so an interrupted
+    backfill resumes where it stopped and never counts a row twice.
+    """
+    added = 0
+    while True:
+        async with write_transaction() as db:
+            rows = await _fetchall(
+                db, "SELECT MAX(id) FROM commands WHERE id < (SELECT below_id FROM command_stats_backfill)"
+            )
+            if rows[0][0] is None:
+                return added
+            # Start from the newest row left, so gaps left by deleted rows cost nothing
+            end = int(rows[0][0]) + 1
+            first = max(end - batch, 1)
+            rows = await _fetchall(db, "SELECT COUNT(*) FROM commands WHERE id >= ? AND id < ?", (first, end))
+            await _roll_up(db, first, end)
+            await db.execute("UPDATE command_stats_backfill SET below_id = ?", (first,))
+        added += int(rows[0][0])
+        await asyncio.sleep(0)
+
+
+async def get_stats(
+    since: str,
+    period: str = "day",
+    group_by: tuple[str, ...] = (),
+    user_id: str | None = None,
+    source: str | None = None,
+) -> list[dict[str, Any]]:
+    """Sum the `period` rollups from `since` (a period start, inclusive), grouped by any of DIMENSIONS.
+
+    Rows come back busiest first, with the latency histogram as `buckets`.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown stats period {period!r}")
+    for dimension in group_by:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Cannot group stats by {dimension!r}")
+    where, params = ["period = ?", "start >= ?"], [period, since]
+    for column, value in (("user_id", user_id), ("source", source)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    select = "".join(f"{d}, " for d in group_by)
+    sums = ", ".join(f"SUM({f}) AS {f}" for f in COUNTERS)
+    group = f" GROUP BY {', '.join(group_by)}" if group_by else ""
+    sql = f"SELECT {select}{sums} FROM command_stats WHERE {' AND '.join(where)}{group} ORDER BY runs DESC"
+    async with read_connection() as db:
+        rows = await _fetchall(db, sql, params)
+    stats = []
+    for row in rows:
+        if not row["runs"]:
+            continue
+        entry = {d: row[d] for d in group_by}
+        entry.update({f: row[f] or 0 for f in ("runs", "errors", "total_ms", "output_bytes")})
+        entry["buckets"] = [row[f] or 0 for f in BUCKET_COLUMNS]
+        stats.append(entry)
+    return stats
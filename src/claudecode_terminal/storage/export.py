@@ -0,0 +1,200 @@
+"""Streaming export of command history as JSON lines, CSV or Parquet."""
+
+from __future__ import annotations
+
+import contextlib
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, BinaryIO
+
+from claudecode_terminal.storage.database import iter_commands
+
+try:
+    import zstandard
+except ModuleNotFoundError:  # optional: pip install claudecode-terminal[zstd]
+    zstandard = None  # type: ignore[assignment, unused-ignore]
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ModuleNotFoundError:  # optional: pip install claudecode-terminal[parquet]
+    pyarrow = None  # type: ignore[assignment, unused-ignore]
+
+FORMATS = ("jsonl", "csv", "parquet")
+COMPRESSIONS = ("none", "gzip", "zstd")
+EXPORT_BATCH = 1000
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# Exported columns and their types; every format uses the same schema
+COLUMNS = {
+    "id": "int",
+    "created_at": "timestamp",
+    "user_id": "str",
+    "source": "str",
+    "project": "str",
+    "model": "str",
+    "command": "str",
+    "exit_code": "int",
+    "execution_time_ms": "int",
+    "peak_memory_bytes": "int",
+    "cpu_time_ms": "int",
+    "input_tokens": "int",
+    "output_tokens": "int",
+    "cache_read_tokens": "int",
+    "cache_creation_tokens": "int",
+    "cost_usd": "float",
+    "num_turns": "int",
+    "duration_api_ms": "int",
+}
+OUTPUT_COLUMNS = {"stdout": "str", "stderr": "str"}
+
+
+def compression_for(path: str) -> str:
+    """Compression implied by an output file name: `.gz` is gzip, `.zst` zstd."""
+    suffix = Path(path).suffix.lower()
+    return {".gz": "gzip", ".zst": "zstd"}.get(suffix, "none")
+
+
+def check_export(fmt: str, compression: str) -> None:
+    """Raise ValueError if `fmt` or `compression` is unknown or needs a missing package."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; use {', '.join(FORMATS)}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}; use {', '.join(COMPRESSIONS)}")
+    if fmt == "parquet" and pyarrow is None:
+        raise ValueError("Parquet export needs pyarrow: pip install claudecode-terminal[parquet]")
+    if compression == "zstd" and fmt != "parquet" and zstandard is None:
+        raise ValueError("zstd compression needs zstandard: pip install claudecode-terminal[zstd]")
+
+
+def read_state(path: str) -> int:
+    """The last exported id recorded in a state file, or 0 if there is none yet."""
+    state = Path(path).expanduser()
+    if not state.exists():
+        return 0
+    return int(json.loads(state.read_text())["last_id"])
+
+
+def write_state(path: str, last_id: int) -> None:
+    """Record the last exported id, replacing the state file atomically."""
+    state = Path(path).expanduser()
+    state.parent.mkdir(parents=True, exist_ok=True)
+    tmp = state.with_name(f".{state.name}.tmp")
+    tmp.write_text(json.dumps({"last_id": last_id, "exported_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())}))
+    os.replace(tmp, state)
+
+
+@contextlib.contextmanager
+def _open_sink(path: str, compression: str) -> Iterator[IO[bytes]]:
+    """A binary stream to `path` ("-": stdout), compressed as it is written."""
+    raw: BinaryIO = sys.stdout.buffer if path == "-" else open(Path(path).expanduser(), "wb")
+    sink: Any = raw
+    if compression == "gzip":
+        sink = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=GZIP_LEVEL)
+    elif compression == "zstd":
+        sink = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=False)
+    try:
+        yield sink
+    finally:
+        if sink is not raw:
+            sink.close()
+        if path == "-":
+            raw.flush()
+        else:
+            raw.close()
+
+
+class _TextWriter:
+    """JSON lines or CSV, encoded onto a binary sink."""
+
+    def __init__(self, sink: IO[bytes], fmt: str, columns: dict[str, str]) -> None:
+        self._text = io.TextIOWrapper(sink, encoding="utf-8", newline="")
+        self._columns = list(columns)
+        self._csv: Any = None
+        if fmt == "csv":
+            self._csv = csv.writer(self._text)
+            self._csv.writerow(self._columns)
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        for row in rows:
+            if self._csv is not None:
+                self._csv.writerow([row.get(column) for column in self._columns])
+            else:
+                record = {column: row.get(column) for column in self._columns}
+                self._text.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._text.flush()
+
+    def close(self) -> None:
+        self._text.flush()
+        # Leave closing the sink to _open_sink
+        self._text.detach()
+
+
+class _ParquetWriter:
+    """One Parquet row group per batch; the footer is written on close."""
+
+    _TYPES = {"int": "int64", "float": "float64", "str": "string"}
+
+    def __init__(self, sink: IO[bytes], compression: str, columns: dict[str, str]) -> None:
+        fields = [
+            (
+                name,
+                pyarrow.timestamp("s", tz="UTC") if kind == "timestamp" else pyarrow.type_for_alias(self._TYPES[kind]),
+            )
+            for name, kind in columns.items()
+        ]
+        self._schema = pyarrow.schema(fields)
+        self._timestamps = [name for name, kind in columns.items() if kind == "timestamp"]
+        self._writer = pyarrow.parquet.ParquetWriter(sink, self._schema, compression=compression)
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        for row in rows:
+            for name in self._timestamps:
+                if row.get(name):
+                    row[name] = datetime.fromisoformat(str(row[name])).replace(tzinfo=timezone.utc)
+        self._writer.write_table(pyarrow.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+async def export_history(
+    path: str,
+    fmt: str = "jsonl",
+    compression: str = "none",
+    since: str | None = None,
+    until: str | None = None,
+    after_id: int = 0,
+    with_output: bool = False,
+    batch: int = EXPORT_BATCH,
+) -> dict[str, int]:
+    """Write history rows after `after_id`, created in [since, until), to `path`, oldest first.
+
+    Rows are read and written `batch` at a time, so memory use does not grow
+    with the size of the history. Returns the rows written and the last id,
+    which the next incremental export passes as `after_id`.
+    """
+    check_export(fmt, compression)
+    columns = {**COLUMNS, **(OUTPUT_COLUMNS if with_output else {})}
+    written, last_id = 0, after_id
+    # Parquet compresses inside the file; the other formats compress the whole stream
+    with _open_sink(path, "none" if fmt == "parquet" else compression) as sink:
+        writer = _ParquetWriter(sink, compression, columns) if fmt == "parquet" else _TextWriter(sink, fmt, columns)
+        try:
+            async for rows in iter_commands(
+                tuple(COLUMNS), after_id=after_id, since=since, until=until, batch=batch, with_output=with_output
+            ):
+                last_id = rows[-1]["id"]
+                writer.write(rows)
+                written += len(rows)
+        finally:
+            writer.close()
+    return {"rows": written, "last_id": last_id}
@@ -0,0 +1,209 @@
+"""Background retention and compaction for the history database."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from pathlib import Path
+
+from claudecode_terminal.config import StorageConfig
+from claudecode_terminal.storage.database import (
+    archive_commands,
+    compact_db,
+    delete_commands,
+    history_size,
+    oldest_commands,
+)
+
+logger = logging.getLogger(__name__)
+
+# The first pass runs this long after startup, then every `storage.maintenance_interval`
+STARTUP_DELAY = 60.0
+TIMESTAMP = "%Y-%m-%d %H:%M:%S"
+
+
+def _month_start(year: int, month: int) -> str:
+    """`created_at` of the first second of a month, with months past December rolling over."""
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return f"{year:04d}-{month:02d}-01 00:00:00"
+
+
+def archive_path(db_path: str, month: str) -> Path:
+    """Monthly archive file next to the history database, e.g. `history-2024-05.db`."""
+    db = Path(db_path).expanduser().resolve()
+    return db.with_name(f"{db.stem}-{month}{db.suffix}")
+
+
+def list_archives(db_path: str) -> list[tuple[str, Path]]:
+    """(month, path) of existing monthly archives, oldest first."""
+    db = Path(db_path).expanduser().resolve()
+    pattern = f"{db.stem}-[0-9][0-9][0-9][0-9]-[0-9][0-9]{db.suffix}"
+    return sorted((path.name[len(db.stem) + 1 : len(db.stem) + 8], path) for path in db.parent.glob(pattern))
+
+
+class HistoryMaintenance:
+    """Enforce the `[storage]` retention limits and keep the history database compact.
+
+    Each pass removes the oldest history rows past `retention_days`,
+    `retention_rows` and `retention_mb`, `prune_batch` rows per transaction,
+    yielding between batches so history writes never queue behind one long
+    DELETE. Freed pages are then returned to the filesystem and the WAL is
+    truncated.
+
+    With `partition_monthly`, rows older than the previous month are moved
+    into one archive file per month instead, and age and size limits expire
+    whole archives by unlinking them. `/search` and `/history` read the live
+    database only.
+    """
+
+    def __init__(self, storage: StorageConfig) -> None:
+        self.storage = storage
+        self._task: asyncio.Task[None] | None = None
+        self._runs = 0
+        self._deleted = 0
+        self._archived = 0
+        self._expired_archives = 0
+        self._released_bytes = 0
+        self._last_run: float | None = None
+        self._last_ms = 0.0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    async def run(self, now: float | None = None) -> dict[str, int]:
+        """One maintenance pass. Returns what it did."""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        done = {"deleted": 0, "archived": 0, "expired_archives": 0, "released_bytes": 0}
+        age_cutoff = (
+            time.strftime(TIMESTAMP, time.gmtime(now - self.storage.retention_days * 86400))
+            if self.storage.retention_days > 0
+            else None
+        )
+
+        if self.storage.partition_monthly:
+            done["archived"] = await self._archive(now)
+            done["expired_archives"] = self._expire_archives(age_cutoff)
+        if age_cutoff is not None:
+            done["deleted"] += await self._prune(before=age_cutoff)
+        if self.storage.retention_rows > 0:
+            excess = (await history_size())["rows"] - self.storage.retention_rows
+            done["deleted"] += await self._prune(count=excess)
+        if self.storage.retention_mb > 0:
+            deleted, expired = await self._prune_to_size(self.storage.retention_mb * 1024 * 1024)
+            done["deleted"] += deleted
+            done["expired_archives"] += expired
+        done["released_bytes"] = await compact_db()
+
+        self._runs += 1
+        self._deleted += done["deleted"]
+        self._archived += done["archived"]
+        self._expired_archives += done["expired_archives"]
+        self._released_bytes += done["released_bytes"]
+        self._last_run = now
+        self._last_ms = (time.perf_counter() - started) * 1000
+        if done["deleted"] or done["archived"] or done["expired_archives"]:
+            logger.info(
+                "History maintenance: %d rows deleted, %d archived, %d archives expired, %d bytes released",
+                done["deleted"],
+                done["archived"],
+                done["expired_archives"],
+                done["released_bytes"],
+            )
+        return done
+
+    def stats(self) -> dict[str, float | None]:
+        return {
+            "runs": self._runs,
+            "deleted": self._deleted,
+            "archived": self._archived,
+            "expired_archives": self._expired_archives,
+            "released_bytes": self._released_bytes,
+            "last_run": self._last_run,
+            "last_ms": round(self._last_ms, 1),
+        }
+
+    async def _run(self) -> None:
+        await asyncio.sleep(STARTUP_DELAY)
+        while True:
+            try:
+                await self.run()
+            except Exception:
+                logger.exception("History maintenance failed")
+            await asyncio.sleep(self.storage.maintenance_interval)
+
+    async def _prune(self, before: str | None = None, count: int | None = None) -> int:
+        """Delete the oldest rows, all created before `before` or `count` of them, a batch at a time."""
+        deleted = 0
+        while count is None or deleted < count:
+            limit = self.storage.prune_batch if count is None else min(self.storage.prune_batch, count - deleted)
+            batch = await oldest_commands(limit, before=before)
+            if not batch:
+                break
+            deleted += await delete_commands([row_id for row_id, _ in batch])
+            # Let queued history writes commit between batches
+            await asyncio.sleep(0)
+        return deleted
+
+    async def _prune_to_size(self, max_bytes: int) -> tuple[int, int]:
+        """Drop the oldest archives, then rows, until the database and its archives fit in `max_bytes`.
+
+        Returns (rows deleted, archives expired).
+        """
+        archives = list_archives(self.storage.db_path) if self.storage.partition_monthly else []
+        archived_bytes = sum(path.stat().st_size for _, path in archives)
+        deleted = expired = 0
+        while (used := (await history_size())["used_bytes"] + archived_bytes) > max_bytes:
+            if archives:
+                month, path = archives.pop(0)
+                archived_bytes -= path.stat().st_size
+                self._unlink(path)
+                expired += 1
+                logger.info("Expired history archive %s (size limit)", month)
+                continue
+            batch = await oldest_commands(self.storage.prune_batch)
+            if not batch:
+                logger.warning("History database uses %d bytes with no rows left to prune", used)
+                break
+            deleted += await delete_commands([row_id for row_id, _ in batch])
+            await asyncio.sleep(0)
+        return deleted, expired
+
+    async def _archive(self, now: float) -> int:
+        """Move rows from before the previous month into their monthly archives."""
+        today = time.gmtime(now)
+        cutoff = _month_start(today.tm_year, today.tm_mon - 1)
+        moved = 0
+        while batch := await oldest_commands(self.storage.prune_batch, before=cutoff):
+            by_month: dict[str, list[int]] = {}
+            for row_id, created_at in batch:
+                by_month.setdefault(str(created_at)[:7], []).append(row_id)
+            for month, ids in by_month.items():
+                moved += await archive_commands(ids, str(archive_path(self.storage.db_path, month)))
+            await asyncio.sleep(0)
+        return moved
+
+    def _expire_archives(self, age_cutoff: str | None) -> int:
+        """Unlink archives of months that ended before `age_cutoff`."""
+        if age_cutoff is None:
+            return 0
+        expired = 0
+        for month, path in list_archives(self.storage.db_path):
+            year, mon = int(month[:4]), int(month[5:])
+            if _month_start(year, mon + 1) <= age_cutoff:
+                self._unlink(path)
+                expired += 1
+        return expired
+
+    def _unlink(self, path: Path) -> None:
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
@@ -2,7 +2,25 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, TypedDict
+
+
+@dataclass
+class TokenUsage:
+    """Model usage reported by a Claude CLI run."""
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_creation_tokens: int = 0
+    cost_usd: float = 0.0
+    num_turns: int = 0
+    duration_api_ms: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
 
 
 @dataclass
@@ -15,6 +33,16 @@ class ExecutionResult:
     execution_time_ms: int = 0
     blocked: bool = False
     reason: str = ""
+    output_bytes: int = 0
+    truncated_bytes: int = 0
+    spill_path: str = ""
+    cached: bool = False
+    coalesced: bool = False
+    cancelled: bool = False
+    session_id: str = ""
+    peak_memory_bytes: int | None = None
+    cpu_time_ms: int | None = None
+    usage: TokenUsage | None = None
 
 
 @dataclass
@@ -30,3 +58,22 @@ class CommandRecord:
     execution_time_ms: int = 0
     source: str = "telegram"
     created_at: str = ""
+
+
+@dataclass
+class HistoryPage:
+    """One keyset-paginated page of command history, newest first."""
+
+    rows: list[dict[str, Any]] = field(default_factory=list)
+    has_older: bool = False
+    has_newer: bool = False
+
+
+class HistoryFilters(TypedDict, total=False):
+    """`get_history` filters; a missing or None filter matches every row."""
+
+    user_id: str | None
+    source: str | None
+    project: str | None
+    status: str | None
+    exit_code: int | None
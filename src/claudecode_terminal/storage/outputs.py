@@ -0,0 +1,55 @@
+"""Content-addressed, compressed command output blobs."""
+
+from __future__ import annotations
+
+import hashlib
+import zlib
+
+try:
+    import zstandard
+except ModuleNotFoundError:  # optional: pip install claudecode-terminal[zstd]
+    zstandard = None  # type: ignore[assignment, unused-ignore]
+
+# Outputs shorter than this are stored as-is; compression would not pay for its header
+MIN_COMPRESS_BYTES = 64
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def preferred_codec() -> str:
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def pack(text: str, codec: str | None = None) -> tuple[str, str, bytes, int]:
+    """(hash, codec, blob, size) for an output. The hash is of the uncompressed bytes."""
+    raw = text.encode("utf-8", errors="replace")
+    codec = codec or preferred_codec()
+    blob = raw
+    if len(raw) >= MIN_COMPRESS_BYTES:
+        if codec == "zstd" and zstandard is not None:
+            blob = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+        else:
+            codec = "zlib"
+            blob = zlib.compress(raw, ZLIB_LEVEL)
+    if len(blob) >= len(raw):
+        codec, blob = "raw", raw
+    return digest(raw), codec, blob, len(raw)
+
+
+def unpack(codec: str, blob: bytes) -> str:
+    """Decompress a stored output."""
+    if codec == "raw":
+        data = blob
+    elif codec == "zlib":
+        data = zlib.decompress(blob)
+    elif codec == "zstd":
+        if zstandard is None:
+            return "[output compressed with zstd; install claudecode-terminal[zstd] to read it]"
+        data = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        raise ValueError(f"Unknown output codec: {codec}")
+    return data.decode("utf-8", errors="replace")
@@ -0,0 +1,111 @@
+"""SQLite connections: one writer and a pool of read-only readers."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from pathlib import Path
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+# Prepared statements each connection keeps, keyed by SQL text
+STATEMENT_CACHE = 256
+
+
+def default_readers() -> int:
+    """Readers for `storage.readers = -1`: two, or none on a single CPU.
+
+    Each connection is a thread; with one core they only take turns holding
+    the GIL, which costs more than queueing reads behind writes saves.
+    """
+    return 2 if (os.cpu_count() or 1) > 1 else 0
+
+
+@dataclass(frozen=True)
+class Pragmas:
+    """Per-connection SQLite settings (`[storage]` synchronous, cache_size_kb, mmap_size_mb, busy_timeout_ms)."""
+
+    synchronous: str = "NORMAL"
+    cache_size_kb: int = 8192
+    mmap_size_mb: int = 64
+    busy_timeout_ms: int = 5000
+
+    def __post_init__(self) -> None:
+        if self.synchronous.upper() not in SYNCHRONOUS_MODES:
+            raise ValueError(f"storage.synchronous must be one of {', '.join(SYNCHRONOUS_MODES)}")
+
+    def statements(self, read_only: bool = False) -> list[str]:
+        statements = [
+            f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}",
+            f"PRAGMA cache_size = {-int(self.cache_size_kb)}",
+            f"PRAGMA mmap_size = {int(self.mmap_size_mb) * 1024 * 1024}",
+        ]
+        if read_only:
+            statements.append("PRAGMA query_only = 1")
+        else:
+            statements.append(f"PRAGMA synchronous = {self.synchronous.upper()}")
+        return statements
+
+
+async def connect(path: Path, pragmas: Pragmas, read_only: bool = False) -> aiosqlite.Connection:
+    """Open a connection (on its own thread) to the database at `path`."""
+    if read_only:
+        db = await aiosqlite.connect(f"{path.as_uri()}?mode=ro", uri=True, cached_statements=STATEMENT_CACHE)
+    else:
+        db = await aiosqlite.connect(str(path), cached_statements=STATEMENT_CACHE)
+    db.row_factory = aiosqlite.Row
+    for statement in pragmas.statements(read_only):
+        await db.execute(statement)
+    return db
+
+
+class ReaderPool:
+    """Read-only connections to a WAL database, lent out one at a time.
+
+    aiosqlite runs each connection on its own thread, and WAL readers see a
+    committed snapshot without waiting for the writer, so a slow search does
+    not hold up history inserts (or the other way round). Reads must consume
+    their cursors: a half-read SELECT keeps its snapshot open.
+    """
+
+    def __init__(self, path: Path, size: int, pragmas: Pragmas) -> None:
+        self.path = path
+        self.size = max(size, 1)
+        self.pragmas = pragmas
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._all: list[aiosqlite.Connection] = []
+        self._reads = 0
+        self._waits = 0
+
+    async def open(self) -> None:
+        for _ in range(self.size - len(self._all)):
+            db = await connect(self.path, self.pragmas, read_only=True)
+            self._all.append(db)
+            self._idle.put_nowait(db)
+
+    @contextlib.asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._idle.empty():
+            self._waits += 1
+        db = await self._idle.get()
+        self._reads += 1
+        try:
+            yield db
+        finally:
+            self._idle.put_nowait(db)
+
+    async def close(self) -> None:
+        for db in self._all:
+            await db.close()
+        self._all.clear()
+        self._idle = asyncio.Queue()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": self.size, "idle": self._idle.qsize(), "reads": self._reads, "waits": self._waits}
@@ -0,0 +1,94 @@
+"""Hourly and daily rollups of command history, kept current as rows are written."""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+PERIODS = ("hour", "day")
+# Upper bounds (ms) of the latency histogram buckets; one more bucket holds anything slower
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10_000, 30_000, 60_000, 120_000, 300_000)
+BUCKET_COLUMNS = tuple(f"lat_{i}" for i in range(len(LATENCY_BUCKETS_MS) + 1))
+DIMENSIONS = ("source", "model", "project", "user_id", "program")
+COUNTERS = ("runs", "errors", "total_ms", "output_bytes", *BUCKET_COLUMNS)
+# /stats and `cct stats` ranges: (period, how many of them, ending with the current one)
+RANGES = {"day": ("hour", 24), "week": ("day", 7), "month": ("day", 30)}
+
+# Shell commands are grouped by their first word; Claude runs have no program
+_PROGRAM = (
+    "CASE WHEN c.source = 'claude' THEN '' "
+    "ELSE substr(ltrim(c.command), 1, instr(ltrim(c.command) || ' ', ' ') - 1) END"
+)
+_START = {"hour": "strftime('%Y-%m-%d %H:00', c.created_at)", "day": "date(c.created_at)"}
+_FORMAT = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d"}
+
+
+def _bucket_sums() -> str:
+    latency = "COALESCE(c.execution_time_ms, 0)"
+    sums = []
+    low = None
+    for high in (*LATENCY_BUCKETS_MS, None):
+        conditions = [f"{latency} >= {low}"] if low is not None else []
+        if high is not None:
+            conditions.append(f"{latency} < {high}")
+        sums.append(f"SUM({' AND '.join(conditions)})")
+        low = high
+    return ", ".join(sums)
+
+
+def rollup_sql(period: str) -> str:
+    """Add the `commands` rows with `? <= id < ?` to the `command_stats` rows of `period`."""
+    return f"""
+        INSERT INTO command_stats (period, start, {", ".join(DIMENSIONS)}, {", ".join(COUNTERS)})
+        SELECT '{period}', {_START[period]}, c.source, COALESCE(c.model, ''), COALESCE(c.project, ''),
+               c.user_id, {_PROGRAM},
+               COUNT(*), SUM(COALESCE(c.exit_code, 0) != 0), SUM(COALESCE(c.execution_time_ms, 0)),
+               SUM(COALESCE(o.size, 0) + COALESCE(e.size, 0)), {_bucket_sums()}
+        FROM commands c
+        LEFT JOIN outputs o ON o.hash = c.stdout_hash
+        LEFT JOIN outputs e ON e.hash = c.stderr_hash
+        WHERE c.id >= ? AND c.id < ?
+        GROUP BY 2, 3, 4, 5, 6, 7
+        ON CONFLICT (period, start, {", ".join(DIMENSIONS)}) DO UPDATE SET
+            {", ".join(f"{f} = {f} + excluded.{f}" for f in COUNTERS)}
+    """
+
+
+def range_start(name: str, now: float | None = None) -> tuple[str, str]:
+    """(period, first `start`) covering the range `name` (day, week or month) up to `now`."""
+    period, count = RANGES[name]
+    now = time.time() if now is None else now
+    step = 3600 if period == "hour" else 86400
+    return period, time.strftime(_FORMAT[period], time.gmtime(now - (count - 1) * step))
+
+
+def latency_quantile(buckets: list[int], q: float) -> float | None:
+    """Estimated `q`-quantile in ms of a latency histogram, interpolating within its bucket."""
+    total = sum(buckets)
+    if total <= 0:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(buckets):
+        if count and seen + count >= rank:
+            low = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+            if i == len(LATENCY_BUCKETS_MS):
+                # Open-ended: all we know is that it took at least this long
+                return float(low)
+            return low + (LATENCY_BUCKETS_MS[i] - low) * (rank - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def summarize(row: dict[str, Any]) -> dict[str, Any]:
+    """Runs, error rate, latency percentiles and output of one `get_stats` row."""
+    runs = row["runs"]
+    return {
+        "runs": runs,
+        "errors": row["errors"],
+        "error_rate": row["errors"] / runs if runs else 0.0,
+        "avg_ms": row["total_ms"] / runs if runs else 0.0,
+        "p50_ms": latency_quantile(row["buckets"], 0.5),
+        "p95_ms": latency_quantile(row["buckets"], 0.95),
+        "output_bytes": row["output_bytes"],
+    }
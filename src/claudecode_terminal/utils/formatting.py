@@ -4,13 +4,18 @@ from __future__ import annotations
 
 import io
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-from claudecode_terminal.storage.models import ExecutionResult
+from claudecode_terminal.storage.database import MARK_END, MARK_START
+from claudecode_terminal.storage.models import ExecutionResult, HistoryPage
+from claudecode_terminal.storage.rollups import summarize
 
 if TYPE_CHECKING:
     from telegram import Update
 
+    from claudecode_terminal.services.fanout import ProjectResult
+    from claudecode_terminal.services.jobs import BackgroundJob
+
 logger = logging.getLogger(__name__)
 
 MAX_TELEGRAM_LENGTH = 4096
@@ -45,10 +50,46 @@ def format_duration(ms: int) -> str:
         return f"{minutes}m {seconds}s"
 
 
+def format_bytes(n: int) -> str:
+    """Format a byte count to a human-readable size."""
+    if n < 1024:
+        return f"{n} B"
+    elif n < 1024 * 1024:
+        return f"{n / 1024:.1f} KB"
+    else:
+        return f"{n / (1024 * 1024):.1f} MB"
+
+
+def format_output(result: ExecutionResult) -> str:
+    """stdout, falling back to stderr; failures with partial output show both."""
+    if result.stdout and result.stderr and result.exit_code != 0:
+        output = f"{result.stdout.rstrip()}\n\n{result.stderr}"
+    else:
+        output = result.stdout or result.stderr or "(no output)"
+    if result.spill_path:
+        output += f"\n\n[Full output: {result.spill_path}]"
+    return output
+
+
+def _status(result: ExecutionResult) -> str:
+    if result.blocked:
+        return "BLOCKED"
+    return "OK" if result.exit_code == 0 else f"ERR({result.exit_code})"
+
+
 def format_claude_result(result: ExecutionResult, project: str) -> str:
     """Format Claude Code execution result."""
-    output = result.stdout or result.stderr or "(no output)"
+    if result.blocked:
+        return f"Blocked: {result.reason}"
+
+    output = format_output(result)
     elapsed = format_duration(result.execution_time_ms)
+    if result.cached:
+        elapsed += " (cached)"
+    elif result.coalesced:
+        elapsed += " (shared)"
+    elif result.usage is not None and result.usage.cost_usd:
+        elapsed += f" | ${result.usage.cost_usd:.4f}"
     return f"Claude | {project} | {elapsed}\n\n{output}"
 
 
@@ -57,11 +98,104 @@ def format_shell_result(result: ExecutionResult, command: str) -> str:
     if result.blocked:
         return f"Blocked: {result.reason}"
 
-    output = result.stdout or result.stderr or "(no output)"
-    icon = "OK" if result.exit_code == 0 else f"ERR({result.exit_code})"
+    output = format_output(result)
+    icon = _status(result)
+    if result.coalesced:
+        icon += " | shared"
     return f"$ {command}\n[{icon}]\n\n{output}"
 
 
+def format_shell_status(result: ExecutionResult) -> str:
+    """Exit status, run time and output size of a finished shell command."""
+    return f"[{_status(result)} | {format_duration(result.execution_time_ms)} | {format_bytes(result.output_bytes)}]"
+
+
+def format_fanout_line(done: ProjectResult) -> str:
+    """One project's outcome in a fan-out run."""
+    return f"[{_status(done.result)}] {done.project.name} ({format_duration(done.result.execution_time_ms)})"
+
+
+def format_fanout_summary(results: list[ProjectResult], label: str) -> str:
+    """Pass/fail count plus one line per project."""
+    failed = sum(1 for r in results if not r.ok)
+    lines = [label, f"{len(results) - failed}/{len(results)} succeeded", ""]
+    lines.extend(format_fanout_line(r) for r in results)
+    return "\n".join(lines)
+
+
+def format_fanout_report(results: list[ProjectResult], label: str) -> str:
+    """Every project's full output, one section each."""
+    sections = []
+    for r in results:
+        body = r.result.stdout.rstrip()
+        if r.result.stderr.strip():
+            body = f"{body}\n--- stderr ---\n{r.result.stderr.rstrip()}".lstrip("\n")
+        sections.append(f"=== {r.project} [{_status(r.result)}] ===\n{body or '(no output)'}\n")
+    return f"{label}\n\n" + "\n".join(sections)
+
+
+def format_job_line(job: BackgroundJob) -> str:
+    """One background job: id, state, run time, output size and command."""
+    state = job.state if job.exit_code is None or job.state == "cancelled" else f"{job.state} ({job.exit_code})"
+    runtime = format_duration(int(job.runtime * 1000))
+    return f"#{job.id} [{state}] {runtime} | {format_bytes(job.output_size())} | {job.command[:60]}"
+
+
+def format_search_results(rows: list[dict[str, Any]], query: str, next_after: str | None) -> str:
+    """One page of history search hits, matches marked with «»; `next_after` is the next page's cursor."""
+    lines = [f"History matching '{query}':", ""]
+    for row in rows:
+        status = "OK" if row["exit_code"] == 0 else f"ERR({row['exit_code']})"
+        lines.append(f"#{row['id']} [{status}] {row['created_at']} {row['command'][:80]}")
+        snippet = row["snippet"].replace(MARK_START, "«").replace(MARK_END, "»")
+        if snippet and snippet != row["command"]:
+            lines.append(f"    {snippet}")
+    if next_after is not None:
+        lines.append(f"\nMore: /search -a {next_after} {query}")
+    return "\n".join(lines)
+
+
+def format_history_page(page: HistoryPage, filters: list[str]) -> str:
+    """One page of a user's history, newest first."""
+    title = "Your commands" + (f" ({', '.join(filters)})" if filters else "") + ":"
+    lines = [title, ""]
+    for row in page.rows:
+        status = "OK" if row["exit_code"] == 0 else f"ERR({row['exit_code']})"
+        cmd = row["command"][:50] + ("..." if len(row["command"]) > 50 else "")
+        lines.append(f"#{row['id']} [{status}] {cmd} ({row['execution_time_ms']}ms)")
+    return "\n".join(lines)
+
+
+def _stats_line(row: dict[str, Any]) -> str:
+    summary = summarize(row)
+    line = f"{summary['runs']} runs, {summary['errors']} failed ({summary['error_rate']:.0%})"
+    if summary["p50_ms"] is not None:
+        line += f", p50 {format_duration(round(summary['p50_ms']))}, p95 {format_duration(round(summary['p95_ms']))}"
+    return line
+
+
+def format_stats(
+    title: str, totals: list[dict[str, Any]], by_kind: list[dict[str, Any]], by_program: list[dict[str, Any]]
+) -> str:
+    """/stats: totals, then per source and model, then the shell commands failing most."""
+    lines = [title, "=" * 25]
+    if not totals:
+        lines.append("No commands in this range.")
+        return "\n".join(lines)
+    lines.append(_stats_line(totals[0]))
+    lines.append(f"Output: {format_bytes(totals[0]['output_bytes'])}")
+    lines.append("\nBy source:")
+    for row in by_kind:
+        name = "shell" if row["source"] == "telegram" else " ".join(filter(None, (row["source"], row["model"])))
+        lines.append(f"  {name}: {_stats_line(row)}")
+    failing = sorted((r for r in by_program if r["errors"] and r["program"]), key=lambda r: (-r["errors"], -r["runs"]))
+    if failing:
+        lines.append("\nFailing most:")
+        for row in failing[:5]:
+            lines.append(f"  {row['program'][:40]}: {row['errors']} of {row['runs']} failed")
+    return "\n".join(lines)
+
+
 async def send_long_message(update: Update, text: str) -> None:
     """Send a message, splitting or sending as file if too long."""
     if not update.message:
@@ -74,6 +208,15 @@ async def send_long_message(update: Update, text: str) -> None:
             await update.message.reply_text(chunk)
     else:
         # Send as file for very long output
-        file = io.BytesIO(text.encode("utf-8"))
-        file.name = "output.txt"
-        await update.message.reply_document(file, caption="Output too long, sent as file.")
+        await send_file(update, text)
+
+
+async def send_file(
+    update: Update, text: str, name: str = "output.txt", caption: str = "Output too long, sent as file."
+) -> None:
+    """Send text as a document."""
+    if not update.message:
+        return
+    file = io.BytesIO(text.encode("utf-8"))
+    file.name = name
+    await update.message.reply_document(file, caption=caption)
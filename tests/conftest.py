@@ -2,9 +2,12 @@
 
 from __future__ import annotations
 
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
 import pytest
 
-from claudecode_terminal.config import AppConfig, BotConfig, ClaudeConfig, ShellConfig, StorageConfig, LoggingConfig
+from claudecode_terminal.config import AppConfig, BotConfig, ClaudeConfig, LoggingConfig, ShellConfig, StorageConfig
 
 
 @pytest.fixture
@@ -22,3 +25,48 @@ def app_config(tmp_path):
         storage=StorageConfig(db_path=str(tmp_path / "test.db")),
         logging=LoggingConfig(level="DEBUG", file=str(tmp_path / "test.log")),
     )
+
+
+def _reader(data: bytes, eof: bool = True) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    if eof:
+        reader.feed_eof()
+    return reader
+
+
+@pytest.fixture
+def fake_process():
+    """Build a mock asyncio subprocess whose pipes yield the given bytes.
+
+    With `hang=True` the pipes never reach EOF and `wait()` blocks until
+    `terminate()` or `kill()` is called, which is how a timed-out process
+    looks. The pid is above any kernel pid_max, so group signals find nothing.
+    """
+
+    def _make(stdout: bytes = b"", stderr: bytes = b"", returncode: int = 0, hang: bool = False) -> MagicMock:
+        proc = MagicMock()
+        proc.pid = 2**30
+        proc.stdout = _reader(stdout, eof=not hang)
+        proc.stderr = _reader(stderr, eof=not hang)
+        proc.returncode = None if hang else returncode
+        killed = asyncio.Event()
+
+        def _signal(returncode: int) -> None:
+            proc.returncode = returncode
+            for stream in (proc.stdout, proc.stderr):
+                if not stream.at_eof():
+                    stream.feed_eof()
+            killed.set()
+
+        async def _wait() -> int:
+            if hang:
+                await killed.wait()
+            return proc.returncode
+
+        proc.terminate = MagicMock(side_effect=lambda: _signal(-15))
+        proc.kill = MagicMock(side_effect=lambda: _signal(-9))
+        proc.wait = AsyncMock(side_effect=_wait)
+        return proc
+
+    return _make
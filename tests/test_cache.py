@@ -0,0 +1,129 @@
+"""Tests for the Claude result cache."""
+
+from __future__ import annotations
+
+import asyncio
+import subprocess
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from claudecode_terminal.config import AppConfig, CacheConfig, ClaudeConfig
+from claudecode_terminal.services.cache import ResultCache, cache_key, project_fingerprint
+from claudecode_terminal.services.claude import ClaudeRunner
+from claudecode_terminal.storage.database import close_db, init_db
+
+
+@pytest.fixture
+async def db(tmp_path):
+    await init_db(str(tmp_path / "cache.db"))
+    yield
+    await close_db()
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    (repo / "README.md").write_text("hello\n")
+    subprocess.run(["git", "add", "."], cwd=repo, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"],
+        cwd=repo,
+        check=True,
+    )
+    return repo
+
+
+class TestResultCache:
+    @pytest.mark.asyncio
+    async def test_hit_and_miss(self, db):
+        cache = ResultCache()
+        assert await cache.get("k") is None
+        await cache.put("k", "answer")
+        assert await cache.get("k") == "answer"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self, db):
+        cache = ResultCache(max_entries=2)
+        await cache.put("a", "1")
+        await cache.put("b", "2")
+        await cache.get("a")
+        await cache.put("c", "3")
+        assert await cache.get("b") is None
+        assert await cache.get("a") == "1"
+        assert await cache.get("c") == "3"
+
+    @pytest.mark.asyncio
+    async def test_size_cap(self, db):
+        cache = ResultCache(max_bytes=10)
+        await cache.put("big", "x" * 11)
+        assert len(cache) == 0
+        await cache.put("a", "x" * 6)
+        await cache.put("b", "x" * 6)
+        assert len(cache) == 1
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self, db):
+        cache = ResultCache(ttl=60)
+        await cache.put("k", "v")
+        with patch("claudecode_terminal.services.cache.time.time", return_value=time.time() + 120):
+            assert await cache.get("k") is None
+
+    @pytest.mark.asyncio
+    async def test_persists_across_instances(self, db):
+        await ResultCache().put("k", "v")
+        assert await ResultCache().get("k") == "v"
+
+
+class TestFingerprint:
+    @pytest.mark.asyncio
+    async def test_not_a_repo(self, tmp_path):
+        assert await project_fingerprint(str(tmp_path)) is None
+
+    @pytest.mark.asyncio
+    async def test_changes_with_dirty_tree(self, git_repo):
+        clean = await project_fingerprint(str(git_repo))
+        assert clean is not None
+        assert await project_fingerprint(str(git_repo)) == clean
+        (git_repo / "README.md").write_text("changed\n")
+        assert await project_fingerprint(str(git_repo)) != clean
+
+    def test_key_depends_on_options(self):
+        base = cache_key("p", "m", "", 0, "/x", "f")
+        assert base == cache_key("p", "m", "", 0, "/x", "f")
+        assert base != cache_key("p", "m", "", 3, "/x", "f")
+        assert base != cache_key("p", "m", "", 0, "/x", "g")
+
+
+class TestRunnerCache:
+    @pytest.mark.asyncio
+    async def test_second_run_served_from_cache(self, db, git_repo, fake_process):
+        config = AppConfig(claude=ClaudeConfig(timeout=10), cache=CacheConfig(enabled=True))
+        runner = ClaudeRunner(config)
+        real_exec = asyncio.create_subprocess_exec
+
+        async def _exec(*args, **kwargs):
+            # git runs for real (fingerprinting); only the claude CLI is faked
+            if args[0] == "git":
+                return await real_exec(*args, **kwargs)
+            return fake_process(stdout=b'{"type":"result","is_error":false,"result":"summary"}\n')
+
+        create = AsyncMock(side_effect=_exec)
+
+        with patch("claudecode_terminal.services.claude.asyncio.create_subprocess_exec", create):
+            with patch("claudecode_terminal.services.claude.save_command", new_callable=AsyncMock):
+                first = await runner.execute(prompt="summarize", project_path=str(git_repo), user_id="1")
+                second = await runner.execute(prompt="summarize", project_path=str(git_repo), user_id="1")
+                bypass = await runner.execute(
+                    prompt="summarize", project_path=str(git_repo), user_id="1", use_cache=False
+                )
+
+        assert not first.cached
+        assert second.cached and second.stdout == "summary"
+        assert not bypass.cached
+        assert sum(1 for c in create.await_args_list if c.args[0] == "claude") == 2
@@ -0,0 +1,65 @@
+"""Tests for bounded output capture."""
+
+from __future__ import annotations
+
+import gzip
+
+import pytest
+
+from claudecode_terminal.services.capture import OutputCapture, communicate
+
+
+class TestOutputCapture:
+    def test_small_output_kept_whole(self):
+        capture = OutputCapture(head_bytes=10, tail_bytes=20)
+        capture.feed(b"hello ")
+        capture.feed(b"world, this is fine")
+        assert capture.truncated_bytes == 0
+        assert capture.text() == "hello world, this is fine"
+
+    def test_head_and_tail_with_marker(self):
+        capture = OutputCapture(head_bytes=4, tail_bytes=4)
+        for _ in range(100):
+            capture.feed(b"0123456789")
+        assert capture.total_bytes == 1000
+        assert capture.truncated_bytes == 992
+        assert capture.text() == "0123\n\n... [992 bytes truncated] ...\n\n6789"
+
+    def test_incremental_utf8_decoding(self):
+        capture = OutputCapture(head_bytes=100, tail_bytes=0)
+        data = "한글".encode()
+        assert capture.feed(data[:2]) == ""
+        assert capture.feed(data[2:]) == "한글"
+
+    def test_cut_points_drop_partial_characters(self):
+        capture = OutputCapture(head_bytes=4, tail_bytes=4)
+        capture.feed("가나다라마바사".encode())
+        text = capture.text()
+        assert "�" not in text
+        assert text.startswith("가")
+        assert text.endswith("사")
+
+    def test_spill_kept_only_when_truncated(self, tmp_path):
+        kept = OutputCapture(head_bytes=2, tail_bytes=2, spill_path=tmp_path / "kept.gz")
+        kept.feed(b"abcdefgh")
+        kept.close()
+        with gzip.open(tmp_path / "kept.gz", "rb") as f:
+            assert f.read() == b"abcdefgh"
+
+        dropped = OutputCapture(head_bytes=100, tail_bytes=0, spill_path=tmp_path / "dropped.gz")
+        dropped.feed(b"short")
+        dropped.close()
+        assert dropped.spill_path is None
+        assert not (tmp_path / "dropped.gz").exists()
+
+
+class TestCommunicate:
+    @pytest.mark.asyncio
+    async def test_timeout_preserves_partial_output(self, fake_process):
+        proc = fake_process(stdout=b"partial", stderr=b"warn", hang=True)
+        stdout, stderr = OutputCapture(100, 100), OutputCapture(100, 100)
+        timed_out = await communicate(proc, stdout, stderr, timeout=0.05)
+        assert timed_out
+        assert stdout.text() == "partial"
+        assert stderr.text() == "warn"
+        proc.terminate.assert_called_once()
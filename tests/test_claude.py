@@ -3,13 +3,28 @@
 from __future__ import annotations
 
 import asyncio
-from unittest.mock import AsyncMock, patch, MagicMock
+import json
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
-from claudecode_terminal.config import AppConfig, BotConfig, ClaudeConfig, ShellConfig, StorageConfig, LoggingConfig
+from claudecode_terminal.config import (
+    AppConfig,
+    BotConfig,
+    ClaudeConfig,
+    LoggingConfig,
+    QuotaConfig,
+    ShellConfig,
+    StorageConfig,
+)
+from claudecode_terminal.services import usage as usage_module
+from claudecode_terminal.services.capture import OutputCapture
 from claudecode_terminal.services.claude import ClaudeRunner
-from claudecode_terminal.storage.models import ExecutionResult
+from claudecode_terminal.services.stream_json import StreamJsonParser, read_line
+from claudecode_terminal.services.usage import UsageTracker
+from claudecode_terminal.storage.database import close_db, get_claude_sessions, get_usage_totals, init_db
+from claudecode_terminal.storage.models import TokenUsage
 
 
 @pytest.fixture
@@ -30,6 +45,16 @@ def runner(claude_config):
     return ClaudeRunner(claude_config)
 
 
+STREAM_EVENTS = (
+    b'{"type":"system","subtype":"init","session_id":"abc"}\n'
+    b'{"type":"assistant","message":{"content":[{"type":"text","text":"Looking..."}]}}\n'
+    b'{"type":"assistant","message":{"content":[{"type":"tool_use","name":"Bash","input":{"command":"ls"}}]}}\n'
+    b'{"type":"result","subtype":"success","is_error":false,"result":"Done!","session_id":"abc",'
+    b'"total_cost_usd":0.25,"num_turns":2,"duration_api_ms":1500,'
+    b'"usage":{"input_tokens":100,"output_tokens":50,"cache_read_input_tokens":1000,"cache_creation_input_tokens":10}}\n'
+)
+
+
 class TestClaudeRunner:
     @pytest.mark.asyncio
     async def test_execute_project_not_found(self, runner):
@@ -54,10 +79,8 @@ class TestClaudeRunner:
         assert "not found" in result.stderr.lower()
 
     @pytest.mark.asyncio
-    async def test_execute_success(self, runner, claude_config):
-        mock_proc = AsyncMock()
-        mock_proc.communicate = AsyncMock(return_value=(b"Hello from Claude!", b""))
-        mock_proc.returncode = 0
+    async def test_execute_success(self, runner, claude_config, fake_process):
+        mock_proc = fake_process(stdout=b'{"type":"result","is_error":false,"result":"Hello from Claude!"}\n')
 
         with patch("claudecode_terminal.services.claude.asyncio.create_subprocess_exec", return_value=mock_proc):
             with patch("claudecode_terminal.services.claude.save_command", new_callable=AsyncMock):
@@ -70,10 +93,10 @@ class TestClaudeRunner:
         assert result.stdout == "Hello from Claude!"
 
     @pytest.mark.asyncio
-    async def test_execute_timeout(self, runner, claude_config):
-        mock_proc = AsyncMock()
-        mock_proc.communicate = AsyncMock(side_effect=[asyncio.TimeoutError, (b"", b"")])
-        mock_proc.kill = MagicMock()
+    async def test_execute_timeout(self, runner, claude_config, fake_process):
+        claude_config.claude.timeout = 0.1
+        line = b'{"type":"assistant","message":{"content":[{"type":"text","text":"partial answer"}]}}\n'
+        mock_proc = fake_process(stdout=line, hang=True)
 
         with patch("claudecode_terminal.services.claude.asyncio.create_subprocess_exec", return_value=mock_proc):
             with patch("claudecode_terminal.services.claude.save_command", new_callable=AsyncMock):
@@ -84,6 +107,47 @@ class TestClaudeRunner:
                 )
         assert result.exit_code == -1
         assert "timed out" in result.stderr.lower()
+        assert result.stdout == "partial answer"
+        assert result.output_bytes == len(line)
+        mock_proc.terminate.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_execute_streaming(self, runner, claude_config, fake_process):
+        mock_proc = fake_process(stdout=STREAM_EVENTS)
+        chunks: list[str] = []
+
+        async def on_output(text: str) -> None:
+            chunks.append(text)
+
+        with patch(
+            "claudecode_terminal.services.claude.asyncio.create_subprocess_exec", return_value=mock_proc
+        ) as create:
+            with patch("claudecode_terminal.services.claude.save_command", new_callable=AsyncMock):
+                result = await runner.execute(
+                    prompt="hello",
+                    project_path=claude_config.claude.default_project,
+                    user_id="123",
+                    on_output=on_output,
+                )
+        args = create.call_args.args
+        assert args[args.index("--output-format") + 1] == "stream-json"
+        assert chunks == ["Looking...", "\n\n> Bash: ls"]
+        assert result.exit_code == 0
+        assert result.stdout == "Done!"
+
+    @pytest.mark.asyncio
+    async def test_long_answer_is_truncated(self, runner, claude_config, fake_process):
+        claude_config.claude.max_output = 100
+        answer = "A" * 50 + "B" * 10000 + "C" * 50
+        mock_proc = fake_process(stdout=json.dumps({"type": "result", "result": answer}).encode() + b"\n")
+
+        with patch("claudecode_terminal.services.claude.asyncio.create_subprocess_exec", return_value=mock_proc):
+            with patch("claudecode_terminal.services.claude.save_command", new_callable=AsyncMock):
+                result = await runner.execute(
+                    prompt="hello", project_path=claude_config.claude.default_project, user_id="123"
+                )
+        assert result.truncated_bytes == 10000
+        assert result.stdout.startswith("A" * 50) and result.stdout.endswith("C" * 50)
 
     def test_model_alias_resolution(self):
         from claudecode_terminal.config import MODEL_ALIASES
@@ -92,3 +156,170 @@ class TestClaudeRunner:
         assert "sonnet" in MODEL_ALIASES
         assert "haiku" in MODEL_ALIASES
         assert all("claude-" in v for v in MODEL_ALIASES.values())
+
+
+class TestStreamJsonParser:
+    def test_text_and_result(self):
+        parser = StreamJsonParser()
+        visible = [parser.feed(line) for line in STREAM_EVENTS.decode().splitlines()]
+        assert visible == ["", "Looking...", "\n\n> Bash: ls", ""]
+        assert parser.session_id == "abc"
+        assert parser.final_text == "Done!"
+        assert not parser.is_error
+
+    def test_ignores_garbage(self):
+        parser = StreamJsonParser()
+        assert parser.feed("not json") == ""
+        assert parser.feed("") == ""
+        assert parser.final_text == ""
+
+    def test_usage(self):
+        parser = StreamJsonParser()
+        assert parser.usage is None
+        for line in STREAM_EVENTS.decode().splitlines():
+            parser.feed(line)
+        usage = parser.usage
+        assert usage is not None
+        assert (usage.input_tokens, usage.output_tokens, usage.cache_read_tokens) == (100, 50, 1000)
+        assert usage.total_tokens == 150
+        assert usage.cost_usd == 0.25
+        assert (usage.num_turns, usage.duration_api_ms) == (2, 1500)
+
+    def test_text_is_captured_as_it_arrives(self):
+        parser = StreamJsonParser(lambda: OutputCapture(head_bytes=8, tail_bytes=8))
+        for i in range(100):
+            event = {"type": "assistant", "message": {"content": [{"type": "text", "text": f"part {i:03}"}]}}
+            parser.feed(json.dumps(event).encode())
+        assert parser.streamed.total_bytes == 100 * 8 + 99 * 2
+        assert parser.final_text.startswith("part 000")
+        assert parser.final_text.endswith("part 099")
+        assert parser.bytes_read > parser.streamed.total_bytes
+
+    @pytest.mark.asyncio
+    async def test_oversized_lines_are_skipped(self):
+        reader = asyncio.StreamReader(limit=64)
+        reader.feed_data(b'{"type":"system","session_id":"abc"}\n' + b"x" * 200 + b"\n")
+        reader.feed_data(b'{"type":"result","result":"ok"}\n')
+        reader.feed_eof()
+        parser = StreamJsonParser()
+        while raw := await read_line(reader):
+            parser.feed(raw)
+        assert parser.session_id == "abc"
+        assert parser.final_text == "ok"
+
+    def test_error_result(self):
+        parser = StreamJsonParser()
+        parser.feed('{"type":"result","is_error":true,"result":"Max turns reached"}')
+        assert parser.is_error
+        assert parser.final_text == "Max turns reached"
+
+
+class TestClaudeSessions:
+    @pytest.fixture
+    async def db(self, tmp_path):
+        await init_db(str(tmp_path / "sessions.db"))
+        yield
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_continue_resumes_thread_session(self, db, runner, claude_config, fake_process):
+        project = claude_config.claude.default_project
+        create = AsyncMock(side_effect=lambda *a, **kw: fake_process(stdout=STREAM_EVENTS))
+
+        with patch("claudecode_terminal.services.claude.asyncio.create_subprocess_exec", create):
+            first = await runner.execute(prompt="hello", project_path=project, user_id="1", thread="chat:0")
+            await runner.execute(
+                prompt="more", project_path=project, user_id="1", thread="chat:0", continue_conversation=True
+            )
+            await runner.execute(
+                prompt="more", project_path=project, user_id="1", thread="other:0", continue_conversation=True
+            )
+
+        assert first.session_id == "abc"
+        resumed, fallback = create.await_args_list[1].args, create.await_args_list[2].args
+        assert resumed[resumed.index("--resume") + 1] == "abc"
+        assert "--continue" not in resumed
+        assert "--continue" in fallback and "--resume" not in fallback
+
+        sessions = await get_claude_sessions("1", str(Path(project).resolve()), "chat:0")
+        assert [s["session_id"] for s in sessions] == ["abc"]
+        assert sessions[0]["title"] == "hello"
+
+
+class TestClaudeUsage:
+    @pytest.fixture
+    async def db(self, tmp_path):
+        await init_db(str(tmp_path / "usage.db"))
+        yield
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_usage_recorded_in_aggregates(self, db, runner, claude_config, fake_process):
+        project = claude_config.claude.default_project
+        create = AsyncMock(side_effect=lambda *a, **kw: fake_process(stdout=STREAM_EVENTS))
+
+        with patch("claudecode_terminal.services.claude.asyncio.create_subprocess_exec", create):
+            result = await runner.execute(prompt="hello", project_path=project, user_id="1")
+            await runner.execute(prompt="again", project_path=project, user_id="1")
+
+        assert result.usage is not None and result.usage.cost_usd == 0.25
+        [totals] = await get_usage_totals("2000-01-01", user_id="1")
+        assert totals["runs"] == 2
+        assert totals["cost_usd"] == pytest.approx(0.5)
+        assert totals["input_tokens"] == 200
+        daily, monthly = await runner.usage.spend("1")
+        assert daily.tokens == monthly.tokens == 300
+
+    @pytest.mark.asyncio
+    async def test_first_of_month_is_counted_once(self, db, monkeypatch):
+        monkeypatch.setattr(usage_module, "today", lambda: "2026-11-01")
+        tracker = UsageTracker(QuotaConfig(daily_cost_usd=1.0))
+        for _ in range(2):
+            await tracker.record("1", "/p", TokenUsage(input_tokens=10, output_tokens=5, cost_usd=0.4))
+
+        daily, monthly = await tracker.spend("1")
+        assert daily is not monthly
+        assert daily.cost_usd == monthly.cost_usd == pytest.approx(0.8)
+        assert daily.tokens == monthly.tokens == 30
+        assert await tracker.check("1") is None
+
+    @pytest.mark.asyncio
+    async def test_quota_blocks_further_runs(self, db, claude_config, fake_process):
+        claude_config.quotas = QuotaConfig(daily_cost_usd=10.0, users={"1": {"daily_cost_usd": 0.2}})
+        runner = ClaudeRunner(claude_config)
+        project = claude_config.claude.default_project
+        create = AsyncMock(side_effect=lambda *a, **kw: fake_process(stdout=STREAM_EVENTS))
+
+        with patch("claudecode_terminal.services.claude.asyncio.create_subprocess_exec", create):
+            first = await runner.execute(prompt="hello", project_path=project, user_id="1")
+            blocked = await runner.execute(prompt="again", project_path=project, user_id="1")
+            other = await runner.execute(prompt="hello", project_path=project, user_id="2")
+
+        assert first.exit_code == 0
+        assert blocked.blocked and blocked.exit_code == -1
+        assert "Daily cost quota" in blocked.reason
+        assert other.exit_code == 0
+        assert create.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_quota_is_checked_per_caller_when_coalescing(self, db, claude_config, fake_process):
+        claude_config.claude.coalesce = True
+        claude_config.quotas = QuotaConfig(users={"1": {"daily_cost_usd": 0.2}})
+        runner = ClaudeRunner(claude_config)
+        project = claude_config.claude.default_project
+        create = AsyncMock(side_effect=lambda *a, **kw: fake_process(stdout=STREAM_EVENTS))
+
+        async def slow_create(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return await create(*args, **kwargs)
+
+        with patch("claudecode_terminal.services.claude.asyncio.create_subprocess_exec", side_effect=slow_create):
+            await runner.execute(prompt="spend", project_path=project, user_id="1")
+            # Whichever of them starts the flight, only the user over quota is refused
+            for users in (("1", "2"), ("2", "1")):
+                results = await asyncio.gather(
+                    *(runner.execute(prompt="hello", project_path=project, user_id=user) for user in users)
+                )
+                by_user = dict(zip(users, results, strict=True))
+                assert by_user["1"].blocked
+                assert not by_user["2"].blocked and by_user["2"].exit_code == 0
@@ -0,0 +1,174 @@
+"""Tests for the warm Claude process pool."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import stat
+import sys
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from claudecode_terminal.config import AppConfig, BotConfig, ClaudeConfig, LoggingConfig, ShellConfig, StorageConfig
+from claudecode_terminal.services import limits as limits_mod
+from claudecode_terminal.services.claude import ClaudeRunner
+from claudecode_terminal.services.claude_pool import ClaudeProcessPool
+from claudecode_terminal.services.limits import Sandbox
+
+# Minimal stand-in for `claude --input-format stream-json`: echoes each prompt back.
+FAKE_CLAUDE = f"""#!{sys.executable}
+import json, sys
+for line in sys.stdin:
+    text = json.loads(line)["message"]["content"][0]["text"]
+    print(json.dumps({{"type": "assistant", "message": {{"content": [{{"type": "text", "text": "echo: " + text}}]}}}}))
+    print(json.dumps({{"type": "result", "is_error": False, "result": "echo: " + text, "session_id": "s1"}}))
+    sys.stdout.flush()
+"""
+
+
+async def _settle(pool: ClaudeProcessPool) -> None:
+    """Wait for background pre-spawns to finish."""
+    for _ in range(100):
+        if not any(pool._spawning.values()):
+            return
+        await asyncio.sleep(0.05)
+
+
+@pytest.fixture
+def fake_claude(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "claude"
+    script.write_text(FAKE_CLAUDE)
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return script
+
+
+class TestClaudeProcessPool:
+    @pytest.mark.asyncio
+    async def test_acquire_run_release(self, fake_claude, tmp_path):
+        pool = ClaudeProcessPool(size=1, max_requests=2)
+        try:
+            pooled = await pool.acquire("1", str(tmp_path), "")
+            parser = await pooled.run("hi")
+            assert parser.final_text == "echo: hi"
+            assert parser.session_id == "s1"
+            await pool.release(pooled)
+            assert pool.misses == 1
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_prewarmed_process_is_reused(self, fake_claude, tmp_path):
+        pool = ClaudeProcessPool(size=1, max_requests=1)
+        try:
+            first = await pool.acquire("1", str(tmp_path), "")
+            await first.run("one")
+            await pool.release(first)
+            assert not first.alive  # spent after max_requests
+
+            await _settle(pool)
+            second = await pool.acquire("1", str(tmp_path), "")
+            assert pool.hits == 1
+            assert second is not first
+            await pool.release(second)
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_evicts_dead_processes(self, fake_claude, tmp_path):
+        pool = ClaudeProcessPool(size=1, max_requests=5, idle_timeout=0)
+        try:
+            pooled = await pool.acquire("1", str(tmp_path), "")
+            await pool.release(pooled)
+            await _settle(pool)
+            await pool.evict_idle()
+            assert pool.stats()["idle"] == 0
+            assert not pooled.alive
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_users_never_share_a_process(self, fake_claude, tmp_path):
+        pool = ClaudeProcessPool(size=1, max_requests=5)
+        try:
+            first = await pool.acquire("1", str(tmp_path), "")
+            await first.run("my secret")
+            await pool.release(first)
+            await _settle(pool)
+
+            # User 1's warm process is not handed to user 2
+            other = await pool.acquire("2", str(tmp_path), "")
+            assert other.key == ("2", str(tmp_path), "")
+            assert (pool.hits, pool.misses) == (0, 2)
+            await pool.release(other)
+
+            again = await pool.acquire("1", str(tmp_path), "")
+            assert again.key == ("1", str(tmp_path), "")
+            assert pool.hits == 1
+            await pool.release(again)
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_processes_run_in_a_sandbox(self, fake_claude, tmp_path, monkeypatch):
+        monkeypatch.setattr(limits_mod, "RELEASE_RETRIES", 1)
+        prepared: list[tuple[str, str, Sandbox]] = []
+
+        class Limiter:
+            def prepare(self, user_id: str, source: str) -> Sandbox:
+                cgroup = tmp_path / f"job-{len(prepared)}"
+                cgroup.mkdir()
+                (cgroup / "cgroup.procs").write_text("")
+                (cgroup / "memory.peak").write_text("1048576\n")
+                (cgroup / "cpu.stat").write_text("usage_usec 250000\n")
+                sandbox = Sandbox(cgroup=cgroup)
+                prepared.append((user_id, source, sandbox))
+                return sandbox
+
+        pool = ClaudeProcessPool(size=1, max_requests=2, limiter=Limiter())  # type: ignore[arg-type]
+        try:
+            first = await pool.acquire("1", str(tmp_path), "")
+            await first.run("one")
+            await _settle(pool)
+            assert [(user, source) for user, source, _ in prepared] == [("1", "claude"), ("1", "claude")]
+            assert (first.sandbox.cgroup / "cgroup.procs").read_text() == "0"  # type: ignore[operator]
+
+            # The pool is already full, so the process is recycled and its sandbox released
+            usage = await pool.release(first)
+            assert not first.alive
+            assert (usage.peak_memory_bytes, usage.cpu_time_ms) == (1048576, 250)
+
+            # A process kept for more prompts reports CPU time per prompt
+            second = await pool.acquire("1", str(tmp_path), "")
+            assert second.sandbox is prepared[1][2]
+            assert second.measure().cpu_time_ms == 250
+            (tmp_path / "job-1" / "cpu.stat").write_text("usage_usec 400000\n")
+            assert second.measure().cpu_time_ms == 150
+        finally:
+            await pool.close()
+
+
+class TestPoolBackend:
+    @pytest.mark.asyncio
+    async def test_runner_uses_pool(self, fake_claude, tmp_path):
+        project = tmp_path / "proj"
+        project.mkdir()
+        config = AppConfig(
+            bot=BotConfig(token="test"),
+            claude=ClaudeConfig(default_project=str(project), timeout=10, backend="pool"),
+            shell=ShellConfig(),
+            storage=StorageConfig(db_path=str(tmp_path / "test.db")),
+            logging=LoggingConfig(),
+        )
+        runner = ClaudeRunner(config)
+        try:
+            with patch("claudecode_terminal.services.claude.save_command", new_callable=AsyncMock):
+                result = await runner.execute(prompt="ping", project_path=str(project), user_id="1")
+            assert result.exit_code == 0
+            assert result.stdout == "echo: ping"
+            assert runner.pool is not None and runner.pool.misses == 1
+        finally:
+            await runner.close()
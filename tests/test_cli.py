@@ -2,9 +2,6 @@
 
 from __future__ import annotations
 
-from pathlib import Path
-from unittest.mock import patch
-
 from typer.testing import CliRunner
 
 from claudecode_terminal.cli import app
@@ -67,3 +64,130 @@ class TestCli:
         result = runner.invoke(app, ["logs"])
         assert result.exit_code == 0
         assert "no log" in result.output.lower()
+
+
+class TestHistoryCli:
+    def test_search(self, tmp_path, monkeypatch):
+        import asyncio
+
+        import claudecode_terminal.cli as cli_module
+        import claudecode_terminal.config as cfg_module
+        from claudecode_terminal.config import AppConfig, StorageConfig, save_config
+        from claudecode_terminal.storage.database import close_db, init_db, save_command
+
+        config_file = tmp_path / "config.toml"
+        monkeypatch.setattr(cfg_module, "CONFIG_FILE", config_file)
+        monkeypatch.setattr(cfg_module, "CONFIG_DIR", tmp_path)
+        monkeypatch.setattr(cli_module, "CONFIG_FILE", config_file)
+        db_path = str(tmp_path / "history.db")
+        save_config(AppConfig(storage=StorageConfig(db_path=db_path)))
+
+        async def _seed() -> None:
+            await init_db(db_path)
+            for i in range(3):
+                await save_command("1", f"alembic upgrade rev{i}", "", "", 0, 5)
+            await save_command("1", "git status", "", "", 0, 5)
+            await close_db()
+
+        asyncio.run(_seed())
+
+        result = runner.invoke(app, ["history", "search", "alembic", "--limit", "2"])
+        assert result.exit_code == 0
+        assert "alembic" in result.output
+        assert "git status" not in result.output
+        cursor = result.output.split("--after ", 1)[1].split()[0]
+
+        result = runner.invoke(app, ["history", "search", "alembic", "--limit", "2", "--after", cursor])
+        assert result.exit_code == 0
+        assert result.output.count("alembic upgrade") == 1
+        assert "--after" not in result.output
+
+        result = runner.invoke(app, ["history", "search", "nothing-like-this"])
+        assert "No matches" in result.output
+
+    def test_stats(self, tmp_path, monkeypatch):
+        import asyncio
+
+        import claudecode_terminal.cli as cli_module
+        import claudecode_terminal.config as cfg_module
+        from claudecode_terminal.config import AppConfig, StorageConfig, save_config
+        from claudecode_terminal.storage.database import close_db, flush_history, get_db, init_db, save_command
+
+        config_file = tmp_path / "config.toml"
+        monkeypatch.setattr(cfg_module, "CONFIG_FILE", config_file)
+        monkeypatch.setattr(cfg_module, "CONFIG_DIR", tmp_path)
+        monkeypatch.setattr(cli_module, "CONFIG_FILE", config_file)
+        db_path = str(tmp_path / "history.db")
+        save_config(AppConfig(storage=StorageConfig(db_path=db_path)))
+
+        async def _seed() -> None:
+            await init_db(db_path)
+            await save_command("1", "pytest", "", "", 1, 5)
+            await save_command("1", "ls", "", "", 0, 5)
+            await flush_history()
+            # As if both rows predate the rollups
+            db = await get_db()
+            await db.execute("DELETE FROM command_stats")
+            await db.execute("UPDATE command_stats_backfill SET below_id = 100")
+            await db.commit()
+            await close_db()
+
+        asyncio.run(_seed())
+
+        result = runner.invoke(app, ["stats"])
+        assert result.exit_code == 0
+        assert "No commands in this range" in result.output
+        assert "stats backfill" in result.output
+
+        result = runner.invoke(app, ["stats", "backfill"])
+        assert "Added 2 commands" in result.output
+
+        result = runner.invoke(app, ["stats", "--range", "day", "--by", "program"])
+        assert result.exit_code == 0
+        assert "pytest" in result.output
+        assert "100.0%" in result.output
+
+        assert runner.invoke(app, ["stats", "--by", "command"]).exit_code == 1
+
+    def test_incremental_export(self, tmp_path, monkeypatch):
+        import asyncio
+        import gzip
+        import json
+
+        import claudecode_terminal.cli as cli_module
+        import claudecode_terminal.config as cfg_module
+        from claudecode_terminal.config import AppConfig, StorageConfig, save_config
+        from claudecode_terminal.storage.database import close_db, init_db, save_command
+
+        config_file = tmp_path / "config.toml"
+        monkeypatch.setattr(cfg_module, "CONFIG_FILE", config_file)
+        monkeypatch.setattr(cfg_module, "CONFIG_DIR", tmp_path)
+        monkeypatch.setattr(cli_module, "CONFIG_FILE", config_file)
+        db_path = str(tmp_path / "history.db")
+        save_config(AppConfig(storage=StorageConfig(db_path=db_path)))
+
+        async def _add(commands: list[str]) -> None:
+            await init_db(db_path)
+            for command in commands:
+                await save_command("1", command, "", "", 0, 5)
+            await close_db()
+
+        state = str(tmp_path / "export-state.json")
+        out = tmp_path / "night1.jsonl.gz"
+        asyncio.run(_add(["make", "make test"]))
+        result = runner.invoke(app, ["history", "export", "-o", str(out), "--state", state])
+        assert result.exit_code == 0
+        with gzip.open(out, "rt") as f:
+            assert [json.loads(line)["command"] for line in f] == ["make", "make test"]
+
+        asyncio.run(_add(["git push"]))
+        out = tmp_path / "night2.csv"
+        result = runner.invoke(app, ["history", "export", "-o", str(out), "-f", "csv", "--state", state])
+        assert result.exit_code == 0
+        assert out.read_text().splitlines()[1].startswith("3,")
+        assert json.loads((tmp_path / "export-state.json").read_text())["last_id"] == 3
+
+        result = runner.invoke(app, ["history", "export", "-o", str(out), "--state", state])
+        assert "Exported 0 rows" in result.output
+        assert runner.invoke(app, ["history", "export", "-f", "xml"]).exit_code == 1
+        assert runner.invoke(app, ["history", "export", "--since", "yesterday"]).exit_code == 1
@@ -7,9 +7,9 @@ from claudecode_terminal.config import (
     AppConfig,
     BotConfig,
     ClaudeConfig,
-    save_config,
+    PolicyConfig,
     load_config,
-    CONFIG_FILE,
+    save_config,
 )
 
 
@@ -49,6 +49,7 @@ class TestAppConfig:
         config = AppConfig(
             bot=BotConfig(token="test-token-123", allowed_users=[111, 222]),
             claude=ClaudeConfig(default_project="/tmp/test", default_model="opus", timeout=600),
+            policy=PolicyConfig(allow=["python3"], users={"111": {"deny": ["docker"]}}),
         )
 
         save_config(config)
@@ -60,3 +61,5 @@ class TestAppConfig:
         assert loaded.claude.default_project == "/tmp/test"
         assert loaded.claude.default_model == "opus"
         assert loaded.claude.timeout == 600
+        assert loaded.policy.allow == ["python3"]
+        assert loaded.policy.users == {"111": {"deny": ["docker"]}}
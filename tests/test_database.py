@@ -2,9 +2,34 @@
 
 from __future__ import annotations
 
+import asyncio
+import itertools
+import sqlite3
+import time
+
 import pytest
 
-from claudecode_terminal.storage.database import close_db, get_recent_commands, init_db, save_command
+from claudecode_terminal.storage import database
+from claudecode_terminal.storage.database import (
+    _history_query,
+    _search_query,
+    close_db,
+    delete_commands,
+    flush_history,
+    get_command,
+    get_db,
+    get_history,
+    get_recent_commands,
+    history_stats,
+    init_db,
+    read_connection,
+    reader_stats,
+    save_command,
+    search_commands,
+    search_cursor,
+)
+from claudecode_terminal.storage.outputs import pack, unpack
+from claudecode_terminal.storage.pool import Pragmas
 
 
 class TestDatabase:
@@ -74,3 +99,425 @@ class TestDatabase:
         assert commands[0]["source"] == "claude"
 
         await close_db()
+
+    @pytest.mark.asyncio
+    async def test_migrates_old_commands_table(self, tmp_path):
+        import aiosqlite
+
+        db_path = str(tmp_path / "old.db")
+        async with aiosqlite.connect(db_path) as db:
+            await db.execute(
+                "CREATE TABLE commands (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+                "command TEXT NOT NULL, stdout TEXT DEFAULT '', stderr TEXT DEFAULT '', exit_code INTEGER, "
+                "execution_time_ms INTEGER, source TEXT DEFAULT 'telegram', "
+                "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+            )
+            await db.commit()
+
+        await init_db(db_path)
+        await save_command("1", "ls", "", "", 0, 5, peak_memory_bytes=1024, cpu_time_ms=3)
+        await flush_history()
+        db = await get_db()
+        cursor = await db.execute("SELECT peak_memory_bytes, cpu_time_ms FROM commands")
+        assert tuple(await cursor.fetchone()) == (1024, 3)
+        await close_db()
+
+
+async def _written(rows: int) -> bool:
+    for _ in range(200):
+        if history_stats()["rows"] == rows:
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+class TestHistoryWriter:
+    @pytest.mark.asyncio
+    async def test_burst_is_one_commit(self, tmp_path):
+        await init_db(str(tmp_path / "batch.db"), history_batch_size=100, history_flush_ms=10_000)
+        for i in range(20):
+            await save_command("1", f"cmd_{i}", "", "", 0, 1)
+        assert history_stats()["pending"] == 20
+
+        commands = await get_recent_commands(limit=50)
+        assert len(commands) == 20
+        stats = history_stats()
+        assert stats["batches"] == 1
+        assert stats["max_batch"] == 20
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_flushes_when_batch_fills(self, tmp_path):
+        await init_db(str(tmp_path / "size.db"), history_batch_size=5, history_flush_ms=10_000)
+        for i in range(5):
+            await save_command("1", f"cmd_{i}", "", "", 0, 1)
+        assert await _written(5)
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_flushes_after_interval(self, tmp_path):
+        await init_db(str(tmp_path / "timer.db"), history_batch_size=100, history_flush_ms=20)
+        await save_command("1", "lonely", "", "", 0, 1)
+        assert await _written(1)
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_backpressure_flushes_inline(self, tmp_path):
+        await init_db(str(tmp_path / "full.db"), history_batch_size=4, history_flush_ms=10_000, history_max_pending=4)
+        db = await get_db()
+        for i in range(9):
+            await save_command("1", f"cmd_{i}", "", "", 0, 1)
+        # The background flusher never got a turn; writers committed the overflow themselves
+        assert history_stats()["throttled"] >= 1
+        assert history_stats()["pending"] <= 4
+        cursor = await db.execute("SELECT COUNT(*) FROM commands")
+        assert (await cursor.fetchone())[0] >= 5
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_failed_commit_is_retried(self, tmp_path, monkeypatch):
+        await init_db(str(tmp_path / "retry.db"), history_flush_ms=10_000)
+        db = await get_db()
+        commit = db.commit
+
+        async def failing():
+            raise sqlite3.OperationalError("disk I/O error")
+
+        monkeypatch.setattr(db, "commit", failing)
+        for _ in range(2):
+            await save_command("1", "git status", "clean\n", "", 0, 5)
+        await flush_history()
+        stats = history_stats()
+        assert (stats["failed"], stats["pending"], stats["rows"]) == (1, 2, 0)
+
+        monkeypatch.setattr(db, "commit", commit)
+        assert len(await get_recent_commands()) == 2
+        # The failed attempt was rolled back, not committed with the retry
+        cursor = await db.execute("SELECT refcount FROM outputs")
+        assert [row[0] for row in await cursor.fetchall()] == [2]
+        assert history_stats()["dropped"] == 0
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_rows_are_dropped_after_max_attempts(self, tmp_path, monkeypatch):
+        await init_db(str(tmp_path / "drop.db"), history_flush_ms=10_000)
+        db = await get_db()
+
+        async def failing():
+            raise sqlite3.OperationalError("disk I/O error")
+
+        monkeypatch.setattr(db, "commit", failing)
+        await save_command("1", "lost", "", "", 0, 1)
+        for _ in range(3):
+            await flush_history()
+        stats = history_stats()
+        assert (stats["failed"], stats["dropped"], stats["pending"]) == (3, 1, 0)
+        await flush_history()
+        monkeypatch.undo()
+        assert await get_recent_commands() == []
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_close_flushes(self, tmp_path):
+        db_path = str(tmp_path / "close.db")
+        await init_db(db_path, history_flush_ms=10_000)
+        await save_command("1", "pending", "", "", 0, 1)
+        await close_db()
+
+        await init_db(db_path)
+        assert [c["command"] for c in await get_recent_commands()] == ["pending"]
+        await close_db()
+
+
+class TestOutputStorage:
+    def test_pack_round_trip(self):
+        text = "PASSED tests/test_x.py::test_y\n" * 200
+        digest, codec, blob, size = pack(text)
+        assert codec in ("zlib", "zstd")
+        assert len(blob) < size // 10
+        assert unpack(codec, blob) == text
+        assert pack(text, codec="zlib")[0] == digest
+
+    def test_small_output_stored_raw(self):
+        _, codec, blob, _ = pack("ok\n")
+        assert (codec, blob) == ("raw", b"ok\n")
+
+    @pytest.mark.asyncio
+    async def test_identical_outputs_stored_once(self, tmp_path):
+        await init_db(str(tmp_path / "dedup.db"))
+        status = "On branch main\nnothing to commit, working tree clean\n" * 10
+        for _ in range(3):
+            await save_command("1", "git status", status, "", 0, 5)
+        await save_command("1", "make", "built\n" * 100, "warning: x\n", 0, 5)
+        await flush_history()
+
+        db = await get_db()
+        cursor = await db.execute("SELECT refcount FROM outputs ORDER BY refcount DESC")
+        assert [row[0] for row in await cursor.fetchall()] == [3, 1, 1]
+        cursor = await db.execute("SELECT stdout, stdout_hash IS NOT NULL FROM commands LIMIT 1")
+        assert tuple(await cursor.fetchone()) == ("", 1)
+
+        full = await get_command(4)
+        assert full["stdout"] == "built\n" * 100
+        assert full["stderr"] == "warning: x\n"
+        assert (await get_command(1))["stdout"] == status
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_delete_releases_outputs(self, tmp_path):
+        await init_db(str(tmp_path / "release.db"))
+        for _ in range(2):
+            await save_command("1", "git status", "clean\n", "", 0, 5)
+        await save_command("1", "ls", "a\nb\n", "", 0, 5)
+
+        assert await delete_commands([1, 3]) == 2
+        db = await get_db()
+        cursor = await db.execute("SELECT refcount FROM outputs")
+        assert [row[0] for row in await cursor.fetchall()] == [1]
+        assert (await get_command(2))["stdout"] == "clean\n"
+
+        await delete_commands([2])
+        cursor = await db.execute("SELECT COUNT(*) FROM outputs")
+        assert (await cursor.fetchone())[0] == 0
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_migrates_inline_outputs(self, tmp_path):
+        import aiosqlite
+
+        db_path = str(tmp_path / "inline.db")
+        async with aiosqlite.connect(db_path) as db:
+            await db.execute(
+                "CREATE TABLE commands (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+                "command TEXT NOT NULL, stdout TEXT DEFAULT '', stderr TEXT DEFAULT '', exit_code INTEGER, "
+                "execution_time_ms INTEGER, source TEXT DEFAULT 'telegram', "
+                "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+            )
+            await db.executemany(
+                "INSERT INTO commands (user_id, command, stdout, stderr, exit_code) VALUES ('1', ?, ?, ?, 0)",
+                [("pytest", "1 passed\n" * 50, ""), ("pytest", "1 passed\n" * 50, ""), ("true", "", "")],
+            )
+            await db.commit()
+
+        await init_db(db_path)
+        db = await get_db()
+        cursor = await db.execute("SELECT COUNT(*) FROM commands WHERE stdout != ''")
+        assert (await cursor.fetchone())[0] == 0
+        cursor = await db.execute("SELECT refcount FROM outputs")
+        assert [row[0] for row in await cursor.fetchall()] == [2]
+        assert (await get_command(2))["stdout"] == "1 passed\n" * 50
+        assert (await get_command(3))["stdout"] == ""
+        await close_db()
+
+        # Runs once: a second start finds nothing to do
+        await init_db(db_path)
+        cursor = await (await get_db()).execute("PRAGMA user_version")
+        assert (await cursor.fetchone())[0] == 1
+        await close_db()
+
+
+class TestSearch:
+    @pytest.fixture
+    async def history(self, tmp_path):
+        await init_db(str(tmp_path / "search.db"), search_output=True)
+        await save_command("1", "rails db:migrate", "== CreateUsers: migrating ==\n", "", 0, 5)
+        await save_command("1", "git status", "On branch main\n", "", 0, 5)
+        await save_command("2", "make test", "FAILED test_migrations.py\n", "", 1, 5)
+        await save_command("1", "ls", "", "", 0, 5)
+        yield
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_prefix_match_on_command_and_output(self, history):
+        rows, more = await search_commands("migrat")
+        assert not more
+        assert [r["command"] for r in rows][0] == "rails db:migrate"
+        assert {r["command"] for r in rows} == {"rails db:migrate", "make test"}
+        by_command = {r["command"]: r["snippet"] for r in rows}
+        assert by_command["rails db:migrate"] == "rails db:\x02migrate\x03"
+        assert "\x02migrations\x03" in by_command["make test"]
+
+    @pytest.mark.asyncio
+    async def test_user_filter_and_pages(self, history):
+        rows, _ = await search_commands("migrat", user_id="2")
+        assert [r["command"] for r in rows] == ["make test"]
+
+        first, more = await search_commands("migrat", limit=1)
+        second, more_after = await search_commands("migrat", limit=1, after=search_cursor(first[-1]))
+        assert more and not more_after
+        assert first[0]["id"] != second[0]["id"]
+        with pytest.raises(ValueError):
+            await search_commands("migrat", after="page-2")
+
+    @pytest.mark.asyncio
+    async def test_pages_are_keyset_over_the_users_own_hits(self, history, monkeypatch):
+        for search_output in (False, True):
+            monkeypatch.setattr(database, "_search_output", search_output)
+            sql, params = _search_query(["migrat"], "1", (5, -1.0), 11)
+            assert "OFFSET" not in sql
+            async with read_connection() as db:
+                plan = [row[3] for row in await (await db.execute(f"EXPLAIN QUERY PLAN {sql}", params)).fetchall()]
+            # Full-text matches drive the hits; commands are only looked up, never scanned
+            assert not any(step.split()[:2] in (["SCAN", "c"], ["SCAN", "commands"]) for step in plan), plan
+            # ...and each match is checked against the user before anything is materialized
+            materialize = plan[plan.index("MATERIALIZE hits") : plan.index("SCAN hits")]
+            matches = [step for step in materialize if step.startswith(("SCAN commands_fts", "SCAN outputs_fts"))]
+            lookups = [step for step in materialize if step.startswith("SEARCH c ")]
+            assert len(matches) == len(lookups) == (3 if search_output else 1), plan
+
+    @pytest.mark.asyncio
+    async def test_query_syntax_is_literal(self, history):
+        for query in ('"unbalanced', "status OR", "NEAR(x", "-x", "*", ""):
+            await search_commands(query)
+        rows, _ = await search_commands("git: status!")
+        assert [r["command"] for r in rows] == ["git status"]
+
+    @pytest.mark.asyncio
+    async def test_deleted_rows_leave_the_index(self, history):
+        await delete_commands([3])
+        rows, _ = await search_commands("migrations")
+        assert rows == []
+
+    @pytest.mark.asyncio
+    async def test_existing_history_is_indexed(self, tmp_path):
+        db_path = str(tmp_path / "backfill.db")
+        await init_db(db_path)
+        await save_command("1", "docker compose up", "Starting web ... done\n", "", 0, 5)
+        await flush_history()
+        db = await get_db()
+        await db.execute("DROP TABLE commands_fts")
+        await db.commit()
+        await close_db()
+
+        await init_db(db_path, search_output=True)
+        assert [r["command"] for r in (await search_commands("compose"))[0]] == ["docker compose up"]
+        assert [r["command"] for r in (await search_commands("starting"))[0]] == ["docker compose up"]
+        await close_db()
+
+
+class TestHistoryPages:
+    @pytest.fixture
+    async def history(self, tmp_path):
+        await init_db(str(tmp_path / "pages.db"))
+        for i in range(25):
+            await save_command(
+                "1" if i % 5 else "2",
+                f"cmd {i}",
+                "",
+                "boom" if i % 3 == 0 else "",
+                1 if i % 3 == 0 else 0,
+                5,
+                source="claude" if i % 4 == 0 else "telegram",
+                project="/a" if i < 12 else "/b",
+            )
+        yield
+        await close_db()
+
+    @pytest.mark.asyncio
+    async def test_only_the_callers_rows(self, history):
+        page = await get_history(user_id="2", limit=10)
+        assert [r["command"] for r in page.rows] == ["cmd 20", "cmd 15", "cmd 10", "cmd 5", "cmd 0"]
+        assert not page.has_older and not page.has_newer
+        assert len(await get_recent_commands(limit=50, user_id="1")) == 20
+
+    @pytest.mark.asyncio
+    async def test_keyset_pages_both_ways(self, history):
+        first = await get_history(user_id="1", limit=8)
+        assert [r["id"] for r in first.rows] == [25, 24, 23, 22, 20, 19, 18, 17]
+        assert first.has_older and not first.has_newer
+
+        second = await get_history(user_id="1", limit=8, before=first.rows[-1]["id"])
+        third = await get_history(user_id="1", limit=8, before=second.rows[-1]["id"])
+        assert [r["id"] for r in third.rows] == [5, 4, 3, 2]
+        assert not third.has_older and third.has_newer
+
+        back = await get_history(user_id="1", limit=8, after=third.rows[0]["id"])
+        assert back == second
+        assert back.has_older and back.has_newer
+
+    @pytest.mark.asyncio
+    async def test_filters(self, history):
+        failed = await get_history(user_id="1", status="failed", limit=50)
+        assert all(r["exit_code"] != 0 for r in failed.rows) and len(failed.rows) == 7
+        assert (await get_history(user_id="1", exit_code=1, limit=50)).rows == failed.rows
+        ok = await get_history(user_id="1", status="ok", project="/b", limit=50)
+        assert [r["command"] for r in ok.rows] == ["cmd 23", "cmd 22", "cmd 19", "cmd 17", "cmd 16", "cmd 14", "cmd 13"]
+        claude = await get_history(source="claude", limit=50)
+        assert [r["command"] for r in claude.rows] == [
+            "cmd 24",
+            "cmd 20",
+            "cmd 16",
+            "cmd 12",
+            "cmd 8",
+            "cmd 4",
+            "cmd 0",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_every_history_query_uses_an_index(self, history):
+        db = await get_db()
+        cursors = [{}, {"before": 10}, {"after": 10}]
+        for user_id, source, project, status, cursor in itertools.product(
+            ["1", None], [None, "claude"], [None, "/a"], [None, "failed"], cursors
+        ):
+            if user_id is None and source is None:
+                continue
+            sql, params = _history_query(
+                user_id, source, project, status, before=cursor.get("before"), after=cursor.get("after")
+            )
+            plan = [row[3] for row in await (await db.execute(f"EXPLAIN QUERY PLAN {sql}", params)).fetchall()]
+            assert all(step.startswith("SEARCH commands USING INDEX") for step in plan), (sql, plan)
+        # Everyone's history pages by rowid, and is never sorted
+        for cursor in cursors:
+            sql, params = _history_query(**cursor)
+            plan = [row[3] for row in await (await db.execute(f"EXPLAIN QUERY PLAN {sql}", params)).fetchall()]
+            assert plan in (
+                ["SCAN commands"],
+                ["SEARCH commands USING INTEGER PRIMARY KEY (rowid<?)"],
+                ["SEARCH commands USING INTEGER PRIMARY KEY (rowid>?)"],
+            ), plan
+
+
+class TestReaderPool:
+    async def _read_during_slow_write(self, db_path: str, readers: int) -> float:
+        await init_db(db_path, readers=readers)
+        await save_command("1", "echo hi", "hi\n", "", 0, 5)
+        await flush_history()
+        writer = await get_db()
+        await writer.create_function("slow", 0, lambda: time.sleep(0.5) or 1)
+        slow = asyncio.ensure_future(writer.execute("SELECT slow()"))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        rows = await get_recent_commands(user_id="1")
+        elapsed = time.perf_counter() - started
+        await slow
+        await close_db()
+        assert [r["command"] for r in rows] == ["echo hi"]
+        return elapsed
+
+    @pytest.mark.asyncio
+    async def test_reads_do_not_queue_behind_the_writer(self, tmp_path):
+        assert await self._read_during_slow_write(str(tmp_path / "pool.db"), readers=2) < 0.3
+        assert await self._read_during_slow_write(str(tmp_path / "single.db"), readers=0) >= 0.3
+
+    @pytest.mark.asyncio
+    async def test_readers_see_commits_and_cannot_write(self, tmp_path):
+        await init_db(str(tmp_path / "ro.db"), readers=1, pragmas=Pragmas(cache_size_kb=1024, busy_timeout_ms=250))
+        try:
+            for i in range(3):
+                await save_command("1", f"cmd {i}", "", "", 0, 5)
+                assert len(await get_recent_commands(limit=10)) == i + 1
+            async with read_connection() as db:
+                assert (await (await db.execute("PRAGMA cache_size")).fetchone())[0] == -1024
+                assert (await (await db.execute("PRAGMA busy_timeout")).fetchone())[0] == 250
+                with pytest.raises(Exception, match="readonly"):
+                    await db.execute("DELETE FROM commands")
+            writer = await get_db()
+            assert (await (await writer.execute("PRAGMA synchronous")).fetchone())[0] == 1  # NORMAL
+            assert reader_stats()["reads"] >= 3
+        finally:
+            await close_db()
+
+    def test_rejects_unknown_synchronous_mode(self):
+        with pytest.raises(ValueError, match="synchronous"):
+            Pragmas(synchronous="sometimes")
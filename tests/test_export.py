@@ -0,0 +1,158 @@
+"""Tests for streaming history export."""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from claudecode_terminal.storage import export as export_module
+from claudecode_terminal.storage.database import (
+    close_db,
+    flush_history,
+    get_db,
+    init_db,
+    iter_commands,
+    read_connection,
+    save_command,
+)
+from claudecode_terminal.storage.export import (
+    COLUMNS,
+    check_export,
+    compression_for,
+    export_history,
+    read_state,
+    write_state,
+)
+
+
+@pytest.fixture
+async def db(tmp_path):
+    await init_db(str(tmp_path / "history.db"))
+    yield
+    await close_db()
+
+
+async def _add(count: int, created_at: str | None = None) -> None:
+    for i in range(count):
+        await save_command("1", f"echo {i}", f"out {i}\n" if i % 2 else "", "", 0, i)
+    await flush_history()
+    if created_at is not None:
+        conn = await get_db()
+        await conn.execute(
+            "UPDATE commands SET created_at = ? WHERE id > (SELECT MAX(id) FROM commands) - ?", (created_at, count)
+        )
+        await conn.commit()
+
+
+def _jsonl(path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestExport:
+    @pytest.mark.asyncio
+    async def test_batches_are_bounded(self, db):
+        await _add(25)
+        sizes = [len(rows) async for rows in iter_commands(tuple(COLUMNS), batch=10)]
+        assert sizes == [10, 10, 5]
+
+    @pytest.mark.asyncio
+    async def test_batches_walk_the_primary_key(self, db):
+        await _add(3)
+        async with read_connection() as conn:
+            cursor = await conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM commands WHERE id > ? AND +created_at >= ? ORDER BY id LIMIT ?",
+                (0, "2000-01-01", 10),
+            )
+            plan = " ".join(row[3] for row in await cursor.fetchall())
+        assert "INTEGER PRIMARY KEY" in plan
+        assert "TEMP B-TREE" not in plan
+
+    @pytest.mark.asyncio
+    async def test_jsonl_with_output(self, db, tmp_path):
+        await _add(3)
+        path = tmp_path / "history.jsonl"
+        assert await export_history(str(path), with_output=True, batch=2) == {"rows": 3, "last_id": 3}
+        rows = _jsonl(path)
+        assert [row["command"] for row in rows] == ["echo 0", "echo 1", "echo 2"]
+        assert [row["stdout"] for row in rows] == ["", "out 1\n", ""]
+        assert list(rows[0]) == [*COLUMNS, "stdout", "stderr"]
+
+    @pytest.mark.asyncio
+    async def test_gzip_csv(self, db, tmp_path):
+        await _add(4)
+        path = tmp_path / "history.csv.gz"
+        await export_history(str(path), "csv", compression_for(str(path)), batch=3)
+        with gzip.open(path, "rt", newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert [row["id"] for row in rows] == ["1", "2", "3", "4"]
+        assert list(rows[0]) == list(COLUMNS)
+
+    @pytest.mark.asyncio
+    async def test_since_until_and_after_id(self, db, tmp_path):
+        await _add(2, "2024-05-31 23:00:00")
+        await _add(3, "2024-06-01 10:00:00")
+        await _add(2, "2024-06-02 00:00:00")
+        path = tmp_path / "june1.jsonl"
+
+        done = await export_history(str(path), since="2024-06-01", until="2024-06-02")
+        assert done == {"rows": 3, "last_id": 5}
+        assert [row["id"] for row in _jsonl(path)] == [3, 4, 5]
+
+        done = await export_history(str(path), since="2024-06-01", after_id=4)
+        assert [row["id"] for row in _jsonl(path)] == [5, 6, 7]
+        assert (await export_history(str(path), since="2025-01-01"))["rows"] == 0
+
+    @pytest.mark.asyncio
+    async def test_parquet(self, db, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        await _add(5)
+        path = tmp_path / "history.parquet"
+        await export_history(str(path), "parquet", "gzip", batch=2)
+        table = pq.read_table(path)
+        assert table.num_rows == 5
+        assert str(table.schema.field("created_at").type) == "timestamp[s, tz=UTC]"
+        assert pq.ParquetFile(path).num_row_groups == 3
+
+
+class TestExportOptions:
+    def test_compression_from_suffix(self):
+        assert compression_for("out.jsonl.gz") == "gzip"
+        assert compression_for("out.csv.zst") == "zstd"
+        assert compression_for("-") == "none"
+
+    def test_unknown_or_unavailable(self, monkeypatch):
+        with pytest.raises(ValueError, match="format"):
+            check_export("xml", "none")
+        with pytest.raises(ValueError, match="compression"):
+            check_export("jsonl", "bz2")
+        monkeypatch.setattr(export_module, "pyarrow", None)
+        with pytest.raises(ValueError, match="pyarrow"):
+            check_export("parquet", "none")
+        monkeypatch.setattr(export_module, "zstandard", None)
+        with pytest.raises(ValueError, match="zstandard"):
+            check_export("jsonl", "zstd")
+
+    def test_state_round_trip(self, tmp_path):
+        path = str(tmp_path / "state" / "export.json")
+        assert read_state(path) == 0
+        write_state(path, 42)
+        assert read_state(path) == 42
+        assert [p.name for p in (tmp_path / "state").iterdir()] == ["export.json"]
+
+    def test_stdout_sink_stays_open(self, monkeypatch):
+        buffer = io.BytesIO()
+
+        class Stdout:
+            pass
+
+        stdout = Stdout()
+        stdout.buffer = buffer  # type: ignore[attr-defined]
+        monkeypatch.setattr(export_module.sys, "stdout", stdout)
+        with export_module._open_sink("-", "gzip") as sink:
+            sink.write(b"hello\n")
+        assert not buffer.closed
+        assert gzip.decompress(buffer.getvalue()) == b"hello\n"
@@ -0,0 +1,90 @@
+"""Tests for fan-out execution across projects."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from claudecode_terminal.services.fanout import fan_out, match_projects
+from claudecode_terminal.storage.models import ExecutionResult
+from claudecode_terminal.utils.formatting import format_fanout_report, format_fanout_summary
+
+
+@pytest.fixture
+def projects(tmp_path):
+    for name in ("api", "app-web", "app-cli", ".hidden"):
+        (tmp_path / name).mkdir()
+    (tmp_path / "app-notes.txt").write_text("not a project")
+    return tmp_path
+
+
+class TestMatchProjects:
+    def test_relative_glob(self, projects):
+        matched = match_projects("app-*", str(projects))
+        assert [p.name for p in matched] == ["app-cli", "app-web"]
+
+    def test_star_skips_files_and_hidden(self, projects):
+        assert [p.name for p in match_projects("*", str(projects))] == ["api", "app-cli", "app-web"]
+
+    def test_absolute_pattern(self, projects):
+        assert match_projects(str(projects / "ap?"), "/nonexistent") == [(projects / "api").resolve()]
+
+    def test_no_match(self, projects):
+        assert match_projects("nope-*", str(projects)) == []
+
+
+class TestFanOut:
+    @pytest.mark.asyncio
+    async def test_bounded_concurrency_and_order(self):
+        projects = [Path(f"/p/{i}") for i in range(6)]
+        active = 0
+        peak = 0
+        completed: list[str] = []
+
+        async def run(project: Path) -> ExecutionResult:
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01 * (6 - int(project.name)))
+            active -= 1
+            return ExecutionResult(stdout=project.name)
+
+        async def on_done(done) -> None:
+            completed.append(done.project.name)
+
+        results = await fan_out(projects, run, concurrency=2, on_done=on_done)
+
+        assert peak == 2
+        assert [r.result.stdout for r in results] == [str(i) for i in range(6)]
+        assert sorted(completed) == [str(i) for i in range(6)]
+
+    @pytest.mark.asyncio
+    async def test_failure_does_not_abort_others(self):
+        async def run(project: Path) -> ExecutionResult:
+            if project.name == "bad":
+                raise RuntimeError("boom")
+            return ExecutionResult(stdout="fine")
+
+        results = await fan_out([Path("/p/good"), Path("/p/bad")], run)
+
+        assert results[0].ok
+        assert not results[1].ok
+        assert results[1].result.stderr == "boom"
+
+    @pytest.mark.asyncio
+    async def test_summary_and_report(self):
+        async def run(project: Path) -> ExecutionResult:
+            if project.name == "b":
+                return ExecutionResult(stderr="fatal: not a git repository", exit_code=128)
+            return ExecutionResult(stdout="clean")
+
+        results = await fan_out([Path("/p/a"), Path("/p/b")], run)
+        summary = format_fanout_summary(results, "$ git status")
+        report = format_fanout_report(results, "$ git status")
+
+        assert "1/2 succeeded" in summary
+        assert "[OK] a" in summary and "[ERR(128)] b" in summary
+        assert "=== /p/a [OK] ===\nclean" in report
+        assert "--- stderr ---\nfatal: not a git repository" in report
@@ -2,11 +2,13 @@
 
 from __future__ import annotations
 
-from claudecode_terminal.storage.models import ExecutionResult
+from claudecode_terminal.storage.models import ExecutionResult, HistoryPage
 from claudecode_terminal.utils.formatting import (
     format_claude_result,
     format_duration,
+    format_history_page,
     format_shell_result,
+    format_stats,
     split_message,
 )
 
@@ -83,3 +85,39 @@ class TestFormatResults:
         output = format_shell_result(result, ":(){ :|:& };:")
         assert "Blocked" in output
         assert "Fork bomb" in output
+
+    def test_history_page(self):
+        page = HistoryPage(
+            rows=[
+                {"id": 9, "command": "make " + "x" * 60, "exit_code": 2, "execution_time_ms": 40},
+                {"id": 7, "command": "ls", "exit_code": 0, "execution_time_ms": 3},
+            ]
+        )
+        output = format_history_page(page, ["failed", "here"])
+        assert output.splitlines()[0] == "Your commands (failed, here):"
+        assert f"#9 [ERR(2)] make {'x' * 45}... (40ms)" in output
+        assert "#7 [OK] ls (3ms)" in output
+
+    def test_stats(self):
+        def row(runs: int, errors: int, **dims: str) -> dict:
+            return {
+                **dims,
+                "runs": runs,
+                "errors": errors,
+                "total_ms": 0,
+                "output_bytes": 2048,
+                "buckets": [runs] + [0] * 11,
+            }
+
+        output = format_stats(
+            "Stats | last week | you",
+            [row(12, 4)],
+            [row(11, 4, source="telegram", model=""), row(1, 0, source="claude", model="sonnet")],
+            [row(10, 3, program="pytest"), row(1, 1, program="make"), row(1, 0, program="ls")],
+        )
+        assert "12 runs, 4 failed (33%), p50 50ms, p95 95ms" in output
+        assert "Output: 2.0 KB" in output
+        assert "  shell: 11 runs" in output
+        assert "  claude sonnet: 1 runs" in output
+        assert output.endswith("Failing most:\n  pytest: 3 of 10 failed\n  make: 1 of 1 failed")
+        assert format_stats("Stats", [], [], []).endswith("No commands in this range.")
@@ -0,0 +1,141 @@
+"""Tests for background jobs (real sh processes)."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from claudecode_terminal.config import AppConfig, BotConfig, LoggingConfig, ShellConfig, StorageConfig
+from claudecode_terminal.services import jobs
+from claudecode_terminal.services.jobs import JobError, JobManager, tail_file
+from claudecode_terminal.storage.database import close_db, get_background_job, init_db, update_background_job
+
+
+@pytest.fixture
+def config(tmp_path):
+    return AppConfig(
+        bot=BotConfig(token="test"),
+        shell=ShellConfig(max_background_jobs=2),
+        storage=StorageConfig(db_path=str(tmp_path / "jobs.db"), jobs_dir=str(tmp_path / "spool")),
+        logging=LoggingConfig(),
+    )
+
+
+@pytest.fixture
+async def db(config):
+    await init_db(config.storage.db_path)
+    yield
+    await close_db()
+
+
+@pytest.fixture
+async def manager(config, db):
+    done: asyncio.Queue = asyncio.Queue()
+    manager = JobManager(config, notify=done.put)
+    manager.finished = done  # type: ignore[attr-defined]
+    yield manager
+    for job in await manager.list("1", limit=100):
+        await manager.cancel(job.id)
+    await manager.close()
+
+
+async def _wait_for(queue: asyncio.Queue):
+    return await asyncio.wait_for(queue.get(), timeout=10)
+
+
+class TestTailFile:
+    def test_last_lines(self, tmp_path):
+        path = tmp_path / "out.log"
+        path.write_text("".join(f"line {i}\n" for i in range(100)))
+        assert tail_file(str(path), lines=3) == "line 97\nline 98\nline 99"
+
+    def test_reads_only_the_end(self, tmp_path):
+        path = tmp_path / "out.log"
+        path.write_text("x" * 10_000 + "\nfirst\nsecond\n")
+        assert tail_file(str(path), lines=50, max_bytes=20) == "first\nsecond"
+
+    def test_empty(self, tmp_path):
+        path = tmp_path / "out.log"
+        path.write_text("")
+        assert tail_file(str(path)) == ""
+
+
+class TestJobManager:
+    @pytest.mark.asyncio
+    async def test_runs_detached_and_notifies(self, manager, tmp_path):
+        job = await manager.start("echo hello; echo oops >&2; exit 3", "1", str(tmp_path), chat_id=42)
+        finished = await _wait_for(manager.finished)
+
+        assert finished.id == job.id
+        assert finished.state == "failed"
+        assert finished.exit_code == 3
+        assert finished.chat_id == 42
+        assert tail_file(job.spool_path) == "hello\noops"
+
+        row = await get_background_job(job.id)
+        assert row["state"] == "failed"
+        assert row["bytes_out"] == len("hello\noops\n")
+        assert not job.exit_path.exists()
+
+    @pytest.mark.asyncio
+    async def test_output_is_readable_while_running(self, manager, tmp_path):
+        job = await manager.start("echo started; sleep 10", "1", str(tmp_path))
+        for _ in range(100):
+            if tail_file(job.spool_path):
+                break
+            await asyncio.sleep(0.02)
+        assert tail_file(job.spool_path) == "started"
+        assert (await manager.get(job.id, "1")).state == "running"
+        assert await manager.get(job.id, "2") is None
+
+    @pytest.mark.asyncio
+    async def test_kill(self, manager, tmp_path):
+        job = await manager.start("sleep 30", "1", str(tmp_path))
+        assert not await manager.cancel(job.id, "2")
+        assert await manager.cancel(job.id, "1")
+        finished = await _wait_for(manager.finished)
+        assert finished.state == "cancelled"
+        assert not await manager.cancel(job.id, "1")
+
+    @pytest.mark.asyncio
+    async def test_limits_and_blacklist(self, manager, tmp_path):
+        with pytest.raises(JobError, match="Blocked"):
+            await manager.start("rm -rf /", "1", str(tmp_path))
+        for _ in range(2):
+            await manager.start("sleep 30", "1", str(tmp_path))
+        with pytest.raises(JobError, match="already running"):
+            await manager.start("sleep 30", "1", str(tmp_path))
+        # Other users have their own allowance
+        await manager.start("true", "2", str(tmp_path))
+
+    @pytest.mark.asyncio
+    async def test_recovery_after_restart(self, config, db, tmp_path, monkeypatch):
+        monkeypatch.setattr(jobs, "POLL_INTERVAL", 0.05)
+        first = JobManager(config)
+        job = await first.start("sleep 0.5; echo late; exit 0", "1", str(tmp_path))
+        # The bot goes away; the job keeps running
+        await first.close()
+
+        done: asyncio.Queue = asyncio.Queue()
+        second = JobManager(config, notify=done.put)
+        assert await second.recover() == 1
+        finished = await _wait_for(done)
+        await second.close()
+
+        assert finished.id == job.id
+        assert finished.state == "done"
+        assert finished.exit_code == 0
+        assert tail_file(job.spool_path) == "late"
+
+    @pytest.mark.asyncio
+    async def test_vanished_job_is_lost(self, manager, tmp_path):
+        job = await manager.start("true", "1", str(tmp_path))
+        await _wait_for(manager.finished)
+        # Pretend the bot died before seeing the exit, and the exit file is gone
+        await update_background_job(job.id, state="running", finished_at=None)
+        assert await manager.recover() == 0
+        finished = await _wait_for(manager.finished)
+        assert finished.state == "lost"
+        assert finished.finished_at is not None and finished.finished_at <= time.time()
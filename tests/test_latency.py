@@ -0,0 +1,81 @@
+"""Tests for latency sketches and adaptive timeouts."""
+
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from claudecode_terminal.config import TimeoutsConfig
+from claudecode_terminal.services.latency import SKETCH_ALPHA, LatencySketch, LatencyTracker
+from claudecode_terminal.storage.database import close_db, init_db
+
+
+@pytest.fixture
+async def db(tmp_path):
+    await init_db(str(tmp_path / "latency.db"))
+    yield
+    await close_db()
+
+
+class TestLatencySketch:
+    def test_quantiles_within_relative_error(self):
+        rng = random.Random(7)
+        samples = sorted(rng.lognormvariate(8, 1) for _ in range(500))
+        sketch = LatencySketch()
+        for ms in samples:
+            sketch.add(ms)
+
+        for q in (0.5, 0.9, 0.99):
+            true = samples[int(q * len(samples)) - 1]
+            assert sketch.quantile(q) == pytest.approx(true, rel=3 * SKETCH_ALPHA)
+
+    def test_empty(self):
+        assert LatencySketch().quantile(0.5) is None
+
+    def test_old_runs_fade(self):
+        sketch = LatencySketch()
+        for _ in range(900):
+            sketch.add(100)
+        for _ in range(900):
+            sketch.add(10_000)
+        assert sketch.count <= 1000
+        assert sketch.quantile(0.5) == pytest.approx(10_000, rel=SKETCH_ALPHA)
+
+    def test_json_round_trip(self):
+        sketch = LatencySketch()
+        for ms in (10, 200, 3000):
+            sketch.add(ms)
+        restored = LatencySketch.from_json(sketch.to_json())
+        assert restored.buckets == sketch.buckets
+        assert restored.quantile(0.9) == sketch.quantile(0.9)
+
+
+class TestAdaptiveTimeout:
+    @pytest.mark.asyncio
+    async def test_default_until_enough_samples(self, db):
+        tracker = LatencyTracker()
+        config = TimeoutsConfig(adaptive=True, min_samples=5, factor=2.0)
+        for _ in range(4):
+            await tracker.observe("shell", "/p", "make", 10_000)
+        assert await tracker.timeout_for(config, "shell", "/p", "make", 30, (5, 600)) == 30
+
+        await tracker.observe("shell", "/p", "make", 10_000)
+        assert await tracker.timeout_for(config, "shell", "/p", "make", 30, (5, 600)) == pytest.approx(20, rel=0.05)
+
+    @pytest.mark.asyncio
+    async def test_bounded_and_disabled(self, db):
+        tracker = LatencyTracker()
+        for _ in range(20):
+            await tracker.observe("claude", "/p", "", 50)
+        bounded = TimeoutsConfig(adaptive=True, min_samples=1)
+        assert await tracker.timeout_for(bounded, "claude", "/p", "", 300, (60, 1800)) == 60
+        assert await tracker.timeout_for(TimeoutsConfig(), "claude", "/p", "", 300, (60, 1800)) == 300
+
+    @pytest.mark.asyncio
+    async def test_sketches_persist(self, db):
+        first = LatencyTracker()
+        for _ in range(3):
+            await first.observe("claude", "/p", "opus", 42_000)
+        assert await LatencyTracker().estimate_ms("claude", "/p", "opus") == pytest.approx(42_000, rel=SKETCH_ALPHA)
+        assert await LatencyTracker().estimate_ms("claude", "/p", "sonnet") is None
@@ -0,0 +1,120 @@
+"""Tests for per-execution resource limits."""
+
+from __future__ import annotations
+
+import asyncio
+import resource
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from claudecode_terminal.config import LimitsConfig
+from claudecode_terminal.services import limits as limits_mod
+from claudecode_terminal.services.limits import ResourceLimiter, _nice_for_weight
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cgroup_setup():
+    limits_mod.setup_cgroup_root.cache_clear()
+    yield
+    limits_mod.setup_cgroup_root.cache_clear()
+
+
+class TestLimitsResolution:
+    def test_source_then_user_overrides(self):
+        limiter = ResourceLimiter(
+            LimitsConfig(
+                memory_max_mb=512,
+                pids_max=100,
+                sources={"shell": {"memory_max_mb": 1024, "cpu_weight": 50}},
+                users={"42": {"memory_max_mb": 4096}},
+            )
+        )
+        shell = limiter.limits_for("1", "shell")
+        assert (shell.cpu_weight, shell.memory_max_mb, shell.pids_max) == (50, 1024, 100)
+        vip = limiter.limits_for("42", "shell")
+        assert (vip.cpu_weight, vip.memory_max_mb) == (50, 4096)
+        assert limiter.limits_for("1", "claude").memory_max_mb == 512
+
+    def test_nice_for_weight(self):
+        assert _nice_for_weight(100) == 0
+        assert _nice_for_weight(1000) == 0
+        assert 0 < _nice_for_weight(50) < _nice_for_weight(10) <= 19
+
+
+class TestSandbox:
+    def test_disabled_is_a_no_op(self):
+        sandbox = ResourceLimiter(LimitsConfig(enabled=False, memory_max_mb=64)).prepare("1", "shell")
+        assert sandbox.preexec_fn is None and sandbox.cgroup is None
+
+    @pytest.mark.asyncio
+    async def test_rlimit_fallback(self):
+        limiter = ResourceLimiter(LimitsConfig(enabled=True, memory_max_mb=256))
+        with patch.object(limits_mod, "_own_cgroup", return_value=None):
+            sandbox = limiter.prepare("1", "shell")
+        assert sandbox.cgroup is None
+        proc = await asyncio.create_subprocess_exec(
+            "sh", "-c", "ulimit -d", stdout=asyncio.subprocess.PIPE, preexec_fn=sandbox.preexec_fn
+        )
+        stdout, _ = await proc.communicate()
+        assert int(stdout) == 256 * 1024  # KiB
+        usage = await sandbox.release()
+        assert usage.peak_memory_bytes is None and usage.cpu_time_ms is None
+
+    @pytest.mark.asyncio
+    async def test_rlimit_fallback_counts_the_uids_processes(self, monkeypatch):
+        monkeypatch.setattr(limits_mod, "_own_cgroup", lambda: None)
+        limiter = ResourceLimiter(LimitsConfig(enabled=True, pids_max=64))
+        running = limits_mod._uid_tasks()
+        assert running is not None and running >= 1
+
+        monkeypatch.setattr(limits_mod, "_uid_tasks", lambda: 1000)
+        assert limits_mod._nproc_limit(64) == min(1064, resource.getrlimit(resource.RLIMIT_NPROC)[1])
+        sandbox = limiter.prepare("1", "shell")
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-c",
+            "import resource; print(resource.getrlimit(resource.RLIMIT_NPROC)[0])",
+            stdout=asyncio.subprocess.PIPE,
+            preexec_fn=sandbox.preexec_fn,
+        )
+        stdout, _ = await proc.communicate()
+        assert int(stdout) == limits_mod._nproc_limit(64)
+
+        # Without /proc the uid's count is unknown, so no process limit is set
+        monkeypatch.setattr(limits_mod, "_uid_tasks", lambda: None)
+        assert limits_mod._nproc_limit(64) is None
+
+    @pytest.mark.asyncio
+    async def test_cgroup_job_lifecycle(self, tmp_path, monkeypatch):
+        # A plain directory stands in for a delegated cgroup v2 subtree
+        root = tmp_path / "cg"
+        root.mkdir()
+        (root / "cgroup.controllers").write_text("cpuset cpu io memory pids\n")
+        stale = root / "job-1-deadbeef"
+        stale.mkdir()
+        monkeypatch.setattr(limits_mod, "RELEASE_RETRIES", 1)
+
+        limiter = ResourceLimiter(
+            LimitsConfig(enabled=True, cgroup_root=str(root), cpu_weight=50, memory_max_mb=128, pids_max=64)
+        )
+        sandbox = limiter.prepare("1", "claude")
+
+        assert (root / "cgroup.subtree_control").read_text() == "+cpu +memory +pids"
+        assert not stale.exists()
+        assert sandbox.cgroup is not None and sandbox.cgroup.parent == root
+        assert (sandbox.cgroup / "cpu.weight").read_text() == "50"
+        assert (sandbox.cgroup / "memory.max").read_text() == str(128 * 1024 * 1024)
+        assert (sandbox.cgroup / "pids.max").read_text() == "64"
+
+        (sandbox.cgroup / "cgroup.procs").write_text("")
+        proc = await asyncio.create_subprocess_exec("true", preexec_fn=sandbox.preexec_fn)
+        await proc.wait()
+        assert (sandbox.cgroup / "cgroup.procs").read_text() == "0"
+
+        (sandbox.cgroup / "memory.peak").write_text("1048576\n")
+        (sandbox.cgroup / "cpu.stat").write_text("usage_usec 250000\nuser_usec 200000\n")
+        usage = await sandbox.release()
+        assert usage.peak_memory_bytes == 1048576
+        assert usage.cpu_time_ms == 250
@@ -0,0 +1,161 @@
+"""Tests for history retention, monthly archives and compaction."""
+
+from __future__ import annotations
+
+import calendar
+import os
+import sqlite3
+
+import pytest
+
+from claudecode_terminal.config import StorageConfig
+from claudecode_terminal.storage.database import (
+    close_db,
+    flush_history,
+    get_db,
+    history_size,
+    init_db,
+    save_command,
+    search_commands,
+)
+from claudecode_terminal.storage.maintenance import HistoryMaintenance, archive_path, list_archives
+
+# 2024-06-15 12:00:00 UTC
+NOW = calendar.timegm((2024, 6, 15, 12, 0, 0))
+
+
+@pytest.fixture
+async def storage(tmp_path):
+    config = StorageConfig(db_path=str(tmp_path / "history.db"), prune_batch=2)
+    await init_db(config.db_path)
+    yield config
+    await close_db()
+
+
+async def _add(command: str, created_at: str, stdout: str = "") -> None:
+    await save_command("1", command, stdout, "", 0, 5)
+    await flush_history()
+    db = await get_db()
+    await db.execute("UPDATE commands SET created_at = ? WHERE id = (SELECT MAX(id) FROM commands)", (created_at,))
+    await db.commit()
+
+
+async def _commands() -> list[str]:
+    db = await get_db()
+    cursor = await db.execute("SELECT command FROM commands ORDER BY id")
+    return [row[0] for row in await cursor.fetchall()]
+
+
+async def _count(table: str) -> int:
+    db = await get_db()
+    cursor = await db.execute(f"SELECT COUNT(*) FROM {table}")
+    return (await cursor.fetchone())[0]
+
+
+class TestRetention:
+    @pytest.mark.asyncio
+    async def test_max_age(self, storage):
+        storage.retention_days = 30
+        for i in range(5):
+            await _add(f"old {i}", "2024-04-01 00:00:00", stdout=f"old output {i}\n")
+        await _add("recent", "2024-06-01 00:00:00", stdout="kept\n")
+
+        done = await HistoryMaintenance(storage).run(now=NOW)
+
+        assert done["deleted"] == 5
+        assert await _commands() == ["recent"]
+        assert await _count("outputs") == 1
+        assert (await search_commands("old"))[0] == []
+
+    @pytest.mark.asyncio
+    async def test_max_rows_keeps_newest(self, storage):
+        storage.retention_rows = 3
+        for i in range(8):
+            await _add(f"cmd {i}", "2024-06-01 00:00:00")
+
+        maintenance = HistoryMaintenance(storage)
+        assert (await maintenance.run(now=NOW))["deleted"] == 5
+        assert await _commands() == ["cmd 5", "cmd 6", "cmd 7"]
+        assert (await maintenance.run(now=NOW))["deleted"] == 0
+        assert maintenance.stats()["runs"] == 2
+
+    @pytest.mark.asyncio
+    async def test_max_size_and_compaction(self, storage):
+        for i in range(200):
+            # Random hex barely compresses, so each row costs real pages
+            await _add(f"build {i}", "2024-06-01 00:00:00", stdout=os.urandom(8192).hex())
+        assert (await history_size())["used_bytes"] > 1024 * 1024
+
+        storage.retention_mb = 1
+        done = await HistoryMaintenance(storage).run(now=NOW)
+
+        assert done["deleted"] > 0
+        assert done["released_bytes"] > 0
+        size = await history_size()
+        assert size["used_bytes"] <= 1024 * 1024
+        assert size["free_bytes"] == 0
+        assert (await _commands())[-1] == "build 199"
+
+    @pytest.mark.asyncio
+    async def test_older_database_is_converted_to_incremental_vacuum(self, tmp_path):
+        db_path = tmp_path / "old.db"
+        with sqlite3.connect(db_path) as db:
+            db.execute("CREATE TABLE legacy (x)")
+        await init_db(str(db_path))
+        for i in range(50):
+            await _add(f"build {i}", "2024-06-01 00:00:00", stdout=os.urandom(8192).hex())
+        storage = StorageConfig(db_path=str(db_path), retention_rows=5, prune_batch=100)
+        try:
+            done = await HistoryMaintenance(storage).run(now=NOW)
+            db = await get_db()
+            assert (await (await db.execute("PRAGMA auto_vacuum")).fetchone())[0] == 2
+            assert done["released_bytes"] > 0
+            assert (await history_size())["free_bytes"] == 0
+        finally:
+            await close_db()
+
+    @pytest.mark.asyncio
+    async def test_nothing_configured_only_compacts(self, storage):
+        await _add("ls", "2020-01-01 00:00:00")
+        done = await HistoryMaintenance(storage).run(now=NOW)
+        assert done == {"deleted": 0, "archived": 0, "expired_archives": 0, "released_bytes": 0}
+        assert await _commands() == ["ls"]
+
+
+class TestMonthlyPartitions:
+    @pytest.mark.asyncio
+    async def test_old_months_move_to_archives(self, storage):
+        storage.partition_monthly = True
+        await _add("march", "2024-03-31 23:59:59", stdout="shared output\n")
+        await _add("april a", "2024-04-01 00:00:00", stdout="shared output\n")
+        await _add("april b", "2024-04-20 00:00:00")
+        await _add("may", "2024-05-02 00:00:00", stdout="shared output\n")
+        await _add("june", "2024-06-10 00:00:00")
+
+        done = await HistoryMaintenance(storage).run(now=NOW)
+
+        assert done["archived"] == 3
+        assert await _commands() == ["may", "june"]
+        assert [month for month, _ in list_archives(storage.db_path)] == ["2024-03", "2024-04"]
+        with sqlite3.connect(archive_path(storage.db_path, "2024-04")) as archive:
+            rows = archive.execute("SELECT command, stdout_hash FROM commands ORDER BY id").fetchall()
+            assert [r[0] for r in rows] == ["april a", "april b"]
+            assert archive.execute("SELECT COUNT(*) FROM outputs WHERE hash = ?", (rows[0][1],)).fetchone()[0] == 1
+        # Still referenced by "may"
+        assert await _count("outputs") == 1
+
+    @pytest.mark.asyncio
+    async def test_expiry_unlinks_whole_months(self, storage):
+        storage.partition_monthly = True
+        await _add("march", "2024-03-10 00:00:00")
+        await _add("april", "2024-04-10 00:00:00")
+        maintenance = HistoryMaintenance(storage)
+        await maintenance.run(now=NOW)
+
+        # 2024-06-15 minus 60 days is 2024-04-16: March is over, April is not
+        storage.retention_days = 60
+        done = await maintenance.run(now=NOW)
+
+        assert done["expired_archives"] == 1
+        assert [month for month, _ in list_archives(storage.db_path)] == ["2024-04"]
+        assert not archive_path(storage.db_path, "2024-03").exists()
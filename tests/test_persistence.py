@@ -0,0 +1,114 @@
+"""Tests for the SQLite-backed bot persistence."""
+
+from __future__ import annotations
+
+import pytest
+
+from claudecode_terminal.bot import persistence as persistence_module
+from claudecode_terminal.bot.persistence import SQLitePersistence
+from claudecode_terminal.storage.database import close_db, init_db, load_user_state
+
+
+@pytest.fixture
+async def db(tmp_path):
+    await init_db(str(tmp_path / "history.db"))
+    yield
+    await close_db()
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Batches handed to save_user_state."""
+    batches: list[list[tuple]] = []
+    save = persistence_module.save_user_state
+
+    async def recording(changes):
+        batches.append(sorted(changes))
+        await save(changes)
+
+    monkeypatch.setattr(persistence_module, "save_user_state", recording)
+    return batches
+
+
+class TestSQLitePersistence:
+    @pytest.mark.asyncio
+    async def test_survives_restart(self, db):
+        persistence = SQLitePersistence()
+        assert await persistence.get_user_data() == {}
+        await persistence.update_user_data(1, {"project": "/srv/app", "max_turns": 5})
+        await persistence.update_user_data(2, {"model": "opus", "system_prompt": "Be brief"})
+        await persistence.flush()
+
+        restarted = await SQLitePersistence().get_user_data()
+        assert restarted == {
+            1: {"project": "/srv/app", "max_turns": 5},
+            2: {"model": "opus", "system_prompt": "Be brief"},
+        }
+
+    @pytest.mark.asyncio
+    async def test_only_changed_keys_are_written(self, db, writes):
+        persistence = SQLitePersistence()
+        await persistence.get_user_data()
+        await persistence.update_user_data(1, {"project": "/srv/app", "model": "opus"})
+        await persistence.flush()
+        await persistence.update_user_data(1, {"project": "/srv/app", "model": "sonnet"})
+        await persistence.flush()
+        await persistence.update_user_data(1, {"project": "/srv/app", "model": "sonnet"})
+        await persistence.flush()
+
+        assert writes == [
+            [(1, "model", '"opus"'), (1, "project", '"/srv/app"')],
+            [(1, "model", '"sonnet"')],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_one_round_is_one_batch(self, db, writes):
+        persistence = SQLitePersistence()
+        await persistence.get_user_data()
+        for user_id in range(20):
+            await persistence.update_user_data(user_id, {"model": "haiku"})
+        await persistence.flush()
+
+        assert len(writes) == 1
+        assert len(await load_user_state()) == 20
+
+    @pytest.mark.asyncio
+    async def test_removed_keys_and_dropped_users(self, db):
+        persistence = SQLitePersistence()
+        await persistence.get_user_data()
+        await persistence.update_user_data(1, {"project": "/srv/app", "system_prompt": "Be brief"})
+        await persistence.update_user_data(2, {"model": "opus"})
+        await persistence.flush()
+
+        await persistence.update_user_data(1, {"project": "/srv/app"})
+        await persistence.drop_user_data(2)
+        await persistence.flush()
+
+        assert await load_user_state() == {1: {"project": '"/srv/app"'}}
+
+    @pytest.mark.asyncio
+    async def test_unserializable_values_stay_in_memory(self, db):
+        persistence = SQLitePersistence()
+        await persistence.get_user_data()
+        await persistence.update_user_data(1, {"model": "opus", "task": object()})
+        await persistence.flush()
+
+        assert await SQLitePersistence().get_user_data() == {1: {"model": "opus"}}
+
+    @pytest.mark.asyncio
+    async def test_failed_write_is_retried(self, db, monkeypatch):
+        save = persistence_module.save_user_state
+
+        async def failing(changes):
+            raise OSError("disk full")
+
+        persistence = SQLitePersistence()
+        await persistence.get_user_data()
+        monkeypatch.setattr(persistence_module, "save_user_state", failing)
+        await persistence.update_user_data(1, {"model": "opus"})
+        await persistence.flush()
+        assert await load_user_state() == {}
+
+        monkeypatch.setattr(persistence_module, "save_user_state", save)
+        await persistence.flush()
+        assert await load_user_state() == {1: {"model": '"opus"'}}
@@ -0,0 +1,78 @@
+"""Tests for process-group termination and the running-job registry."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from claudecode_terminal.services.process import ProcessRegistry, group_alive, reap_group, terminate_group
+
+
+async def _spawn(script: str) -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+        "sh",
+        "-c",
+        script,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+class TestTerminateGroup:
+    @pytest.mark.asyncio
+    async def test_kills_grandchildren(self):
+        proc = await _spawn("sleep 30 & sleep 30 & wait")
+        await asyncio.sleep(0.1)
+        assert group_alive(proc.pid)
+
+        await terminate_group(proc, grace=1.0)
+
+        assert proc.returncode is not None
+        assert not group_alive(proc.pid)
+
+    @pytest.mark.asyncio
+    async def test_escalates_to_sigkill(self):
+        proc = await _spawn("trap '' TERM; sleep 30 & wait; sleep 30")
+        await asyncio.sleep(0.1)
+
+        await terminate_group(proc, grace=0.2)
+
+        assert proc.returncode == -9
+        assert not group_alive(proc.pid)
+
+    @pytest.mark.asyncio
+    async def test_reap_cleans_up_after_leader_exit(self):
+        proc = await _spawn("sleep 30 &")
+        await proc.wait()
+        await asyncio.sleep(0.05)
+        assert group_alive(proc.pid)
+
+        assert await reap_group(proc, grace=1.0)
+        assert not group_alive(proc.pid)
+
+
+class TestProcessRegistry:
+    @pytest.mark.asyncio
+    async def test_cancel_own_job(self):
+        registry = ProcessRegistry()
+        proc = await _spawn("sleep 30")
+        with registry.track("1", "sleep", proc) as entry:
+            assert [e.id for e in registry.list("1")] == [entry.id]
+            assert not await registry.cancel(entry.id, user_id="2")
+            assert await registry.cancel(entry.id, user_id="1")
+            assert entry.cancelled
+        assert proc.returncode is not None
+        assert len(registry) == 0
+
+    @pytest.mark.asyncio
+    async def test_cancel_all_for_user(self):
+        registry = ProcessRegistry()
+        mine, theirs = await _spawn("sleep 30"), await _spawn("sleep 30")
+        with registry.track("1", "a", mine), registry.track("2", "b", theirs):
+            assert await registry.cancel_all("1") == 1
+            assert mine.returncode is not None
+            assert theirs.returncode is None
+            await registry.cancel_all()
+        assert theirs.returncode is not None
@@ -0,0 +1,112 @@
+"""Tests for the command stats rollups."""
+
+from __future__ import annotations
+
+import calendar
+
+import pytest
+
+from claudecode_terminal.storage.database import (
+    backfill_stats,
+    close_db,
+    flush_history,
+    get_db,
+    get_stats,
+    init_db,
+    save_command,
+    stats_backlog,
+)
+from claudecode_terminal.storage.rollups import latency_quantile, range_start, summarize
+
+
+@pytest.fixture
+async def db(tmp_path):
+    await init_db(str(tmp_path / "history.db"))
+    yield
+    await close_db()
+
+
+async def _seed() -> None:
+    for i in range(10):
+        await save_command("1", f"pytest -k case{i}", "x" * 100, "", 1 if i < 3 else 0, 50 * i + 10)
+    await save_command("2", "  make build", "", "boom", 2, 4000)
+    await save_command("1", "explain this", "answer", "", 0, 12_000, source="claude", model="sonnet", project="/p")
+    await flush_history()
+
+
+class TestRollups:
+    @pytest.mark.asyncio
+    async def test_history_writer_keeps_rollups_current(self, db):
+        await _seed()
+
+        [total] = await get_stats("2000-01-01")
+        assert (total["runs"], total["errors"], total["output_bytes"]) == (12, 4, 1010)
+        assert total["total_ms"] == sum(50 * i + 10 for i in range(10)) + 4000 + 12_000
+        assert sum(total["buckets"]) == 12
+
+        hourly = await get_stats("2000-01-01 00:00", period="hour")
+        assert hourly[0]["runs"] == 12
+
+        by_kind = await get_stats("2000-01-01", group_by=("source", "model"))
+        assert [(r["source"], r["model"], r["runs"]) for r in by_kind] == [
+            ("telegram", "", 11),
+            ("claude", "sonnet", 1),
+        ]
+
+        by_program = await get_stats("2000-01-01", group_by=("program",), source="telegram")
+        assert {r["program"]: (r["runs"], r["errors"]) for r in by_program} == {"pytest": (10, 3), "make": (1, 1)}
+
+        assert [r["runs"] for r in await get_stats("2000-01-01", user_id="2")] == [1]
+        assert await get_stats("2999-01-01") == []
+
+    @pytest.mark.asyncio
+    async def test_backfill_counts_each_row_once(self, db):
+        await _seed()
+        # As if every row predates the rollups
+        conn = await get_db()
+        await conn.execute("DELETE FROM command_stats")
+        await conn.execute("DELETE FROM commands WHERE id BETWEEN 4 AND 6")
+        await conn.execute("UPDATE command_stats_backfill SET below_id = 100")
+        await conn.commit()
+        assert await stats_backlog() == 9
+
+        assert await backfill_stats(batch=2) == 9
+        assert await stats_backlog() == 0
+        assert await backfill_stats() == 0
+        [total] = await get_stats("2000-01-01")
+        assert total["runs"] == 9
+
+        await save_command("1", "ls", "", "", 0, 5)
+        await flush_history()
+        assert (await get_stats("2000-01-01"))[0]["runs"] == 10
+
+    @pytest.mark.asyncio
+    async def test_invalid_grouping(self, db):
+        with pytest.raises(ValueError):
+            await get_stats("2000-01-01", group_by=("command",))
+        with pytest.raises(ValueError):
+            await get_stats("2000-01-01", period="week")
+
+
+class TestLatency:
+    def test_quantiles_interpolate_within_buckets(self):
+        # 10 runs under 100ms, 10 between 100 and 250ms
+        buckets = [10, 10] + [0] * 10
+        assert latency_quantile(buckets, 0.5) == 100
+        assert latency_quantile(buckets, 0.75) == 175
+        assert latency_quantile([0] * 12, 0.5) is None
+        # Past the last bound only the lower bound is known
+        assert latency_quantile([0] * 11 + [3], 0.95) == 300_000
+
+    def test_summarize(self):
+        row = {"runs": 4, "errors": 1, "total_ms": 400, "output_bytes": 10, "buckets": [4] + [0] * 11}
+        summary = summarize(row)
+        assert summary["error_rate"] == 0.25
+        assert summary["avg_ms"] == 100
+        assert summary["p50_ms"] == 50
+
+    def test_range_start(self):
+        now = calendar.timegm((2024, 6, 15, 12, 30, 0))
+        assert range_start("day", now) == ("hour", "2024-06-14 13:00")
+        assert range_start("week", now) == ("day", "2024-06-09")
+        assert range_start("month", now) == ("day", "2024-05-17")
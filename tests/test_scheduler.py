@@ -0,0 +1,124 @@
+"""Tests for the job scheduler."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from claudecode_terminal.services.scheduler import JobScheduler, QueueFullError
+
+
+async def _hold(gate: asyncio.Event, log: list[str], name: str) -> str:
+    log.append(name)
+    await gate.wait()
+    return name
+
+
+class TestJobScheduler:
+    @pytest.mark.asyncio
+    async def test_runs_immediately_when_idle(self):
+        scheduler = JobScheduler(workers=2)
+
+        async def job() -> int:
+            return 42
+
+        assert await scheduler.submit("u1", "p", job) == 42
+        stats = scheduler.stats()
+        assert stats["completed"] == 1
+        assert stats["running"] == 0
+
+    @pytest.mark.asyncio
+    async def test_global_worker_limit_and_position(self):
+        scheduler = JobScheduler(workers=1, per_user=5, per_project=5)
+        gate = asyncio.Event()
+        started: list[str] = []
+        positions: list[int] = []
+
+        async def on_queued(pos: int) -> None:
+            positions.append(pos)
+
+        first = asyncio.create_task(scheduler.submit("u1", "p", lambda: _hold(gate, started, "a")))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(scheduler.submit("u2", "p", lambda: _hold(gate, started, "b"), on_queued))
+        await asyncio.sleep(0)
+        assert started == ["a"]
+        assert positions == [1]
+        assert scheduler.queued == 1
+
+        gate.set()
+        assert await asyncio.gather(first, second) == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_round_robin_across_users(self):
+        scheduler = JobScheduler(workers=1, per_user=5, per_project=5)
+        gate = asyncio.Event()
+        order: list[str] = []
+
+        async def job(name: str) -> str:
+            order.append(name)
+            await gate.wait()
+            return name
+
+        blocker = asyncio.create_task(scheduler.submit("u0", "p", lambda: job("block")))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(scheduler.submit(user, "p", lambda n=name: job(n)))
+            for user, name in [("u1", "a1"), ("u1", "a2"), ("u1", "a3"), ("u2", "b1")]
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+        assert order == ["block", "a1", "b1", "a2", "a3"]
+
+    @pytest.mark.asyncio
+    async def test_per_project_cap(self):
+        scheduler = JobScheduler(workers=4, per_user=4, per_project=1)
+        gate = asyncio.Event()
+        started: list[str] = []
+
+        tasks = [
+            asyncio.create_task(scheduler.submit("u1", "same", lambda: _hold(gate, started, "a"))),
+            asyncio.create_task(scheduler.submit("u2", "same", lambda: _hold(gate, started, "b"))),
+            asyncio.create_task(scheduler.submit("u3", "other", lambda: _hold(gate, started, "c"))),
+        ]
+        await asyncio.sleep(0)
+        assert sorted(started) == ["a", "c"]
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert sorted(started) == ["a", "b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_queue_full(self):
+        scheduler = JobScheduler(workers=1, max_queue=1)
+        gate = asyncio.Event()
+        started: list[str] = []
+
+        running = asyncio.create_task(scheduler.submit("u1", "p", lambda: _hold(gate, started, "a")))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler.submit("u2", "p", lambda: _hold(gate, started, "b")))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await scheduler.submit("u3", "p", lambda: _hold(gate, started, "c"))
+        assert scheduler.stats()["rejected"] == 1
+        gate.set()
+        await asyncio.gather(running, waiting)
+
+    @pytest.mark.asyncio
+    async def test_cancel_while_queued(self):
+        scheduler = JobScheduler(workers=1)
+        gate = asyncio.Event()
+        started: list[str] = []
+
+        running = asyncio.create_task(scheduler.submit("u1", "p", lambda: _hold(gate, started, "a")))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler.submit("u2", "p", lambda: _hold(gate, started, "b")))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert scheduler.queued == 0
+        gate.set()
+        await running
+        assert started == ["a"]
+        assert scheduler.running == 0
@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
+import pytest
+
 from claudecode_terminal.bot.security import BlacklistChecker
+from claudecode_terminal.config import PolicyConfig
 
 
 class TestBlacklist:
@@ -53,3 +56,95 @@ class TestBlacklist:
     def test_safe_echo_allowed(self):
         blocked, _ = self.checker.check("echo hello world")
         assert not blocked
+
+
+class TestCommandParsing:
+    def setup_method(self):
+        self.checker = BlacklistChecker()
+
+    @pytest.mark.parametrize(
+        "command",
+        [
+            "sudo rm -rf /",
+            "rm -rf / --no-preserve-root",
+            "env vim file.txt",
+            "cd src && vim main.py",
+            "git log | less",
+            "FOO=1 /usr/bin/vim a",
+            "sudo -u root nice -n 5 timeout -s KILL 5 htop",
+            'echo "$(nano)"',
+            "echo `top`",
+            "(cd /tmp; ssh host)",
+            "'vim' a",
+            "sudo -i",
+            "python3.12 script.py",
+            "eval vim",
+            "eval 'rm -rf /'",
+            "eval 'eval \"sudo vim\"'",
+            "eval eval eval eval eval ls",
+            "watch -n 5 'ssh host'",
+            "exec -a x vim",
+            "setsid -f vim",
+            "chroot / vim",
+            "chroot --userspec=1000:1000 /srv vim",
+            "ionice -c 3 vim",
+            "chrt -f 10 htop",
+            "taskset -c 0-3 top",
+        ],
+    )
+    def test_bypasses_blocked(self, command):
+        blocked, _ = self.checker.check(command)
+        assert blocked
+
+    @pytest.mark.parametrize(
+        "command",
+        [
+            "rm -rf ./build",
+            "rm -rf *",
+            "echo vim",
+            "echo '$(vim)'",
+            "grep -rn mkfs docs",
+            "command -v vim",
+            "make test 2>&1 | tee log",
+            "ls > vim",
+            "eval echo vim",
+            "watch -n 1 'ls -l'",
+            "chroot /srv/vim ls",
+            "taskset 0x3 make -j2",
+        ],
+    )
+    def test_arguments_are_not_programs(self, command):
+        blocked, _ = self.checker.check(command)
+        assert not blocked
+
+    def test_decisions_are_memoized(self):
+        for _ in range(3):
+            self.checker.check("git status")
+        info = self.checker.cache_info()
+        assert info.misses == 1
+        assert info.hits == 2
+
+
+class TestPolicyRules:
+    def setup_method(self):
+        self.checker = BlacklistChecker()
+        self.policy = PolicyConfig(
+            allow=["python3"],
+            deny=["docker"],
+            users={"7": {"allow": ["vim"], "deny": ["python3"]}},
+        )
+
+    def test_global_allow_and_deny(self):
+        assert self.checker.check("python3 script.py", "1", self.policy) == (False, "")
+        blocked, reason = self.checker.check("sudo docker ps", "1", self.policy)
+        assert blocked
+        assert "docker" in reason
+
+    def test_user_overrides(self):
+        assert self.checker.check("vim notes.txt", "7", self.policy) == (False, "")
+        assert self.checker.check("python3 script.py", "7", self.policy)[0]
+        assert self.checker.check("vim notes.txt", "1", self.policy)[0]
+
+    def test_allow_does_not_lift_argument_rules(self):
+        policy = PolicyConfig(allow=["rm"])
+        assert self.checker.check("rm -rf /", "1", policy)[0]
@@ -3,11 +3,23 @@
 from __future__ import annotations
 
 import asyncio
-from unittest.mock import AsyncMock, MagicMock, patch
+import gzip
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
-from claudecode_terminal.config import AppConfig, BotConfig, ClaudeConfig, ShellConfig, StorageConfig, LoggingConfig
+from claudecode_terminal.config import (
+    AppConfig,
+    BotConfig,
+    ClaudeConfig,
+    LoggingConfig,
+    ShellConfig,
+    StorageConfig,
+    TimeoutsConfig,
+)
+from claudecode_terminal.services.latency import LatencySketch, LatencyTracker
+from claudecode_terminal.services.process import process_registry
 from claudecode_terminal.services.shell import ShellRunner
 
 
@@ -42,10 +54,8 @@ class TestShellRunner:
         assert result.blocked
 
     @pytest.mark.asyncio
-    async def test_execute_success(self, runner, shell_config):
-        mock_proc = AsyncMock()
-        mock_proc.communicate = AsyncMock(return_value=(b"file1.txt\nfile2.txt\n", b""))
-        mock_proc.returncode = 0
+    async def test_execute_success(self, runner, shell_config, fake_process):
+        mock_proc = fake_process(stdout=b"file1.txt\nfile2.txt\n")
 
         with patch("claudecode_terminal.services.shell.asyncio.create_subprocess_shell", return_value=mock_proc):
             with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
@@ -54,16 +64,32 @@ class TestShellRunner:
         assert "file1.txt" in result.stdout
 
     @pytest.mark.asyncio
-    async def test_execute_timeout(self, runner, shell_config):
-        mock_proc = AsyncMock()
-        mock_proc.communicate = AsyncMock(side_effect=[asyncio.TimeoutError, (b"", b"")])
-        mock_proc.kill = MagicMock()
+    async def test_execute_streams_output(self, runner, shell_config, fake_process):
+        mock_proc = fake_process(stdout=b"collected 3 items\n", stderr=b"warning\n")
+        chunks: list[str] = []
+
+        async def on_output(text: str) -> None:
+            chunks.append(text)
+
+        with patch("claudecode_terminal.services.shell.asyncio.create_subprocess_shell", return_value=mock_proc):
+            with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
+                result = await runner.execute(
+                    "pytest", user_id="123", cwd=shell_config.claude.default_project, on_output=on_output
+                )
+        assert sorted(chunks) == ["collected 3 items\n", "warning\n"]
+        assert result.stdout == "collected 3 items\n"
+
+    @pytest.mark.asyncio
+    async def test_execute_timeout(self, runner, shell_config, fake_process):
+        shell_config.shell.timeout = 0.1
+        mock_proc = fake_process(stdout=b"step 1 done\n", hang=True)
 
         with patch("claudecode_terminal.services.shell.asyncio.create_subprocess_shell", return_value=mock_proc):
             with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
                 result = await runner.execute("sleep 100", user_id="123", cwd=shell_config.claude.default_project)
         assert result.exit_code == -1
         assert "timed out" in result.stderr.lower()
+        assert "step 1 done" in result.stdout
 
     @pytest.mark.asyncio
     async def test_execute_shell_disabled(self, shell_config):
@@ -74,14 +100,158 @@ class TestShellRunner:
         assert "disabled" in result.reason.lower()
 
     @pytest.mark.asyncio
-    async def test_safe_command_not_blocked(self, runner):
+    async def test_safe_command_not_blocked(self, runner, fake_process):
         # This won't actually execute - just verifying the blacklist doesn't block it
-        mock_proc = AsyncMock()
-        mock_proc.communicate = AsyncMock(return_value=(b"ok", b""))
-        mock_proc.returncode = 0
+        mock_proc = fake_process(stdout=b"ok")
 
         with patch("claudecode_terminal.services.shell.asyncio.create_subprocess_shell", return_value=mock_proc):
             with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
                 result = await runner.execute("git status", user_id="123")
         assert not result.blocked
         assert result.exit_code == 0
+
+    @pytest.mark.asyncio
+    async def test_large_output_is_truncated(self, runner, shell_config, fake_process):
+        shell_config.claude.max_output = 100
+        shell_config.storage.spill_output = True
+        shell_config.storage.spill_dir = str(shell_config.claude.default_project) + "/spill"
+        mock_proc = fake_process(stdout=b"A" * 50 + b"B" * 10000 + b"C" * 50)
+
+        with patch("claudecode_terminal.services.shell.asyncio.create_subprocess_shell", return_value=mock_proc):
+            with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
+                result = await runner.execute("cat big.log", user_id="123")
+        assert result.output_bytes == 10100
+        assert result.truncated_bytes == 10000
+        assert result.stdout.startswith("A" * 50)
+        assert result.stdout.endswith("C" * 50)
+        assert "10000 bytes truncated" in result.stdout
+
+        with gzip.open(result.spill_path, "rb") as f:
+            assert len(f.read()) == 10100
+
+
+class TestShellCoalescing:
+    @pytest.mark.asyncio
+    async def test_identical_read_only_commands_share_a_process(self, runner, fake_process):
+        spawn = AsyncMock(side_effect=lambda *a, **kw: fake_process(stdout=b"On branch main\n"))
+
+        async def slow_spawn(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return await spawn(*args, **kwargs)
+
+        with patch("claudecode_terminal.services.shell.asyncio.create_subprocess_shell", side_effect=slow_spawn):
+            with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock) as save:
+                first, second = await asyncio.gather(
+                    runner.execute("git status", user_id="1"),
+                    runner.execute("git status", user_id="2"),
+                )
+
+        assert spawn.await_count == 1
+        assert first.stdout == second.stdout == "On branch main\n"
+        assert not first.coalesced and second.coalesced
+        # Each caller still gets its own history row
+        assert save.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_mutating_commands_are_not_coalesced_by_default(self, runner, fake_process):
+        spawn = AsyncMock(side_effect=lambda *a, **kw: fake_process(stdout=b"ok\n"))
+
+        with patch("claudecode_terminal.services.shell.asyncio.create_subprocess_shell", new=spawn):
+            with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
+                await asyncio.gather(runner.execute("git pull", user_id="1"), runner.execute("git pull", user_id="2"))
+
+        assert spawn.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_mutating_commands_coalesce_when_enabled(self, runner, shell_config, fake_process):
+        shell_config.shell.coalesce_mutating = True
+        spawn = AsyncMock(side_effect=lambda *a, **kw: fake_process(stdout=b"ok\n"))
+
+        async def slow_spawn(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return await spawn(*args, **kwargs)
+
+        with patch("claudecode_terminal.services.shell.asyncio.create_subprocess_shell", side_effect=slow_spawn):
+            with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
+                await asyncio.gather(runner.execute("git pull", user_id="1"), runner.execute("git pull", user_id="2"))
+
+        assert spawn.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelling_the_leader_reruns_for_followers(self, runner, shell_config, tmp_path):
+        shell_config.shell.coalesce_mutating = True
+        flag = tmp_path / "go"
+        command = f"while [ ! -e {flag} ]; do sleep 0.02; done; echo done"
+
+        async def cancel_leader():
+            while not process_registry.list("1"):
+                await asyncio.sleep(0.01)
+            await process_registry.cancel(process_registry.list("1")[0].id)
+            flag.touch()
+
+        with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
+            leader = asyncio.ensure_future(runner.execute(command, user_id="1"))
+            await asyncio.sleep(0.01)
+            follower, _ = await asyncio.gather(runner.execute(command, user_id="2"), cancel_leader())
+
+        assert (await leader).cancelled
+        assert not follower.cancelled and not follower.coalesced
+        assert follower.stdout == "done\n"
+
+
+def _running(pid: int) -> bool:
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except FileNotFoundError:
+        return False
+    return stat.rsplit(")", 1)[1].split()[0] != "Z"
+
+
+class TestShellProcessGroups:
+    @pytest.mark.asyncio
+    async def test_timeout_kills_background_children(self, runner, shell_config, tmp_path):
+        shell_config.shell.timeout = 0.3
+        pid_file = tmp_path / "child.pid"
+
+        with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
+            result = await runner.execute(f"sleep 30 & echo $! > {pid_file}; wait", user_id="1")
+
+        assert result.exit_code == -1
+        assert "timed out" in result.stderr
+        child = int(pid_file.read_text())
+        assert not _running(child)
+
+    @pytest.mark.asyncio
+    async def test_cancel_running_command(self, runner):
+        async def cancel_soon():
+            while not process_registry.list("1"):
+                await asyncio.sleep(0.01)
+            await process_registry.cancel(process_registry.list("1")[0].id)
+
+        with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
+            result, _ = await asyncio.gather(runner.execute("sleep 30", user_id="1"), cancel_soon())
+
+        assert result.exit_code == -1
+        assert "cancelled" in result.stderr
+
+
+class TestAdaptiveTimeout:
+    @pytest.mark.asyncio
+    async def test_learned_timeout_replaces_default(self, runner, shell_config):
+        project = str(Path(shell_config.claude.default_project).resolve())
+        shell_config.timeouts = TimeoutsConfig(adaptive=True, min_samples=10, factor=2.0, shell_min=0)
+        sketch = LatencySketch()
+        for _ in range(10):
+            sketch.add(100)
+        tracker = LatencyTracker()
+        tracker._sketches[("shell", project, "sleep")] = sketch
+
+        with patch("claudecode_terminal.services.shell.latency_tracker", tracker):
+            with patch("claudecode_terminal.services.latency.save_latency_sketch", new_callable=AsyncMock):
+                with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
+                    result = await runner.execute("sleep 5", user_id="123", cwd=project)
+
+        assert result.exit_code == -1
+        assert "timed out after 0.2s" in result.stderr
+        assert result.execution_time_ms < 3000
+        assert sketch.count == 11
@@ -0,0 +1,122 @@
+"""Tests for persistent shell sessions (real bash processes)."""
+
+from __future__ import annotations
+
+import asyncio
+import shutil
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from claudecode_terminal.config import AppConfig, BotConfig, ClaudeConfig, LoggingConfig, ShellConfig, StorageConfig
+from claudecode_terminal.services.process import process_registry
+from claudecode_terminal.services.shell import ShellRunner
+
+pytestmark = pytest.mark.skipif(shutil.which("bash") is None, reason="bash not installed")
+
+
+@pytest.fixture
+def project(tmp_path):
+    path = tmp_path / "project"
+    (path / "sub").mkdir(parents=True)
+    return path.resolve()
+
+
+@pytest.fixture
+async def runner(tmp_path, project):
+    config = AppConfig(
+        bot=BotConfig(token="test"),
+        claude=ClaudeConfig(default_project=str(project), max_output=4096),
+        shell=ShellConfig(timeout=5, sessions=True),
+        storage=StorageConfig(db_path=str(tmp_path / "test.db")),
+        logging=LoggingConfig(),
+    )
+    runner = ShellRunner(config)
+    with patch("claudecode_terminal.services.shell.save_command", new_callable=AsyncMock):
+        yield runner
+    await runner.close()
+
+
+class TestShellSessions:
+    @pytest.mark.asyncio
+    async def test_cwd_and_environment_persist(self, runner, project):
+        await runner.execute("cd sub && export GREETING=hi", user_id="1", cwd=str(project))
+        result = await runner.execute('pwd; echo "$GREETING"', user_id="1", cwd=str(project))
+        assert result.stdout == f"{project / 'sub'}\nhi\n"
+
+        other = await runner.execute('echo "${GREETING:-unset}"', user_id="2", cwd=str(project))
+        assert other.stdout == "unset\n"
+
+    @pytest.mark.asyncio
+    async def test_exit_codes_and_framing(self, runner, project):
+        result = await runner.execute("printf 'no newline'; echo oops >&2; false", user_id="1", cwd=str(project))
+        assert result.exit_code == 1
+        assert result.stdout == "no newline"
+        assert result.stderr == "oops\n"
+
+        result = await runner.execute("(exit 3)", user_id="1", cwd=str(project))
+        assert result.exit_code == 3
+        assert runner.sessions.get("1").commands == 2
+
+    @pytest.mark.asyncio
+    async def test_stdin_is_not_the_protocol_stream(self, runner, project):
+        result = await runner.execute("cat; echo done", user_id="1", cwd=str(project))
+        assert result.stdout == "done\n"
+
+    @pytest.mark.asyncio
+    async def test_blacklist_still_applies(self, runner, project):
+        result = await runner.execute("rm -rf /", user_id="1", cwd=str(project))
+        assert result.blocked
+        assert runner.sessions.get("1") is None
+
+    @pytest.mark.asyncio
+    async def test_timeout_restarts_session(self, runner, project):
+        runner.config.shell.timeout = 0.3
+        await runner.execute("export KEEP=1", user_id="1", cwd=str(project))
+        result = await runner.execute("sleep 10", user_id="1", cwd=str(project))
+        assert result.exit_code == -1
+        assert "session restarted" in result.stderr
+
+        runner.config.shell.timeout = 5
+        result = await runner.execute('echo "${KEEP:-gone}"', user_id="1", cwd=str(project))
+        assert result.stdout == "gone\n"
+
+    @pytest.mark.asyncio
+    async def test_exit_ends_session(self, runner, project):
+        result = await runner.execute("exit 4", user_id="1", cwd=str(project))
+        assert result.exit_code == -1
+        assert "Shell session exited" in result.stderr
+        assert (await runner.execute("echo back", user_id="1", cwd=str(project))).stdout == "back\n"
+
+    @pytest.mark.asyncio
+    async def test_project_switch_follows(self, runner, project, tmp_path):
+        other = tmp_path / "other"
+        other.mkdir()
+        await runner.execute("export KEEP=1", user_id="1", cwd=str(project))
+        result = await runner.execute('pwd; echo "$KEEP"', user_id="1", cwd=str(other))
+        assert result.stdout == f"{other.resolve()}\n1\n"
+
+    @pytest.mark.asyncio
+    async def test_cancel(self, runner, project):
+        task = asyncio.ensure_future(runner.execute("sleep 10", user_id="1", cwd=str(project)))
+        for _ in range(100):
+            if process_registry.list("1"):
+                break
+            await asyncio.sleep(0.01)
+        assert await process_registry.cancel_all("1") == 1
+        result = await task
+        assert result.cancelled
+        assert "Command cancelled" in result.stderr
+
+    @pytest.mark.asyncio
+    async def test_idle_sessions_are_recycled(self, runner, project):
+        await runner.execute("true", user_id="1", cwd=str(project))
+        runner.sessions.idle_timeout = 0
+        await runner.sessions.evict_idle()
+        assert len(runner.sessions) == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_acquire_spawns_one_session(self, runner, project):
+        sessions = await asyncio.gather(*(runner.sessions.acquire("1", str(project)) for _ in range(3)))
+        assert len({id(session) for session in sessions}) == 1
+        assert len(runner.sessions) == 1
@@ -0,0 +1,165 @@
+"""Tests for in-flight execution coalescing."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from claudecode_terminal.services.singleflight import SingleFlight, is_read_only_command
+
+
+class TestIsReadOnlyCommand:
+    @pytest.mark.parametrize(
+        "command",
+        ["ls -la", "git status", "git -C repo log --oneline", "cat a.txt | grep foo | wc -l", "pwd && ls"],
+    )
+    def test_read_only(self, command):
+        assert is_read_only_command(command)
+
+    @pytest.mark.parametrize(
+        "command",
+        [
+            "git pull",
+            "npm install",
+            "ls > out.txt",
+            "cat a | tee b",
+            "ls; rm x",
+            "echo $(touch x)",
+            "sleep 5 &",
+            "echo 'unterminated",
+            "",
+        ],
+    )
+    def test_mutating(self, command):
+        assert not is_read_only_command(command)
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_execution(self):
+        flight: SingleFlight[int] = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def work() -> int:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return 42
+
+        tasks = [asyncio.ensure_future(flight.do("k", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert len(flight) == 1
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert calls == 1
+        assert [r for r, _ in results] == [42, 42, 42]
+        assert [joined for _, joined in results] == [False, True, True]
+        assert flight.coalesced == 2
+        assert len(flight) == 0
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_separately(self):
+        flight: SingleFlight[str] = SingleFlight()
+
+        async def work(value: str) -> str:
+            await asyncio.sleep(0.01)
+            return value
+
+        results = await asyncio.gather(flight.do("a", lambda: work("a")), flight.do("b", lambda: work("b")))
+        assert results == [("a", False), ("b", False)]
+
+    @pytest.mark.asyncio
+    async def test_exception_propagates_to_followers(self):
+        flight: SingleFlight[int] = SingleFlight()
+
+        async def work() -> int:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(flight.do("k", work), flight.do("k", work), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    @pytest.mark.asyncio
+    async def test_finished_call_is_not_reused(self):
+        flight: SingleFlight[int] = SingleFlight()
+        calls = 0
+
+        async def work() -> int:
+            nonlocal calls
+            calls += 1
+            return calls
+
+        assert await flight.do("k", work) == (1, False)
+        assert await flight.do("k", work) == (2, False)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        flight: SingleFlight[int] = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def work() -> int:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return 42
+
+        leader = asyncio.ensure_future(flight.do("k", work))
+        follower = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await follower == (42, True)
+        assert leader.cancelled()
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_abandoned_execution_is_cancelled(self):
+        flight: SingleFlight[int] = SingleFlight()
+        started = asyncio.Event()
+        finished = False
+
+        async def work() -> int:
+            nonlocal finished
+            started.set()
+            await asyncio.sleep(10)
+            finished = True
+            return 1
+
+        callers = [asyncio.ensure_future(flight.do("k", work)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        assert len(flight) == 0
+        assert not finished
+
+    @pytest.mark.asyncio
+    async def test_unshared_result_is_run_again_for_followers(self):
+        flight: SingleFlight[str] = SingleFlight()
+        results = iter(["cancelled", "ok"])
+        release = asyncio.Event()
+
+        async def work() -> str:
+            await release.wait()
+            return next(results)
+
+        def share(result: str) -> bool:
+            return result != "cancelled"
+
+        leader = asyncio.ensure_future(flight.do("k", work, share))
+        followers = [asyncio.ensure_future(flight.do("k", work, share)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await leader == ("cancelled", False)
+        # One follower takes over and runs it again, the other joins that run
+        assert sorted(await asyncio.gather(*followers)) == [("ok", False), ("ok", True)]
+        assert flight.coalesced == 1
@@ -0,0 +1,114 @@
+"""Tests for live-edited streaming messages."""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from claudecode_terminal.bot.streaming import LiveMessage, LiveTail, StreamingReply
+
+
+def _message(text: str = "Claude is thinking...") -> MagicMock:
+    message = MagicMock()
+    message.text = text
+    message.edit_text = AsyncMock()
+    message.reply_text = AsyncMock()
+    return message
+
+
+class TestLiveMessage:
+    @pytest.mark.asyncio
+    async def test_coalesces_updates(self):
+        message = _message()
+        live = LiveMessage(message, min_interval=0.05)
+        live.set_text("a")
+        live.set_text("ab")
+        live.set_text("abc")
+        await live.flush()
+        # First edit goes out immediately with the latest text; nothing else is pending
+        message.edit_text.assert_awaited_once_with("abc")
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_follow_up(self):
+        message = _message()
+        live = LiveMessage(message, min_interval=0.05)
+        live.set_text("one")
+        await live.flush()
+        live.set_text("two")
+        await live.flush()
+        assert [c.args[0] for c in message.edit_text.await_args_list] == ["one", "two"]
+
+    @pytest.mark.asyncio
+    async def test_skips_unchanged_text(self):
+        message = _message("same")
+        live = LiveMessage(message, min_interval=0)
+        live.set_text("same")
+        await live.flush()
+        message.edit_text.assert_not_awaited()
+
+
+class TestStreamingReply:
+    @pytest.mark.asyncio
+    async def test_append_and_finish(self):
+        message = _message()
+        reply = StreamingReply(message, header="H\n\n", min_interval=0)
+        await reply.append("hello")
+        await reply.finish("\n\n[1.0s]")
+        assert reply.has_output
+        assert message.edit_text.await_args_list[-1].args[0] == "H\n\nhello\n\n[1.0s]"
+
+    @pytest.mark.asyncio
+    async def test_rolls_over_long_output(self):
+        message = _message()
+        continuation = _message("...")
+        message.reply_text = AsyncMock(return_value=continuation)
+        reply = StreamingReply(message, header="H\n\n", min_interval=0)
+        await reply.append("x" * 5000)
+        await reply.finish()
+        first = message.edit_text.await_args_list[-1].args[0]
+        rest = continuation.edit_text.await_args_list[-1].args[0]
+        assert first.startswith("H\n\n")
+        assert len(first) == 4096
+        assert len(first) - 3 + len(rest) == 5000
+
+
+class TestLiveTail:
+    @pytest.mark.asyncio
+    async def test_keeps_last_lines(self):
+        message = _message("$ make")
+        tail = LiveTail(message, header="$ make", lines=3, min_interval=0)
+        tail.start()
+        await tail.feed("one\ntwo\nthr")
+        await tail.feed("ee\nfour\nfive\n")
+        text = tail.render()
+        await tail.stop()
+        assert text.startswith("$ make\nRunning | ")
+        assert "| 24 B" in text
+        assert text.endswith("three\nfour\nfive")
+        assert "two" not in text
+
+    @pytest.mark.asyncio
+    async def test_carriage_returns_show_latest_progress(self):
+        tail = LiveTail(_message(), header="$ pip install x", lines=5, min_interval=0)
+        await tail.feed("Downloading 10%\rDownloading 55%\rDownloading 100%\nDone\n")
+        assert tail.render("[OK]").endswith("Downloading 100%\nDone")
+
+    @pytest.mark.asyncio
+    async def test_finish_with_full_output(self):
+        message = _message()
+        tail = LiveTail(message, header="$ ls", lines=1, min_interval=0)
+        await tail.feed("a\nb\nc\n")
+        await tail.finish("[OK | 1.0s | 6 B]", output="a\nb\nc")
+        assert message.edit_text.await_args_list[-1].args[0] == "$ ls\n[OK | 1.0s | 6 B]\n\na\nb\nc"
+
+    @pytest.mark.asyncio
+    async def test_ticker_refreshes_silent_command(self):
+        message = _message()
+        tail = LiveTail(message, header="$ sleep 5", min_interval=0, tick=0.01)
+        tail.start()
+        await asyncio.sleep(0.05)
+        await tail.stop()
+        assert message.edit_text.await_count >= 1
+        assert message.edit_text.await_args_list[-1].args[0].startswith("$ sleep 5\nRunning | ")